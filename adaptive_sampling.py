@@ -0,0 +1,107 @@
+"""
+Адаптивная выборка точек кривой интерполяции для графика.
+
+Расчет начинается с редкой сетки; на каждом уровне середины еще не
+принятых интервалов вычисляются одним пакетным вызовом, и дальше делятся
+только те интервалы, где кривая заметно отходит от хорды или резко
+поворачивает. Допуски заданы в пикселях экрана, поэтому плоские участки
+остаются редкими, а колебания полиномов и Лагранжа прорисовываются до
+разрешения графика. Функция расчета передается извне, так что выборку
+можно использовать с любым способом расчета (хранимая процедура, локальный
+движок, HTTP-сервис).
+"""
+
+import numpy as np
+
+# Допустимое отклонение кривой от хорды (пиксели)
+PIXEL_TOLERANCE = 0.5
+# Допустимый поворот ломаной в середине интервала (радианы)
+MAX_TURN_ANGLE = 0.35
+# Интервалы не шире этого (пиксели) больше не делятся
+MIN_SEGMENT_WIDTH = 1.0
+# Количество интервалов начальной равномерной сетки
+INITIAL_SEGMENTS = 4
+# Предел количества точек кривой на пиксель ширины графика
+MAX_POINTS_PER_PIXEL = 4
+
+
+def _evaluate(evaluate, x_values):
+    y_values = np.asarray(evaluate(x_values), dtype=np.float64).ravel()
+    if y_values.shape != x_values.shape:
+        raise ValueError("Функция расчета вернула массив другой длины")
+    return y_values
+
+
+def _y_scale(y_values, height, y_span=None):
+    """Пикселей на единицу Y при текущем разбросе значений"""
+    finite = y_values[np.isfinite(y_values)]
+    span = float(np.ptp(finite)) if finite.size else 0.0
+    if y_span is not None:
+        span = max(span, y_span)
+    return height / span if span > 0 else float(height)
+
+
+def iter_adaptive_samples(evaluate, x_min, x_max, width, height, breakpoints=None,
+                          initial_segments=INITIAL_SEGMENTS, tolerance=PIXEL_TOLERANCE,
+                          max_angle=MAX_TURN_ANGLE, y_span=None, max_points=None):
+    """Уровни адаптивной выборки кривой на [x_min, x_max].
+
+    evaluate(x) принимает массив X и возвращает массив Y той же длины (NaN -
+    значение не определено); за уровень он вызывается ровно один раз.
+    width и height - размер области графика в пикселях. breakpoints - точки
+    излома (например, X исходных данных), добавляемые к начальной сетке;
+    y_span - ожидаемый разброс Y на графике, если он шире самой кривой.
+
+    После каждого уровня выдается пара новых массивов (X, Y) всей кривой,
+    упорядоченная по X; ранее выданные массивы не изменяются.
+    """
+    width = max(int(width), 1)
+    max_points = max_points or MAX_POINTS_PER_PIXEL * width
+
+    x_values = np.linspace(x_min, x_max, max(int(initial_segments), 1) + 1)
+    if breakpoints is not None:
+        breakpoints = np.asarray(breakpoints, dtype=np.float64)
+        x_values = np.union1d(x_values, breakpoints[(breakpoints > x_min) & (breakpoints < x_max)])
+    x_values = np.unique(x_values)
+    y_values = _evaluate(evaluate, x_values)
+    yield x_values, y_values
+
+    if x_max <= x_min:
+        return
+    x_scale = width / (x_max - x_min)
+
+    candidates = np.arange(x_values.size - 1)
+    while candidates.size and x_values.size < max_points:
+        # Интервалы уже пикселя на экране не различимы
+        left, right = candidates, candidates + 1
+        candidates = candidates[(x_values[right] - x_values[left]) * x_scale > MIN_SEGMENT_WIDTH]
+        candidates = candidates[:max_points - x_values.size]
+        if not candidates.size:
+            break
+
+        left, right = candidates, candidates + 1
+        x_mid = (x_values[left] + x_values[right]) / 2
+        y_mid = _evaluate(evaluate, x_mid)
+
+        y_scale = _y_scale(np.concatenate((y_values, y_mid)), height, y_span)
+        y_left, y_right = y_values[left], y_values[right]
+        with np.errstate(invalid='ignore'):
+            # Отклонение середины от хорды и поворот ломаной в середине, в пикселях экрана
+            error = np.abs(y_mid - (y_left + y_right) / 2) * y_scale
+            half_width = (x_mid - x_values[left]) * x_scale
+            angle = np.abs(np.arctan2((y_right - y_mid) * y_scale, half_width)
+                           - np.arctan2((y_mid - y_left) * y_scale, half_width))
+            split = (error > tolerance) | (angle > max_angle)
+
+        # Граница области, где значение определено, уточняется как излом
+        defined = np.isfinite(y_left).astype(np.int8) + np.isfinite(y_mid) + np.isfinite(y_right)
+        split = np.where(defined == 3, split, (defined > 0))
+
+        # Середины вставляются после левых концов; их новые индексы сдвинуты на число предыдущих вставок
+        mid_index = right + np.arange(candidates.size)
+        x_values = np.insert(x_values, right, x_mid)
+        y_values = np.insert(y_values, right, y_mid)
+        yield x_values, y_values
+
+        split_index = mid_index[split]
+        candidates = np.sort(np.concatenate((split_index - 1, split_index)))
@@ -0,0 +1,140 @@
+"""
+Фоновое выполнение задач для Tk-интерфейса: пул потоков, прогресс и отмена.
+"""
+
+import logging
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+logger = logging.getLogger('interpolation_app')
+
+
+class JobCancelled(Exception):
+    """Задача отменена пользователем или более новым запросом"""
+
+
+class Job:
+    """Фоновая задача; передается в рабочую функцию первым аргументом"""
+
+    def __init__(self, runner, key):
+        self.runner = runner
+        self.key = key
+        self._cancel_event = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    def check(self):
+        """Прерывание рабочей функции, если задача отменена"""
+        if self.cancelled:
+            raise JobCancelled()
+
+    def progress(self, message):
+        """Сообщение о ходе выполнения (отображается в строке статуса)"""
+        self.runner._post(self, 'progress', message)
+
+    def partial(self, data):
+        """Промежуточный результат для постепенного обновления интерфейса"""
+        self.runner._post(self, 'partial', data)
+
+
+class BackgroundRunner:
+    """Выполнение задач в пуле потоков с доставкой результатов в поток Tk.
+
+    Рабочие потоки не трогают виджеты: все обратные вызовы выполняются в
+    главном потоке при опросе очереди через root.after(). Задачи с одинаковым
+    ключом схлопываются - новая отменяет предыдущую, так что считается только
+    последний запрос.
+    """
+
+    def __init__(self, root, max_workers=1, poll_interval=50, profile=None):
+        # Один рабочий поток по умолчанию сохраняет порядок операций с БД
+        self.root = root
+        self.poll_interval = poll_interval
+        # profile(name) -> контекстный менеджер для замера длительности задачи
+        self.profile = profile or (lambda name: nullcontext())
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='interpolation_worker')
+        self.events = queue.Queue()
+        self.jobs = {}
+        self.callbacks = {}
+        self._poll_id = self.root.after(self.poll_interval, self._poll)
+
+    def submit(self, key, func, *args, on_done=None, on_error=None, on_progress=None, on_partial=None):
+        """Постановка задачи в очередь; func(job, *args) выполняется в рабочем потоке"""
+        self.cancel(key)
+
+        job = Job(self, key)
+        self.jobs[key] = job
+        self.callbacks[job] = {
+            'done': on_done, 'error': on_error, 'progress': on_progress, 'partial': on_partial
+        }
+        self.executor.submit(self._execute, job, func, args)
+        return job
+
+    def cancel(self, key=None):
+        """Отмена задачи по ключу или всех задач"""
+        keys = list(self.jobs) if key is None else [key]
+        for job_key in keys:
+            job = self.jobs.pop(job_key, None)
+            if job is not None:
+                job.cancel()
+
+    def shutdown(self):
+        """Отмена задач и остановка пула потоков"""
+        self.cancel()
+        if self._poll_id is not None:
+            self.root.after_cancel(self._poll_id)
+            self._poll_id = None
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _post(self, job, kind, payload):
+        if not job.cancelled:
+            self.events.put((job, kind, payload))
+
+    def _execute(self, job, func, args):
+        # Задача могла быть отменена, пока ждала в очереди
+        if job.cancelled:
+            self.events.put((job, 'cancelled', None))
+            return
+        try:
+            with self.profile(f"job:{job.key}"):
+                result = func(job, *args)
+        except JobCancelled:
+            self.events.put((job, 'cancelled', None))
+        except Exception as e:
+            logger.error(f"Ошибка фоновой задачи '{job.key}': {e}")
+            self.events.put((job, 'error', e))
+        else:
+            self.events.put((job, 'done', result))
+
+    def _poll(self):
+        """Доставка событий рабочих потоков в главный поток Tk"""
+        while True:
+            try:
+                job, kind, payload = self.events.get_nowait()
+            except queue.Empty:
+                break
+
+            finished = kind in ('done', 'error', 'cancelled')
+            callbacks = self.callbacks.pop(job, {}) if finished else self.callbacks.get(job, {})
+            if finished and self.jobs.get(job.key) is job:
+                del self.jobs[job.key]
+
+            # События отмененных задач не должны перетирать более новые результаты
+            if job.cancelled or kind == 'cancelled':
+                continue
+
+            callback = callbacks.get(kind)
+            if callback is not None:
+                try:
+                    callback(payload)
+                except Exception as e:
+                    logger.error(f"Ошибка обработки результата задачи '{job.key}': {e}")
+
+        self._poll_id = self.root.after(self.poll_interval, self._poll)
@@ -0,0 +1,313 @@
+"""
+Воспроизводимые замеры производительности записи в БД и расчета интерполяции.
+
+Перед запуском поднимите PostgreSQL из docker-compose.yml (`docker compose up -d`)
+или из _Infra; для сравнения с хранимой процедурой нужен MySQL со схемой
+interpolation_db и процедурами из interpolation.sql.
+
+    python benchmark.py --grid-sizes 10000,100000 --output results.json
+"""
+
+import argparse
+import json
+import platform
+import resource
+import time
+import tracemalloc
+
+import numpy as np
+import psycopg2
+from psycopg2.extras import execute_values
+from scipy.interpolate import interp1d
+
+import geroin
+from dataset import Dataset
+from interpolation_engine import InterpolationEngine, INTERPOLATION_TYPES
+
+# Все таблицы замеров создаются в отдельной схеме, рабочие данные не затрагиваются
+BENCHMARK_SCHEMA = 'benchmark'
+
+WRITE_STRATEGIES = ('executemany', 'multirow_values', 'execute_values', 'copy_text', 'copy_binary')
+
+
+def peak_rss_kb():
+    """Пиковый объем резидентной памяти процесса за все время работы (КБ, Linux)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def measure(run, repeats, setup=None):
+    """Задержки repeats прогонов run() и память случая.
+
+    Пик RSS процесса только растет, поэтому для случая сообщается его прирост
+    за эти прогоны (0, если случай уложился в пик предыдущих). Пик выделений
+    самого случая (Python и NumPy) измеряет tracemalloc в одном
+    дополнительном прогоне: трассировка замедляет выделения, и в замер
+    времени этот прогон не входит. setup() выполняется перед каждым прогоном
+    вне замера.
+    """
+    rss_before = peak_rss_kb()
+    latencies = []
+    for _ in range(repeats):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        run()
+        latencies.append(time.perf_counter() - start)
+    rss_growth = peak_rss_kb() - rss_before
+
+    if setup is not None:
+        setup()
+    tracemalloc.start()
+    try:
+        run()
+        traced_peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return latencies, {'rss_growth_kb': rss_growth, 'traced_peak_kb': traced_peak // 1024}
+
+
+def summarize(latencies, rows, memory):
+    """Пропускная способность, перцентили задержки по повторам и память случая"""
+    latencies = np.asarray(latencies)
+    return {
+        'repeats': int(latencies.size),
+        'throughput_rows_s': float(rows / np.median(latencies)) if rows else None,
+        'latency_p50_s': float(np.percentile(latencies, 50)),
+        'latency_p99_s': float(np.percentile(latencies, 99)),
+        'latency_min_s': float(latencies.min()),
+        **memory,
+    }
+
+
+def make_grid(size, seed):
+    """Сетка X и значения Y той же формы, что и в geroin.py"""
+    rng = np.random.default_rng(seed)
+    x_data = np.linspace(0, 40, 5)
+    y_data = x_data ** 2 + rng.normal(0, 1, x_data.size)
+    x_grid = np.linspace(0, 40, size)
+    return x_grid, np.asarray(interp1d(x_data, y_data, kind='linear')(x_grid), dtype=np.float64)
+
+
+def write_multirow_values(conn, cursor, x_values, y_values, batch_size, commit_every):
+    """Один INSERT с многострочным VALUES на порцию"""
+    for index, (x_batch, y_batch) in enumerate(geroin.iter_batches(x_values, y_values, batch_size), start=1):
+        rows = list(zip(x_batch.tolist(), y_batch.tolist()))
+        values = b','.join(cursor.mogrify("(%s,%s)", row) for row in rows)
+        cursor.execute(b"INSERT INTO interpolation_results (x_value, y_value) VALUES " + values)
+        if commit_every and index % commit_every == 0:
+            conn.commit()
+    conn.commit()
+
+
+def write_execute_values(conn, cursor, x_values, y_values, batch_size, commit_every):
+    """psycopg2.extras.execute_values порциями"""
+    for index, (x_batch, y_batch) in enumerate(geroin.iter_batches(x_values, y_values, batch_size), start=1):
+        execute_values(cursor, "INSERT INTO interpolation_results (x_value, y_value) VALUES %s",
+                       list(zip(x_batch.tolist(), y_batch.tolist())), page_size=batch_size)
+        if commit_every and index % commit_every == 0:
+            conn.commit()
+    conn.commit()
+
+
+def run_write_strategy(conn, cursor, strategy, x_values, y_values, batch_size, commit_every):
+    if strategy == 'executemany':
+        geroin.write_executemany(conn, cursor, x_values, y_values, batch_size, commit_every)
+    elif strategy == 'multirow_values':
+        write_multirow_values(conn, cursor, x_values, y_values, batch_size, commit_every)
+    elif strategy == 'execute_values':
+        write_execute_values(conn, cursor, x_values, y_values, batch_size, commit_every)
+    elif strategy == 'copy_text':
+        geroin.write_copy(conn, cursor, x_values, y_values, batch_size, commit_every, copy_format='text')
+    elif strategy == 'copy_binary':
+        geroin.write_copy(conn, cursor, x_values, y_values, batch_size, commit_every, copy_format='binary')
+    else:
+        raise ValueError(f"Неизвестная стратегия записи: {strategy}")
+
+
+def prepare_postgres(conn):
+    """Создание схемы замеров с копией таблицы interpolation_results"""
+    cursor = conn.cursor()
+    cursor.execute(f"CREATE SCHEMA IF NOT EXISTS {BENCHMARK_SCHEMA}")
+    cursor.execute(f"SET search_path TO {BENCHMARK_SCHEMA}")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS interpolation_results (
+            id SERIAL PRIMARY KEY,
+            x_value FLOAT NOT NULL,
+            y_value FLOAT NOT NULL
+        )
+    """)
+    conn.commit()
+    return cursor
+
+
+def measure_write(conn, cursor, strategy, x_values, y_values, batch_size, commit_every, repeats):
+    def truncate():
+        cursor.execute("TRUNCATE interpolation_results")
+        conn.commit()
+
+    return measure(lambda: run_write_strategy(conn, cursor, strategy, x_values, y_values, batch_size, commit_every),
+                   repeats, setup=truncate)
+
+
+def bench_write(conn, cursor, args):
+    """Сравнение стратегий записи при базовых размере порции и политике commit"""
+    results = []
+    for size in args.grid_sizes:
+        x_values, y_values = make_grid(size, args.seed)
+        for strategy in args.strategies:
+            latencies, memory = measure_write(conn, cursor, strategy, x_values, y_values,
+                                              geroin.BATCH_SIZE, geroin.COMMIT_EVERY, args.repeats)
+            results.append({'suite': 'write', 'strategy': strategy, 'rows': size,
+                            'batch_size': geroin.BATCH_SIZE, 'commit_every': geroin.COMMIT_EVERY,
+                            **summarize(latencies, size, memory)})
+    return results
+
+
+def bench_sweep(conn, cursor, args):
+    """Перебор размеров порции и частоты commit для каждой стратегии"""
+    results = []
+    for size in args.grid_sizes:
+        x_values, y_values = make_grid(size, args.seed)
+        for strategy in args.strategies:
+            for batch_size in args.batch_sizes:
+                for commit_every in args.commit_every:
+                    latencies, memory = measure_write(conn, cursor, strategy, x_values, y_values,
+                                                      batch_size, commit_every or None, args.repeats)
+                    results.append({'suite': 'sweep', 'strategy': strategy, 'rows': size,
+                                    'batch_size': batch_size, 'commit_every': commit_every or None,
+                                    **summarize(latencies, size, memory)})
+    return results
+
+
+def bench_eval_local(args):
+    """Локальный расчет: SciPy interp1d и движок interpolation_engine"""
+    results = []
+    rng = np.random.default_rng(args.seed)
+    x_data = np.sort(rng.uniform(0, 100, args.dataset_points))
+    y_data = np.sin(x_data / 10) + rng.normal(0, 0.01, x_data.size)
+
+    for size in args.grid_sizes:
+        x_grid = np.linspace(x_data[0], x_data[-1], size)
+
+        latencies, memory = measure(lambda: interp1d(x_data, y_data, kind='linear')(x_grid), args.repeats)
+        results.append({'suite': 'eval', 'backend': 'scipy', 'method': 'linear', 'rows': size,
+                        **summarize(latencies, size, memory)})
+
+        for method in INTERPOLATION_TYPES:
+            if method == 'lagrange' and x_data.size > 50:
+                # Многочлен высокой степени численно бессмысленен
+                continue
+            engine = InterpolationEngine(lambda dataset_id: (x_data, y_data))
+            latencies, memory = measure(lambda: engine.evaluate(method, x_grid, 3, 'benchmark'), args.repeats,
+                                        setup=lambda: engine.invalidate('benchmark'))
+            results.append({'suite': 'eval', 'backend': 'local', 'method': method, 'rows': size,
+                            **summarize(latencies, size, memory)})
+    return results
+
+
+def bench_eval_mysql(args):
+    """Хранимая процедура CalculateInterpolationPrecomputed против локального режима DatabaseManager"""
+    from db_manager import DatabaseManager
+
+    results = []
+    rng = np.random.default_rng(args.seed)
+    x_data = np.sort(rng.uniform(0, 100, args.dataset_points))
+    points = Dataset(x_data, np.sin(x_data / 10), 'benchmark', source='benchmark')
+
+    for mode in DatabaseManager.EVALUATION_MODES:
+        # Кеш результатов отключен: каждый повтор должен считать заново
+        manager = DatabaseManager(host=args.mysql_host, port=args.mysql_port, database=args.mysql_database,
+                                  user=args.mysql_user, password=args.mysql_password, evaluation_mode=mode,
+                                  result_cache_size=0)
+        manager.create_tables_if_not_exist()
+        manager.insert_data_points(points, 'benchmark')
+        for size in args.grid_sizes:
+            x_grid = np.linspace(x_data[0], x_data[-1], size)
+            for method in ('linear', 'spline'):
+                latencies, memory = measure(
+                    lambda: manager.calculate_interpolation_batch(method, x_grid, 3, 'benchmark', save_results=False),
+                    args.repeats)
+                results.append({'suite': 'eval', 'backend': f'mysql_{mode}', 'method': method, 'rows': size,
+                                **summarize(latencies, size, memory)})
+        manager.delete_data_points('benchmark')
+        manager.disconnect()
+    return results
+
+
+def parse_list(value, cast=int):
+    return [cast(item) for item in value.split(',') if item]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Замеры производительности записи и интерполяции")
+    parser.add_argument('--suites', type=lambda v: parse_list(v, str), default=['write', 'sweep', 'eval'],
+                        help="Наборы замеров: write, sweep, eval, mysql")
+    parser.add_argument('--grid-sizes', type=parse_list, default=[10000, 100000])
+    parser.add_argument('--strategies', type=lambda v: parse_list(v, str), default=list(WRITE_STRATEGIES))
+    parser.add_argument('--batch-sizes', type=parse_list, default=[1000, 10000, 100000])
+    parser.add_argument('--commit-every', type=parse_list, default=[0, 1, 10],
+                        help="Commit после каждых N порций; 0 - одна транзакция")
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--dataset-points', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help="Файл для результатов JSON (по умолчанию stdout)")
+
+    parser.add_argument('--pg-host', default=geroin.DB_PARAMS['host'])
+    parser.add_argument('--pg-port', default=geroin.DB_PARAMS['port'])
+    parser.add_argument('--pg-dbname', default=geroin.DB_PARAMS['dbname'])
+    parser.add_argument('--pg-user', default=geroin.DB_PARAMS['user'])
+    parser.add_argument('--pg-password', default=geroin.DB_PARAMS['password'])
+
+    parser.add_argument('--mysql-host', default='localhost')
+    parser.add_argument('--mysql-port', type=int, default=3306)
+    parser.add_argument('--mysql-database', default='interpolation_db')
+    parser.add_argument('--mysql-user', default='user')
+    parser.add_argument('--mysql-password', default='password')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = []
+
+    if {'write', 'sweep'} & set(args.suites):
+        conn = psycopg2.connect(host=args.pg_host, port=args.pg_port, dbname=args.pg_dbname,
+                                user=args.pg_user, password=args.pg_password)
+        try:
+            cursor = prepare_postgres(conn)
+            if 'write' in args.suites:
+                results += bench_write(conn, cursor, args)
+            if 'sweep' in args.suites:
+                results += bench_sweep(conn, cursor, args)
+            cursor.execute("DROP TABLE interpolation_results")
+            conn.commit()
+        finally:
+            conn.close()
+
+    if 'eval' in args.suites:
+        results += bench_eval_local(args)
+    if 'mysql' in args.suites:
+        results += bench_eval_mysql(args)
+
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'peak_rss_kb': peak_rss_kb(),
+            'args': vars(args),
+        },
+        'results': results,
+    }
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,345 @@
+-- Пакетные (set-based) версии функций расчета поправок из Homework.sql.
+-- Вместо N вызовов построчных функций весь набор измерений обрабатывается
+-- одним запросом с соединениями и поиском по диапазонам высот.
+-- Скрипт выполняется после Homework.sql.
+
+BEGIN;
+
+-- 1. Отклонения температуры в развернутом виде: (высота, отклонение) -> значение.
+-- Заменяет динамический доступ к столбцу dev_N через row ->> col_name.
+CREATE TABLE IF NOT EXISTS public.temperature_deviations_long (
+    height INTEGER NOT NULL,
+    deviation INTEGER NOT NULL,
+    value NUMERIC NOT NULL,
+    PRIMARY KEY (deviation, height)
+);
+
+CREATE OR REPLACE FUNCTION public.fn_refresh_temperature_deviations_long()
+RETURNS TRIGGER
+LANGUAGE PLPGSQL
+AS $$
+BEGIN
+    DELETE FROM public.temperature_deviations_long;
+
+    INSERT INTO public.temperature_deviations_long (height, deviation, value)
+    SELECT td.height, v.deviation, v.value
+    FROM public.temperature_deviations td
+    CROSS JOIN LATERAL (VALUES
+        (1, td.dev_1), (2, td.dev_2), (3, td.dev_3), (4, td.dev_4), (5, td.dev_5),
+        (6, td.dev_6), (7, td.dev_7), (8, td.dev_8), (9, td.dev_9), (10, td.dev_10),
+        (20, td.dev_20), (30, td.dev_30), (40, td.dev_40), (50, td.dev_50)
+    ) AS v(deviation, value)
+    WHERE v.value IS NOT NULL;
+
+    RETURN NULL;
+END;
+$$;
+
+COMMENT ON FUNCTION public.fn_refresh_temperature_deviations_long IS 'Пересобирает развернутую таблицу отклонений температуры';
+
+DROP TRIGGER IF EXISTS trg_temperature_deviations_long ON public.temperature_deviations;
+CREATE TRIGGER trg_temperature_deviations_long
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON public.temperature_deviations
+FOR EACH STATEMENT EXECUTE FUNCTION public.fn_refresh_temperature_deviations_long();
+
+-- Первичное заполнение
+INSERT INTO public.temperature_deviations_long (height, deviation, value)
+SELECT td.height, v.deviation, v.value
+FROM public.temperature_deviations td
+CROSS JOIN LATERAL (VALUES
+    (1, td.dev_1), (2, td.dev_2), (3, td.dev_3), (4, td.dev_4), (5, td.dev_5),
+    (6, td.dev_6), (7, td.dev_7), (8, td.dev_8), (9, td.dev_9), (10, td.dev_10),
+    (20, td.dev_20), (30, td.dev_30), (40, td.dev_40), (50, td.dev_50)
+) AS v(deviation, value)
+WHERE v.value IS NOT NULL
+ON CONFLICT (deviation, height) DO UPDATE SET value = EXCLUDED.value;
+
+-- 2. Диапазоны «ближайшей высоты»: высота обслуживает все точки, которые
+-- к ней ближе, чем к соседним. При равенстве расстояний выбирается меньшая
+-- высота. Поиск ближайшей высоты становится проверкой band @> height.
+CREATE OR REPLACE VIEW public.v_temperature_deviation_bands AS
+SELECT
+    height,
+    int4range(FLOOR((LAG(height) OVER w + height) / 2.0)::INTEGER + 1,
+              FLOOR((height + LEAD(height) OVER w) / 2.0)::INTEGER + 1) AS band
+FROM public.temperature_deviations
+WINDOW w AS (ORDER BY height);
+
+COMMENT ON VIEW public.v_temperature_deviation_bands IS 'Диапазоны высот, для которых высота таблицы отклонений является ближайшей';
+
+CREATE OR REPLACE VIEW public.v_wind_correction_bands AS
+SELECT
+    height,
+    int4range(FLOOR((LAG(height) OVER w + height) / 2.0)::INTEGER + 1,
+              FLOOR((height + LEAD(height) OVER w) / 2.0)::INTEGER + 1) AS band
+FROM (SELECT DISTINCT height FROM public.wind_corrections) heights
+WINDOW w AS (ORDER BY height);
+
+COMMENT ON VIEW public.v_wind_correction_bands IS 'Диапазоны высот, для которых высота таблицы ветровых поправок является ближайшей';
+
+COMMIT;
+
+BEGIN;
+
+-- 3. Отклонение температуры по высоте для массива пар (высота, температура).
+-- Результат совпадает с calculate_temperature_deviation; там, где построчная
+-- функция вызвала бы исключение, возвращается NULL.
+CREATE OR REPLACE FUNCTION public.fn_calc_temperature_deviation_bulk(
+    par_heights INTEGER[],
+    par_temperatures NUMERIC[]
+)
+RETURNS TABLE (
+    ordinality BIGINT,
+    height INTEGER,
+    temperature NUMERIC,
+    tens INTEGER,
+    ones INTEGER,
+    dev_tens NUMERIC,
+    dev_ones NUMERIC,
+    result NUMERIC
+)
+LANGUAGE SQL
+STABLE
+AS $$
+    WITH input AS (
+        SELECT
+            i.ordinality,
+            i.height,
+            i.temperature,
+            (TRUNC(ABS(i.temperature) / 10) * 10)::INTEGER AS tens
+        FROM unnest(par_heights, par_temperatures) WITH ORDINALITY AS i(height, temperature, ordinality)
+    ),
+    parts AS (
+        SELECT
+            input.*,
+            ROUND(ABS(input.temperature) - input.tens)::INTEGER AS ones,
+            b.height AS table_height
+        FROM input
+        LEFT JOIN public.v_temperature_deviation_bands b ON b.band @> input.height
+    ),
+    deviations AS (
+        SELECT
+            parts.*,
+            dt.value AS dev_tens,
+            CASE WHEN parts.ones > 0 THEN dl.value ELSE 0 END AS dev_ones
+        FROM parts
+        LEFT JOIN public.temperature_deviations_long dt
+            ON dt.height = parts.table_height
+           AND dt.deviation = CASE WHEN parts.tens = 0 THEN 1 ELSE parts.tens END
+        LEFT JOIN public.temperature_deviations_long dl
+            ON dl.height = parts.table_height
+           AND dl.deviation = parts.ones
+    )
+    SELECT
+        ordinality,
+        height,
+        temperature,
+        tens,
+        ones,
+        dev_tens,
+        dev_ones,
+        CASE WHEN temperature < 0 THEN ABS(dev_tens + dev_ones) + 50 ELSE dev_tens + dev_ones END
+    FROM deviations
+    ORDER BY ordinality;
+$$;
+
+COMMENT ON FUNCTION public.fn_calc_temperature_deviation_bulk IS 'Пакетный расчет отклонения температуры по высоте (аналог calculate_temperature_deviation)';
+
+-- 4. Все поправки по Ветровому ружью для массива input_params.
+-- Одна строка на входную запись; error_message заполняется вместо исключения.
+CREATE OR REPLACE FUNCTION public.fn_calc_wind_rifle_corrections_bulk(
+    par_params public.input_params[]
+)
+RETURNS TABLE (
+    ordinality BIGINT,
+    height NUMERIC(8,2),
+    temperature NUMERIC(8,2),
+    temperature_deviation NUMERIC(8,2),
+    pressure NUMERIC(8,2),
+    pressure_deviation NUMERIC(8,2),
+    wind_direction NUMERIC(8,2),
+    wind_speed NUMERIC(8,2),
+    wind_correction NUMERIC(8,2),
+    bullet_demolition_range NUMERIC(8,2),
+    bullet_deviation NUMERIC(8,2),
+    error_message TEXT
+)
+LANGUAGE SQL
+STABLE
+AS $$
+    WITH settings AS (
+        -- Все настройки читаются один раз на вызов
+        SELECT
+            MAX(value::NUMERIC) FILTER (WHERE key = 'min_height') AS min_height,
+            MAX(value::NUMERIC) FILTER (WHERE key = 'max_height') AS max_height,
+            MAX(value::NUMERIC) FILTER (WHERE key = 'min_temperature') AS min_temperature,
+            MAX(value::NUMERIC) FILTER (WHERE key = 'max_temperature') AS max_temperature,
+            MAX(value::NUMERIC) FILTER (WHERE key = 'min_pressure') AS min_pressure,
+            MAX(value::NUMERIC) FILTER (WHERE key = 'max_pressure') AS max_pressure,
+            MAX(value::NUMERIC) FILTER (WHERE key = 'min_wind_direction') AS min_wind_direction,
+            MAX(value::NUMERIC) FILTER (WHERE key = 'max_wind_direction') AS max_wind_direction,
+            MAX(value::NUMERIC) FILTER (WHERE key = 'min_wind_speed') AS min_wind_speed,
+            MAX(value::NUMERIC) FILTER (WHERE key = 'max_wind_speed') AS max_wind_speed,
+            MAX(value::NUMERIC) FILTER (WHERE key = 'min_bullet_demolition_range') AS min_bullet_demolition_range,
+            MAX(value::NUMERIC) FILTER (WHERE key = 'max_bullet_demolition_range') AS max_bullet_demolition_range,
+            COALESCE(MAX(value::NUMERIC(8,2)) FILTER (WHERE key = 'calc_table_temperature'), 15.9) AS table_temperature,
+            COALESCE(MAX(value::NUMERIC(8,2)) FILTER (WHERE key = 'calc_table_pressure'), 750) AS table_pressure
+        FROM public.measurment_settings
+        WHERE key ~ '^(min_|max_|calc_table_)'
+    ),
+    input AS (
+        SELECT p.ordinality, (p.params).*
+        FROM unnest(par_params) WITH ORDINALITY AS p(params, ordinality)
+    ),
+    checked AS (
+        SELECT
+            input.*,
+            CASE
+                WHEN input.height < s.min_height OR input.height > s.max_height
+                    THEN format('Height %s не укладывается в диапазон [%s, %s]', input.height, s.min_height, s.max_height)
+                WHEN input.temperature < s.min_temperature OR input.temperature > s.max_temperature
+                    THEN format('Temperature %s не укладывается в диапазон [%s, %s]', input.temperature, s.min_temperature, s.max_temperature)
+                WHEN input.pressure < s.min_pressure OR input.pressure > s.max_pressure
+                    THEN format('Pressure %s не укладывается в диапазон [%s, %s]', input.pressure, s.min_pressure, s.max_pressure)
+                WHEN input.wind_direction < s.min_wind_direction OR input.wind_direction > s.max_wind_direction
+                    THEN format('Wind_Direction %s не укладывается в диапазон [%s, %s]', input.wind_direction, s.min_wind_direction, s.max_wind_direction)
+                WHEN input.wind_speed < s.min_wind_speed OR input.wind_speed > s.max_wind_speed
+                    THEN format('Wind_Speed %s не укладывается в диапазон [%s, %s]', input.wind_speed, s.min_wind_speed, s.max_wind_speed)
+                WHEN input.bullet_demolition_range < s.min_bullet_demolition_range
+                  OR input.bullet_demolition_range > s.max_bullet_demolition_range
+                    THEN format('Bullet_Demolition_Range %s не укладывается в диапазон [%s, %s]',
+                                input.bullet_demolition_range, s.min_bullet_demolition_range, s.max_bullet_demolition_range)
+            END AS check_error,
+            s.table_temperature,
+            s.table_pressure
+        FROM input
+        CROSS JOIN settings s
+    ),
+    corrections AS (
+        -- Линейная интерполяция поправки по соседним узлам (индекс по первичному ключу)
+        SELECT
+            checked.*,
+            CASE
+                WHEN c0.temperature = checked.temperature THEN c0.correction
+                ELSE ROUND((c0.correction + (checked.temperature - c0.temperature)
+                            * (c1.correction - c0.correction) / (c1.temperature - c0.temperature))::NUMERIC(8,2), 2)
+            END AS virtual_correction,
+            r.id AS wind_range_id,
+            wb.height AS wind_height
+        FROM checked
+        LEFT JOIN LATERAL (
+            SELECT t.temperature, t.correction
+            FROM public.calc_temperatures_correction t
+            WHERE t.temperature <= checked.temperature
+            ORDER BY t.temperature DESC
+            LIMIT 1
+        ) c0 ON TRUE
+        LEFT JOIN LATERAL (
+            SELECT t.temperature, t.correction
+            FROM public.calc_temperatures_correction t
+            WHERE t.temperature >= checked.temperature
+            ORDER BY t.temperature ASC
+            LIMIT 1
+        ) c1 ON TRUE
+        LEFT JOIN LATERAL (
+            SELECT w.id
+            FROM public.wind_speed_ranges w
+            WHERE checked.wind_speed BETWEEN w.min_speed AND w.max_speed
+            ORDER BY w.id
+            LIMIT 1
+        ) r ON TRUE
+        LEFT JOIN public.v_wind_correction_bands wb ON wb.band @> checked.height::INTEGER
+    ),
+    computed AS (
+        SELECT
+            corrections.*,
+            ROUND((corrections.temperature + corrections.virtual_correction)::NUMERIC(8,2)
+                  - corrections.table_temperature, 1)::NUMERIC(8,2) AS temperature_deviation,
+            CASE WHEN corrections.pressure BETWEEN 500 AND 900
+                 THEN ROUND(corrections.pressure - corrections.table_pressure, 1)::NUMERIC(8,2)
+            END AS pressure_deviation,
+            wc.correction_value AS wind_correction,
+            (corrections.wind_direction * (3.14159265358979 / 30.0))::NUMERIC(8,2) AS wind_direction_rad
+        FROM corrections
+        LEFT JOIN public.wind_corrections wc
+            ON wc.height = corrections.wind_height
+           AND wc.wind_range_id = corrections.wind_range_id
+    )
+    SELECT
+        ordinality,
+        height,
+        temperature,
+        temperature_deviation,
+        pressure,
+        pressure_deviation,
+        wind_direction,
+        wind_speed,
+        wind_correction,
+        bullet_demolition_range,
+        (wind_correction * SIN(wind_direction_rad))::NUMERIC(8,2) AS bullet_deviation,
+        COALESCE(
+            check_error,
+            CASE WHEN virtual_correction IS NULL
+                 THEN format('Температура %s выходит за пределы диапазона поправок', temperature) END,
+            CASE WHEN pressure_deviation IS NULL
+                 THEN format('Давление %s вне допустимого диапазона (500..900 мм рт.ст.)', pressure) END,
+            CASE WHEN wind_range_id IS NULL
+                 THEN format('Скорость ветра %s м/с не попадает ни в один из настроенных диапазонов', wind_speed) END,
+            CASE WHEN wind_correction IS NULL
+                 THEN format('Не найдена поправка для высоты %s и диапазона скорости ветра %s', wind_height, wind_range_id) END
+        ) AS error_message
+    FROM computed
+    ORDER BY ordinality;
+$$;
+
+COMMENT ON FUNCTION public.fn_calc_wind_rifle_corrections_bulk IS 'Пакетный расчет поправок по Ветровому ружью для массива input_params';
+
+-- 5. Поправки для всех измерений за период одним запросом
+CREATE OR REPLACE FUNCTION public.fn_calc_measurment_corrections(
+    par_from TIMESTAMP,
+    par_to TIMESTAMP
+)
+RETURNS TABLE (
+    measurment_input_param_id INTEGER,
+    emploee_id INTEGER,
+    started TIMESTAMP,
+    temperature_deviation NUMERIC(8,2),
+    pressure_deviation NUMERIC(8,2),
+    wind_correction NUMERIC(8,2),
+    bullet_deviation NUMERIC(8,2),
+    error_message TEXT
+)
+LANGUAGE SQL
+STABLE
+AS $$
+    WITH batch AS (
+        SELECT
+            ROW_NUMBER() OVER (ORDER BY mb.started, mb.id) AS ordinality,
+            mip.id AS measurment_input_param_id,
+            mb.emploee_id,
+            mb.started,
+            ROW(mip.height, mip.temperature, mip.pressure, mip.wind_direction,
+                mip.wind_speed, mip.bullet_demolition_range)::public.input_params AS params
+        FROM public.measurment_baths mb
+        JOIN public.measurment_input_params mip ON mip.id = mb.measurment_input_param_id
+        WHERE mb.started >= par_from AND mb.started < par_to
+    )
+    SELECT
+        batch.measurment_input_param_id,
+        batch.emploee_id,
+        batch.started,
+        c.temperature_deviation,
+        c.pressure_deviation,
+        c.wind_correction,
+        c.bullet_deviation,
+        c.error_message
+    FROM public.fn_calc_wind_rifle_corrections_bulk(
+        (SELECT array_agg(params ORDER BY ordinality) FROM batch)
+    ) c
+    JOIN batch ON batch.ordinality = c.ordinality
+    ORDER BY batch.ordinality;
+$$;
+
+COMMENT ON FUNCTION public.fn_calc_measurment_corrections IS 'Расчет поправок для всех измерений за период одним запросом';
+
+COMMIT;
@@ -0,0 +1,179 @@
+"""
+Потоковая загрузка больших CSV файлов в базу данных порциями.
+"""
+
+import logging
+import queue
+import threading
+import uuid
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger('interpolation_app')
+
+# Количество строк CSV в одной порции разбора
+CHUNK_SIZE = 200000
+# Максимальное количество точек, сохраняемых в памяти для отображения
+PREVIEW_SIZE = 20000
+# Количество разобранных порций, ожидающих записи в БД
+QUEUE_SIZE = 2
+# Префикс временного набора, в который пишутся порции до замены основного набора
+STAGING_PREFIX = '~ingest_'
+
+
+class IngestResult:
+    """Итог загрузки: счетчики строк и прореженная выборка для графика"""
+
+    def __init__(self, total_rows, invalid_rows, preview_x, preview_y):
+        self.total_rows = total_rows
+        self.invalid_rows = invalid_rows
+        self.preview_x = preview_x
+        self.preview_y = preview_y
+
+
+class StridedSample:
+    """Равномерная выборка ограниченного размера из потока точек.
+
+    Сохраняется каждая stride-я точка; при переполнении шаг удваивается и
+    половина накопленных точек отбрасывается, так что память не растет.
+    """
+
+    def __init__(self, max_size=PREVIEW_SIZE):
+        self.max_size = max_size
+        self.stride = 1
+        self.offset = 0
+        self.x = np.empty(0)
+        self.y = np.empty(0)
+
+    def add(self, x_values, y_values):
+        # Номер первой точки порции в общем потоке определяет фазу прореживания
+        first = (-self.offset) % self.stride
+        self.x = np.concatenate((self.x, x_values[first::self.stride]))
+        self.y = np.concatenate((self.y, y_values[first::self.stride]))
+        self.offset += len(x_values)
+
+        while len(self.x) > self.max_size:
+            self.stride *= 2
+            self.x = self.x[::2]
+            self.y = self.y[::2]
+
+
+def iter_csv_chunks(file_path, chunk_size=CHUNK_SIZE):
+    """Разбор CSV порциями: массивы X, Y (float64) и число некорректных строк.
+
+    Используются первые два столбца, первая строка считается заголовком.
+    Строки, в которых X или Y не являются числами, пропускаются.
+    """
+    reader = pd.read_csv(
+        file_path, header=None, skiprows=1, usecols=[0, 1], names=['x', 'y'],
+        chunksize=chunk_size, engine='c', encoding='utf-8', on_bad_lines='skip', skip_blank_lines=True
+    )
+    with reader:
+        for chunk in reader:
+            x_values = pd.to_numeric(chunk['x'], errors='coerce').to_numpy(dtype=np.float64)
+            y_values = pd.to_numeric(chunk['y'], errors='coerce').to_numpy(dtype=np.float64)
+
+            valid = ~(np.isnan(x_values) | np.isnan(y_values))
+            invalid_rows = int(valid.size - np.count_nonzero(valid))
+            if invalid_rows:
+                x_values, y_values = x_values[valid], y_values[valid]
+            yield x_values, y_values, invalid_rows
+
+
+def refresh_coefficients(db_manager, dataset_id, version, total_rows):
+    """Расчет коэффициентов моделей загруженного набора вне транзакции загрузки.
+
+    Точки читаются из БД: повторяющиеся X в файле уже схлопнуты ключом
+    (dataset_id, x). Если набор успел измениться, коэффициенты не
+    записываются (refresh_coefficients сверяет версию).
+    """
+    if db_manager.evaluation_mode == 'local' or total_rows > db_manager.COEFFICIENTS_MAX_POINTS:
+        return
+    try:
+        dataset = db_manager.load_data_points(dataset_id)
+        db_manager.refresh_coefficients(dataset_id, version, dataset.x, dataset.y)
+    except Exception as e:
+        # Точки сохранены; без коэффициентов процедура считает по исходным точкам
+        logger.warning(f"Не удалось рассчитать коэффициенты набора '{dataset_id}': {e}")
+
+
+def ingest_csv(file_path, db_manager, dataset_id, chunk_size=CHUNK_SIZE, preview_size=PREVIEW_SIZE,
+               progress=None, check=None):
+    """Загрузка CSV в points_table: разбор следующей порции идет параллельно записи текущей.
+
+    Порции пишутся во временный набор, который после разбора всего файла
+    одной транзакцией заменяет точки dataset_id: до этого читатели видят
+    прежний набор, а при ошибке или отмене удаляется только временный.
+    Коэффициенты моделей рассчитываются после замены один раз по всему набору.
+    progress(total_rows) вызывается после записи каждой порции, check()
+    может прервать загрузку исключением (например, при отмене задачи).
+    """
+    chunks = queue.Queue(maxsize=QUEUE_SIZE)
+    stop = threading.Event()
+
+    def put(item):
+        # Очередь ограничена, поэтому ждем места, пока запись не прекращена
+        while not stop.is_set():
+            try:
+                chunks.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for chunk in iter_csv_chunks(file_path, chunk_size):
+                if not put(chunk):
+                    return
+            put(None)
+        except Exception as e:
+            put(e)
+
+    producer = threading.Thread(target=produce, name='csv_ingest_parser', daemon=True)
+    producer.start()
+
+    staging_id = STAGING_PREFIX + uuid.uuid4().hex
+    sample = StridedSample(preview_size)
+    total_rows = invalid_rows = 0
+    version = None
+    try:
+        while True:
+            chunk = chunks.get()
+            if chunk is None:
+                break
+            if isinstance(chunk, Exception):
+                raise chunk
+
+            x_values, y_values, chunk_invalid = chunk
+            if check is not None:
+                check()
+
+            if not db_manager.append_data_points(x_values, y_values, staging_id):
+                raise RuntimeError("Не удалось сохранить точки в базе данных")
+
+            sample.add(x_values, y_values)
+            total_rows += len(x_values)
+            invalid_rows += chunk_invalid
+            if progress is not None:
+                progress(total_rows)
+
+        # Пустой файл не заменяет прежний набор
+        if total_rows:
+            version = db_manager.swap_dataset(staging_id, dataset_id)
+            if version is None:
+                raise RuntimeError("Не удалось заменить набор данных загруженными точками")
+    except BaseException:
+        # Неполный набор остается только во временном наборе; прежние точки dataset_id не тронуты
+        db_manager.drop_dataset(staging_id)
+        raise
+    finally:
+        stop.set()
+        producer.join()
+
+    if version is not None:
+        refresh_coefficients(db_manager, dataset_id, version, total_rows)
+    if invalid_rows:
+        logger.info(f"Пропущено некорректных строк CSV: {invalid_rows}")
+    return IngestResult(total_rows, invalid_rows, sample.x, sample.y)
@@ -0,0 +1,178 @@
+"""
+Набор точек интерполяции в столбцовом виде: два непрерывных массива float64.
+
+Массивы передаются без копирования между генерацией, загрузкой CSV,
+графиком, расчетом и записью в БД. Список кортежей (x, y) занимал на точку
+около 150 байт (кортеж и два объекта float), столбцы - 16 байт. Недавно
+использованные наборы хранятся на диске в файлах .npy (DatasetCache).
+"""
+
+import glob
+import hashlib
+import logging
+import os
+
+import numpy as np
+
+from interpolation_engine import prepare_points
+
+logger = logging.getLogger('interpolation_app')
+
+# Каталог кеша наборов данных на диске по умолчанию
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'interpolation_app')
+# Количество наборов, хранимых в кеше на диске
+DISK_CACHE_SIZE = 32
+
+
+class Dataset:
+    """Точки набора данных: столбцы X и Y и сведения о наборе.
+
+    is_sorted - X строго возрастают, и все значения конечны, то есть набор
+    уже в том виде, в котором его используют расчет и сохранение в БД.
+    Массивы не копируются, если уже имеют тип float64 и непрерывны, поэтому
+    после передачи в Dataset их нельзя изменять.
+    """
+
+    __slots__ = ('x', 'y', 'dataset_id', 'source', 'is_sorted')
+
+    def __init__(self, x, y, dataset_id='default', source=None, is_sorted=None):
+        x = np.ascontiguousarray(x, dtype=np.float64).reshape(-1)
+        y = np.ascontiguousarray(y, dtype=np.float64).reshape(-1)
+        if x.shape != y.shape:
+            raise ValueError("Массивы X и Y должны иметь одинаковую длину")
+
+        self.x = x
+        self.y = y
+        self.dataset_id = dataset_id
+        # Происхождение набора: 'generated', путь к CSV, 'db' и т.п.
+        self.source = source
+        self.is_sorted = self._check_sorted(x, y) if is_sorted is None else is_sorted
+
+    @staticmethod
+    def _check_sorted(x, y):
+        return bool(np.all(x[1:] > x[:-1]) and np.isfinite(x).all() and np.isfinite(y).all())
+
+    @classmethod
+    def empty(cls, dataset_id='default'):
+        return cls(np.empty(0), np.empty(0), dataset_id, is_sorted=True)
+
+    @classmethod
+    def from_points(cls, points, dataset_id='default', source=None):
+        """Набор из последовательности пар (x, y)"""
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        return cls(points[:, 0], points[:, 1], dataset_id, source)
+
+    def prepared(self):
+        """Набор с отсортированными уникальными X (повторяющиеся X усредняются)"""
+        if self.is_sorted:
+            return self
+        x_values, y_values = prepare_points(self.x, self.y)
+        return Dataset(x_values, y_values, self.dataset_id, self.source, is_sorted=True)
+
+    def bounds(self):
+        """Минимальный и максимальный X"""
+        if not len(self):
+            raise ValueError("Набор данных пуст")
+        if self.is_sorted:
+            return float(self.x[0]), float(self.x[-1])
+        return float(np.nanmin(self.x)), float(np.nanmax(self.x))
+
+    @property
+    def nbytes(self):
+        return self.x.nbytes + self.y.nbytes
+
+    def __len__(self):
+        return self.x.size
+
+    def __repr__(self):
+        return (f"Dataset(dataset_id={self.dataset_id!r}, points={len(self)}, "
+                f"source={self.source!r}, is_sorted={self.is_sorted})")
+
+
+class DatasetCache:
+    """Кеш подготовленных наборов данных на диске, ключ - dataset_id и версия.
+
+    Каждый набор хранится в файле .npy формы (2, n): первая строка - X,
+    вторая - Y. Файлы читаются через отображение в память, так что открытие
+    набора не копирует данные и не обращается к БД. Версия входит в имя
+    файла: новая версия пишется в новый файл, а старые удаляются. Наборы
+    разных баз данных с одинаковыми dataset_id и версией хранятся в отдельных
+    подкаталогах (scoped).
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_entries=DISK_CACHE_SIZE):
+        self.directory = directory
+        self.max_entries = max_entries
+
+    def scoped(self, name):
+        """Кеш в подкаталоге для name (например, сервера и базы данных) с тем же пределом размера"""
+        digest = hashlib.sha1(name.encode('utf-8')).hexdigest()[:20]
+        return DatasetCache(os.path.join(self.directory, digest), self.max_entries)
+
+    def _prefix(self, dataset_id):
+        # dataset_id может содержать любые символы, поэтому имя файла - его хеш
+        return os.path.join(self.directory, hashlib.sha1(dataset_id.encode('utf-8')).hexdigest()[:20])
+
+    def _path(self, dataset_id, version):
+        return f"{self._prefix(dataset_id)}-{version}.npy"
+
+    def get(self, dataset_id, version):
+        """Набор заданной версии из кеша или None"""
+        path = self._path(dataset_id, version)
+        try:
+            data = np.load(path, mmap_mode='r')
+            # Время изменения отмечает недавнее использование (для вытеснения)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return Dataset(data[0], data[1], dataset_id, source=path, is_sorted=True)
+
+    def put(self, dataset_id, version, x_values, y_values):
+        """Запись подготовленного набора (X строго возрастают) в кеш"""
+        path = self._path(dataset_id, version)
+        if os.path.exists(path):
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            data = np.lib.format.open_memmap(temp_path, mode='w+', dtype=np.float64, shape=(2, len(x_values)))
+            data[0] = x_values
+            data[1] = y_values
+            data.flush()
+            del data
+            # Файл версии появляется в кеше только полностью записанным
+            os.replace(temp_path, path)
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить набор '{dataset_id}' в кеш на диске: {e}")
+            return
+        self._remove(glob.glob(f"{glob.escape(self._prefix(dataset_id))}-*.npy"), keep=path)
+        self._evict()
+
+    def discard(self, dataset_id):
+        """Удаление всех версий набора из кеша"""
+        self._remove(glob.glob(f"{glob.escape(self._prefix(dataset_id))}-*.npy"))
+
+    def _evict(self):
+        paths = glob.glob(os.path.join(glob.escape(self.directory), '*.npy'))
+        if len(paths) <= self.max_entries:
+            return
+        paths.sort(key=self._last_used, reverse=True)
+        self._remove(paths[self.max_entries:])
+
+    @staticmethod
+    def _last_used(path):
+        try:
+            return os.stat(path).st_mtime
+        except OSError:
+            return 0.0
+
+    @staticmethod
+    def _remove(paths, keep=None):
+        for path in paths:
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                # Файл может быть отображен в память другим процессом (Windows) или уже удален
+                pass
@@ -0,0 +1,1008 @@
+"""
+Работа с базой данных MySQL: сохранение наборов точек, вызов хранимых
+процедур интерполяции и кеши результатов.
+
+Модуль не зависит от Tk, поэтому его используют и приложение (geroin2.py),
+и HTTP-сервис (service.py), и набор замеров (benchmark.py).
+"""
+
+import json
+import time
+import itertools
+import logging
+import threading
+from contextlib import contextmanager
+import numpy as np
+
+# mysql.connector импортируется при первом подключении
+from dataset import Dataset
+from interpolation_engine import InterpolationEngine, LRUCache, fit_model
+from metrics import InstrumentedConnection, Metrics
+
+logger = logging.getLogger('interpolation_app')
+
+
+def diff_points(x_old, y_old, x_new, y_new):
+    """Разница двух наборов точек с уникальными отсортированными X.
+
+    Возвращает X удаленных точек, а также X и Y добавленных или измененных.
+    """
+    _, old_index, new_index = np.intersect1d(x_old, x_new, assume_unique=True, return_indices=True)
+    removed = np.ones(x_old.size, dtype=bool)
+    removed[old_index] = False
+    upsert = np.ones(x_new.size, dtype=bool)
+    upsert[new_index] = y_old[old_index] != y_new[new_index]
+    return x_old[removed], x_new[upsert], y_new[upsert]
+
+
+class DatabaseManager:
+    """Класс для работы с базой данных и вызова хранимых процедур.
+
+    Соединения берутся из пула на время одной операции, поэтому экземпляр
+    можно использовать одновременно из нескольких рабочих потоков.
+    """
+
+    # Режимы расчета: хранимая процедура в БД или локальный движок NumPy
+    EVALUATION_MODES = ('database', 'local')
+
+    # Версия схемы таблиц; отметка в schema_info позволяет не повторять проверки при запуске
+    SCHEMA_VERSION = 3
+    SCHEMA_COMPONENT = 'interpolation_app'
+
+    # Точка набора однозначно определяется X: повторная запись заменяет Y
+    UPSERT_POINT_SQL = """INSERT INTO points_table (x, y, dataset_id) VALUES (%s, %s, %s)
+                          ON DUPLICATE KEY UPDATE y = VALUES(y);"""
+    # Максимальное количество строк в одном многострочном INSERT или DELETE
+    INSERT_BATCH_SIZE = 10000
+    # Результат однозначно определяется ключом (набор, тип, степень, X) и версией набора
+    UPSERT_RESULT_SQL = """INSERT INTO interpolation_results
+                           (dataset_id, interpolation_type, polynomial_degree, x_target, dataset_version,
+                            y_result, error_code, error_message)
+                           VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                           ON DUPLICATE KEY UPDATE dataset_version = VALUES(dataset_version),
+                               y_result = VALUES(y_result), error_code = VALUES(error_code),
+                               error_message = VALUES(error_message);"""
+    UPSERT_MODEL_SQL = """INSERT INTO interpolation_models
+                          (dataset_id, interpolation_type, polynomial_degree, dataset_version, x_min, x_max, segments)
+                          VALUES (%s, %s, %s, %s, %s, %s, %s)
+                          ON DUPLICATE KEY UPDATE dataset_version = VALUES(dataset_version), x_min = VALUES(x_min),
+                              x_max = VALUES(x_max), segments = VALUES(segments);"""
+    INSERT_COEFFICIENT_SQL = """INSERT INTO interpolation_coefficients
+                                (dataset_id, interpolation_type, polynomial_degree, segment, x_start, c0, c1, c2, c3)
+                                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s);"""
+    # Правка отдельных отрезков линейной модели
+    UPSERT_COEFFICIENT_SQL = """INSERT INTO interpolation_coefficients
+                                (dataset_id, interpolation_type, polynomial_degree, segment, x_start, c0, c1, c2, c3)
+                                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                                ON DUPLICATE KEY UPDATE c0 = VALUES(c0), c1 = VALUES(c1), c2 = VALUES(c2),
+                                    c3 = VALUES(c3);"""
+    # Модели, коэффициенты которых рассчитываются при сохранении набора: (вид, степень)
+    PRECOMPUTED_MODELS = (('linear', 0), ('spline', 0), ('lagrange', 0)) + tuple(
+        ('polynomial', degree) for degree in range(1, 6))
+    # Наибольший набор, для которого коэффициенты рассчитываются заново (для Лагранжа - отдельный предел:
+    # веса считаются за O(n^2), а расчет в БД идет по всем узлам)
+    COEFFICIENTS_MAX_POINTS = 200000
+    LAGRANGE_MAX_POINTS = 2000
+
+    def __init__(self, host='localhost', port=3306, database='interpolation_db', user='user', password='password',
+                 evaluation_mode='database', model_cache_size=32, pool_size=5, pool_name='interpolation_pool',
+                 max_retries=2, result_cache_size=4096, result_flush_size=1000, result_flush_interval=2.0,
+                 metrics=None, slow_query_threshold=None, dataset_cache=None):
+        if evaluation_mode not in self.EVALUATION_MODES:
+            raise ValueError(f"Неизвестный режим расчета: {evaluation_mode}")
+
+        self.connection_params = {
+            'host': host, 'port': port, 'database': database, 'user': user, 'password': password
+        }
+        self.pool_size = pool_size
+        self.pool_name = pool_name
+        # Замеры всех запросов, commit и событий соединений
+        self.metrics = metrics if metrics is not None else Metrics(slow_query_threshold=slow_query_threshold)
+        self.max_retries = max_retries
+        # Ошибки, при которых операция повторяется на новом соединении (задаются в connect)
+        self.retryable_errors = ()
+        self._schema_ready = False
+        self.pool = None
+        self._pool_lock = threading.Lock()
+        # Пул mysql.connector не ждет свободного соединения, поэтому ограничиваем выдачу сами
+        self._pool_slots = threading.BoundedSemaphore(pool_size)
+
+        self.evaluation_mode = evaluation_mode
+        self.engine = InterpolationEngine(self._load_dataset, cache_size=model_cache_size)
+        # Последнее сохраненное состояние наборов: {dataset_id: (версия, X, Y)}
+        self._saved = LRUCache(max_size=model_cache_size)
+        # Кеш наборов на диске (DatasetCache): повторное открытие набора не читает точки из БД.
+        # Подкаталог кеша выбирается при подключении по серверу и базе данных
+        self._dataset_cache_root = dataset_cache
+        self.dataset_cache = None
+
+        # Кеш результатов: {(набор, тип, степень, X, версия набора): (значение, код, сообщение)}
+        self.results = LRUCache(max_size=result_cache_size)
+        # Отложенная запись результатов: строки копятся и пишутся одной вставкой
+        self.result_flush_size = result_flush_size
+        self.result_flush_interval = result_flush_interval
+        self._pending_results = {}
+        self._pending_lock = threading.Lock()
+        self._flush_timer = None
+
+    def connect(self):
+        """Создание пула соединений с базой данных"""
+        try:
+            from mysql.connector import errors, pooling
+            self.retryable_errors = (errors.OperationalError, errors.InterfaceError)
+
+            with self._pool_lock:
+                if self.pool is None:
+                    start = time.perf_counter()
+                    pool = pooling.MySQLConnectionPool(
+                        pool_name=self.pool_name, pool_size=self.pool_size, **self.connection_params
+                    )
+                    if self._dataset_cache_root is not None:
+                        self.dataset_cache = self._dataset_cache_root.scoped(self._server_identity(pool))
+                    self.pool = pool
+                    self.metrics.observe_event('connect', time.perf_counter() - start)
+            return True
+        except Exception as e:
+            logger.error(f"Ошибка при подключении к MySQL: {e}")
+            self.metrics.observe_event('connect_failed')
+            return False
+
+    def _server_identity(self, pool):
+        """Адрес сервера, база данных и server_uuid (он меняется при пересоздании сервера с тем же адресом)"""
+        connection = pool.get_connection()
+        try:
+            cursor = connection.cursor()
+            cursor.execute("SELECT @@server_uuid;")
+            server_uuid = cursor.fetchone()[0]
+            cursor.close()
+        finally:
+            connection.close()
+        params = self.connection_params
+        return f"{params['host']}:{params['port']}/{params['database']}/{server_uuid}"
+
+    def disconnect(self):
+        """Запись отложенных результатов и закрытие всех соединений пула"""
+        self.flush_results()
+        with self._pool_lock:
+            if self.pool is not None:
+                self.pool._remove_connections()
+                self.pool = None
+
+    @contextmanager
+    def _connection(self):
+        """Соединение из пула с проверкой живости; возвращается в пул при выходе"""
+        if self.pool is None and not self.connect():
+            raise ConnectionError("Нет соединения с базой данных")
+
+        start = time.perf_counter()
+        with self._pool_slots:
+            connection = self.pool.get_connection()
+            self.metrics.observe_event('pool_acquire', time.perf_counter() - start)
+            try:
+                # Проверка живости
+                if not connection.is_connected():
+                    start = time.perf_counter()
+                    connection.reconnect(attempts=1, delay=0)
+                    self.metrics.observe_event('reconnect', time.perf_counter() - start)
+                instrumented = InstrumentedConnection(connection, self.metrics)
+                yield instrumented
+                # Незавершенная транзакция чтения удерживала бы в пуле старый снимок данных
+                if connection.in_transaction:
+                    instrumented.commit()
+            except self.retryable_errors:
+                self.metrics.observe_event('connection_lost')
+                raise
+            except Exception:
+                instrumented.rollback()
+                raise
+            finally:
+                connection.close()
+
+    def _run(self, operation):
+        """Выполнение операции на соединении из пула с повтором при обрыве связи"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self._connection() as connection:
+                    return operation(connection)
+            except self.retryable_errors as e:
+                if attempt == self.max_retries:
+                    raise
+                self.metrics.observe_event('retry')
+                logger.warning(f"Соединение с БД потеряно, повтор {attempt + 1}/{self.max_retries}: {e}")
+
+    @staticmethod
+    def _has_index(cursor, table_name, index_name):
+        cursor.execute("""
+            SELECT COUNT(*) FROM information_schema.statistics
+            WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s;
+        """, (table_name, index_name))
+        return cursor.fetchone()[0] > 0
+
+    @staticmethod
+    def _has_column(cursor, table_name, column_name):
+        cursor.execute("""
+            SELECT COUNT(*) FROM information_schema.columns
+            WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s;
+        """, (table_name, column_name))
+        return cursor.fetchone()[0] > 0
+
+    def _schema_version(self, cursor):
+        """Версия схемы, отмеченная в schema_info (0, если таблицы еще нет)"""
+        from mysql.connector import errorcode, errors
+        try:
+            cursor.execute("SELECT version FROM schema_info WHERE component = %s;", (self.SCHEMA_COMPONENT,))
+        except errors.ProgrammingError as e:
+            if e.errno == errorcode.ER_NO_SUCH_TABLE:
+                return 0
+            raise
+        row = cursor.fetchone()
+        return row[0] if row else 0
+
+    def create_tables_if_not_exist(self):
+        """Создание необходимых таблиц, если они не существуют.
+
+        Проверки и миграции выполняются один раз: после них в schema_info
+        записывается версия схемы, и следующие запуски ограничиваются одним
+        запросом этой версии.
+        """
+        if self._schema_ready:
+            return True
+
+        def operation(connection):
+            cursor = connection.cursor()
+            if self._schema_version(cursor) >= self.SCHEMA_VERSION:
+                cursor.close()
+                return True
+
+            # Таблица для точек данных
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS points_table (
+                    id INT AUTO_INCREMENT PRIMARY KEY,
+                    x DOUBLE NOT NULL,
+                    y DOUBLE NOT NULL,
+                    dataset_id VARCHAR(50) NOT NULL DEFAULT 'default',
+                    UNIQUE KEY ux_points_dataset_x (dataset_id, x)
+                );
+            """)
+
+            # Таблицы, созданные до появления ключа (dataset_id, x)
+            if not self._has_index(cursor, 'points_table', 'ux_points_dataset_x'):
+                # Повторяющиеся X внутри набора схлопываются в одну точку со средним Y, как в prepare_points:
+                # среднее записывается в первую точку, остальные удаляются. Агрегат материализует
+                # производную таблицу, поэтому UPDATE может читать ту же таблицу
+                cursor.execute("""
+                    UPDATE points_table p
+                    JOIN (SELECT MIN(id) AS id, AVG(y) AS y FROM points_table
+                          GROUP BY dataset_id, x HAVING COUNT(*) > 1) d ON d.id = p.id
+                    SET p.y = d.y;
+                """)
+                cursor.execute("""
+                    DELETE p FROM points_table p
+                    JOIN points_table q ON q.dataset_id = p.dataset_id AND q.x = p.x AND q.id < p.id;
+                """)
+                cursor.execute("ALTER TABLE points_table ADD UNIQUE KEY ux_points_dataset_x (dataset_id, x);")
+
+            # Версии наборов данных: увеличиваются при каждом изменении точек
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS datasets (
+                    dataset_id VARCHAR(50) PRIMARY KEY,
+                    version INT NOT NULL DEFAULT 0,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+                );
+            """)
+
+            # Таблица для результатов (второй уровень кеша расчетов)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS interpolation_results (
+                    id INT AUTO_INCREMENT PRIMARY KEY,
+                    dataset_id VARCHAR(50) NOT NULL,
+                    interpolation_type VARCHAR(50) NOT NULL,
+                    polynomial_degree INT NOT NULL DEFAULT 0,
+                    x_target DOUBLE NOT NULL,
+                    dataset_version INT NOT NULL,
+                    y_result DOUBLE,
+                    error_code INT,
+                    error_message VARCHAR(255),
+                    UNIQUE KEY ux_results_key (dataset_id, interpolation_type, polynomial_degree, x_target)
+                );
+            """)
+
+            # Таблицы, в которых каждый расчет добавлял новую строку
+            if not self._has_column(cursor, 'interpolation_results', 'polynomial_degree'):
+                cursor.execute("ALTER TABLE interpolation_results "
+                               "ADD COLUMN polynomial_degree INT NOT NULL DEFAULT 0 AFTER interpolation_type;")
+            if not self._has_column(cursor, 'interpolation_results', 'dataset_version'):
+                # Старые строки не совпадут ни с одной версией набора
+                cursor.execute("ALTER TABLE interpolation_results "
+                               "ADD COLUMN dataset_version INT NOT NULL DEFAULT -1 AFTER x_target;")
+            if not self._has_index(cursor, 'interpolation_results', 'ux_results_key'):
+                # Из повторов остается последний расчет
+                cursor.execute("""
+                    DELETE r FROM interpolation_results r
+                    JOIN interpolation_results q
+                      ON q.dataset_id = r.dataset_id AND q.interpolation_type = r.interpolation_type
+                     AND q.polynomial_degree = r.polynomial_degree AND q.x_target = r.x_target AND q.id > r.id;
+                """)
+                cursor.execute("ALTER TABLE interpolation_results ADD UNIQUE KEY ux_results_key "
+                               "(dataset_id, interpolation_type, polynomial_degree, x_target);")
+
+            # Заранее вычисленные модели наборов (процедура CalculateInterpolationPrecomputed)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS interpolation_models (
+                    dataset_id VARCHAR(50) NOT NULL,
+                    interpolation_type VARCHAR(50) NOT NULL,
+                    polynomial_degree INT NOT NULL DEFAULT 0,
+                    dataset_version INT NOT NULL,
+                    x_min DOUBLE NOT NULL,
+                    x_max DOUBLE NOT NULL,
+                    segments INT NOT NULL,
+                    PRIMARY KEY (dataset_id, interpolation_type, polynomial_degree)
+                );
+            """)
+            # Строка - отрезок сплайна (линейной интерполяции) или узел Лагранжа, определяемые x_start,
+            # либо член полинома степени segment (для остальных видов segment = 0)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS interpolation_coefficients (
+                    dataset_id VARCHAR(50) NOT NULL,
+                    interpolation_type VARCHAR(50) NOT NULL,
+                    polynomial_degree INT NOT NULL DEFAULT 0,
+                    segment INT NOT NULL,
+                    x_start DOUBLE NOT NULL,
+                    c0 DOUBLE NOT NULL,
+                    c1 DOUBLE NOT NULL,
+                    c2 DOUBLE NOT NULL,
+                    c3 DOUBLE NOT NULL,
+                    PRIMARY KEY (dataset_id, interpolation_type, polynomial_degree, x_start, segment)
+                );
+            """)
+
+            # Таблицы версии 2 нумеровали отрезки по порядку; коэффициенты будут рассчитаны заново
+            if self._has_index(cursor, 'interpolation_coefficients', 'ix_coefficients_x'):
+                cursor.execute("DELETE FROM interpolation_coefficients;")
+                cursor.execute("DELETE FROM interpolation_models;")
+                cursor.execute("ALTER TABLE interpolation_coefficients "
+                               "DROP PRIMARY KEY, DROP KEY ix_coefficients_x, "
+                               "ADD PRIMARY KEY (dataset_id, interpolation_type, polynomial_degree, x_start, segment);")
+
+            # Отметка о том, что схема этой версии проверена
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS schema_info (
+                    component VARCHAR(50) PRIMARY KEY,
+                    version INT NOT NULL,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+                );
+            """)
+            cursor.execute("INSERT INTO schema_info (component, version) VALUES (%s, %s) "
+                           "ON DUPLICATE KEY UPDATE version = VALUES(version);",
+                           (self.SCHEMA_COMPONENT, self.SCHEMA_VERSION))
+            logger.info(f"Схема БД проверена, версия {self.SCHEMA_VERSION}")
+
+            connection.commit()
+            cursor.close()
+            return True
+
+        try:
+            self._schema_ready = self._run(operation)
+            return self._schema_ready
+        except Exception as e:
+            logger.error(f"Ошибка при создании таблиц: {e}")
+            return False
+
+    def _lock_dataset(self, cursor, dataset_id):
+        """Блокировка строки набора до конца транзакции; возвращает текущую версию"""
+        cursor.execute("INSERT INTO datasets (dataset_id, version) VALUES (%s, 0) "
+                       "ON DUPLICATE KEY UPDATE version = version;", (dataset_id,))
+        cursor.execute("SELECT version FROM datasets WHERE dataset_id = %s FOR UPDATE;", (dataset_id,))
+        return cursor.fetchone()[0]
+
+    @staticmethod
+    def _bump_version(cursor, dataset_id, version):
+        cursor.execute("UPDATE datasets SET version = %s WHERE dataset_id = %s;", (version + 1, dataset_id))
+        return version + 1
+
+    @staticmethod
+    def _select_points(cursor, dataset_id, x_min=None, x_max=None):
+        """Чтение точек набора по диапазону ключа (dataset_id, x), упорядоченных по X"""
+        sql = "SELECT x, y FROM points_table WHERE dataset_id = %s"
+        params = [dataset_id]
+        if x_min is not None:
+            sql += " AND x >= %s"
+            params.append(float(x_min))
+        if x_max is not None:
+            sql += " AND x <= %s"
+            params.append(float(x_max))
+        cursor.execute(sql + " ORDER BY x;", params)
+        rows = cursor.fetchall()
+        return (np.fromiter((row[0] for row in rows), dtype=np.float64, count=len(rows)),
+                np.fromiter((row[1] for row in rows), dtype=np.float64, count=len(rows)))
+
+    def _upsert_points(self, cursor, dataset_id, x_values, y_values):
+        # Ограничиваем размер одного многострочного INSERT
+        for start in range(0, len(x_values), self.INSERT_BATCH_SIZE):
+            stop = start + self.INSERT_BATCH_SIZE
+            cursor.executemany(self.UPSERT_POINT_SQL, [
+                (x, y, dataset_id)
+                for x, y in zip(x_values[start:stop].tolist(), y_values[start:stop].tolist())
+            ])
+
+    def _delete_points(self, cursor, dataset_id, x_values):
+        for start in range(0, len(x_values), self.INSERT_BATCH_SIZE):
+            chunk = x_values[start:start + self.INSERT_BATCH_SIZE].tolist()
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(f"DELETE FROM points_table WHERE dataset_id = %s AND x IN ({placeholders});",
+                           [dataset_id] + chunk)
+
+    @staticmethod
+    def _delete_coefficients(cursor, dataset_id):
+        cursor.execute("DELETE FROM interpolation_coefficients WHERE dataset_id = %s;", (dataset_id,))
+        cursor.execute("DELETE FROM interpolation_models WHERE dataset_id = %s;", (dataset_id,))
+
+    def _update_linear_coefficients(self, cursor, dataset_id, version, x_new, y_new, removed_x, changed_x):
+        """Правка коэффициентов линейной модели только вокруг измененных X (в транзакции сохранения точек).
+
+        version - версия набора до изменения. Возвращает False, если сохраненная
+        модель не соответствует этой версии: тогда модель рассчитывается заново
+        после сохранения (refresh_coefficients).
+        """
+        cursor.execute("SELECT dataset_version FROM interpolation_models WHERE dataset_id = %s "
+                       "AND interpolation_type = 'linear' AND polynomial_degree = 0 FOR UPDATE;", (dataset_id,))
+        row = cursor.fetchone()
+        if row is None or row[0] != version or x_new.size < 2:
+            return False
+
+        # Отрезок i (от x[i] до x[i + 1]) меняется, если изменен один из его концов или удалена точка внутри него
+        changed_index = np.searchsorted(x_new, changed_x)
+        removed_index = np.searchsorted(x_new, removed_x)
+        segments = np.unique(np.concatenate((changed_index - 1, changed_index, removed_index - 1)))
+        segments = segments[(segments >= 0) & (segments < x_new.size - 1)]
+        slopes = (y_new[segments + 1] - y_new[segments]) / (x_new[segments + 1] - x_new[segments])
+        if not np.isfinite(slopes).all():
+            return False
+
+        # Удаленные точки и последняя точка набора не начинают отрезков
+        self._delete_coefficient_rows(cursor, dataset_id, 'linear', np.append(removed_x, x_new[-1]))
+        cursor.executemany(self.UPSERT_COEFFICIENT_SQL, [
+            (dataset_id, 'linear', 0, 0, x, y, slope, 0.0, 0.0)
+            for x, y, slope in zip(x_new[segments].tolist(), y_new[segments].tolist(), slopes.tolist())
+        ])
+        cursor.execute(self.UPSERT_MODEL_SQL, (dataset_id, 'linear', 0, version + 1,
+                                               float(x_new[0]), float(x_new[-1]), x_new.size - 1))
+        return True
+
+    def _delete_coefficient_rows(self, cursor, dataset_id, interpolation_type, x_values):
+        for start in range(0, len(x_values), self.INSERT_BATCH_SIZE):
+            chunk = x_values[start:start + self.INSERT_BATCH_SIZE].tolist()
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(f"DELETE FROM interpolation_coefficients WHERE dataset_id = %s AND interpolation_type = %s "
+                           f"AND polynomial_degree = 0 AND x_start IN ({placeholders});",
+                           [dataset_id, interpolation_type] + chunk)
+
+    def _model_versions(self, dataset_id):
+        """Версии наборов, для которых записаны модели: {(вид, степень): версия}"""
+
+        def operation(connection):
+            cursor = connection.cursor()
+            cursor.execute("SELECT interpolation_type, polynomial_degree, dataset_version FROM interpolation_models "
+                           "WHERE dataset_id = %s;", (dataset_id,))
+            versions = {(row[0], row[1]): row[2] for row in cursor.fetchall()}
+            cursor.close()
+            return versions
+
+        return self._run(operation)
+
+    def _replace_coefficients(self, dataset_id, version, interpolation_type, degree, x_min, x_max, columns):
+        """Запись коэффициентов одной модели, если набор все еще имеет версию version"""
+
+        def operation(connection):
+            cursor = connection.cursor()
+            cursor.execute("SELECT dataset_version FROM interpolation_models WHERE dataset_id = %s "
+                           "AND interpolation_type = %s AND polynomial_degree = %s FOR UPDATE;",
+                           (dataset_id, interpolation_type, degree))
+            row = cursor.fetchone()
+            # Набор успели изменить (False), или модель этой версии уже записал другой клиент
+            current = self._select_version(cursor, dataset_id) == version
+            if not current or (row is not None and row[0] == version):
+                connection.commit()
+                cursor.close()
+                return current
+
+            cursor.execute("DELETE FROM interpolation_coefficients WHERE dataset_id = %s "
+                           "AND interpolation_type = %s AND polynomial_degree = %s;",
+                           (dataset_id, interpolation_type, degree))
+            # Член полинома определяется степенью, остальные строки - своим x_start
+            size = columns[0].size
+            segments = range(size) if interpolation_type == 'polynomial' else itertools.repeat(0, size)
+            rows = zip(segments, *(column.tolist() for column in columns))
+            for start in range(0, size, self.INSERT_BATCH_SIZE):
+                cursor.executemany(self.INSERT_COEFFICIENT_SQL, [
+                    (dataset_id, interpolation_type, degree) + row
+                    for row in itertools.islice(rows, self.INSERT_BATCH_SIZE)
+                ])
+            cursor.execute(self.UPSERT_MODEL_SQL, (dataset_id, interpolation_type, degree, version,
+                                                   x_min, x_max, size))
+            connection.commit()
+            cursor.close()
+            return True
+
+        return self._run(operation)
+
+    def refresh_coefficients(self, dataset_id, version, x_values, y_values):
+        """Расчет коэффициентов моделей, которых нет для версии набора version.
+
+        Вызывается после сохранения точек, вне транзакции с блокировкой набора:
+        модели подбираются без соединения с БД, а каждая записывается отдельной
+        транзакцией, только если набор за это время не изменился. В локальном
+        режиме коэффициенты не нужны и не рассчитываются. Возвращает количество
+        записанных моделей.
+        """
+        if self.evaluation_mode == 'local' or not x_values.size or x_values.size > self.COEFFICIENTS_MAX_POINTS:
+            return 0
+
+        versions = self._model_versions(dataset_id)
+        stored = 0
+        for interpolation_type, degree in self.PRECOMPUTED_MODELS:
+            if versions.get((interpolation_type, degree)) == version:
+                continue
+            if interpolation_type == 'lagrange' and x_values.size > self.LAGRANGE_MAX_POINTS:
+                continue
+            try:
+                model = fit_model(interpolation_type, x_values, y_values, polynomial_degree=degree)
+            except ValueError:
+                # Слишком мало точек для этого вида; расчет пойдет по исходным точкам
+                continue
+
+            columns = model.coefficients()
+            if not all(np.isfinite(column).all() for column in columns):
+                # DOUBLE в MySQL не хранит бесконечности и NaN (например, переполнение весов Лагранжа)
+                continue
+            if not self._replace_coefficients(dataset_id, version, interpolation_type, degree,
+                                              float(x_values[0]), float(x_values[-1]), columns):
+                # Набор уже изменен; его коэффициенты рассчитает следующее сохранение
+                break
+            stored += 1
+        return stored
+
+    def _forget_dataset(self, dataset_id):
+        """Сброс всех кешей набора данных после его изменения"""
+        self._saved.discard(lambda key: key == dataset_id)
+        self.engine.invalidate(dataset_id)
+        self.results.discard(lambda key: key[0] == dataset_id)
+        with self._pending_lock:
+            for key in [key for key in self._pending_results if key[0] == dataset_id]:
+                del self._pending_results[key]
+
+    def insert_data_points(self, points, dataset_id='default'):
+        """Сохранение набора точек: в БД записывается только разница с сохраненной версией.
+
+        points - Dataset или последовательность пар (x, y). Повторяющиеся X
+        усредняются, как и при расчете. Если набор с момента последнего
+        сохранения менял другой клиент, разница считается относительно его
+        текущего содержимого в БД.
+        """
+        if not isinstance(points, Dataset):
+            points = Dataset.from_points(points, dataset_id)
+        prepared = points.prepared()
+        x_new, y_new = prepared.x, prepared.y
+
+        def operation(connection):
+            cursor = connection.cursor()
+            version = self._lock_dataset(cursor, dataset_id)
+
+            saved = self._saved.get(dataset_id)
+            if saved is not None and saved[0] == version:
+                x_old, y_old = saved[1], saved[2]
+            else:
+                cached = self.dataset_cache.get(dataset_id, version) if self.dataset_cache is not None else None
+                if cached is not None:
+                    x_old, y_old = cached.x, cached.y
+                else:
+                    x_old, y_old = self._select_points(cursor, dataset_id)
+
+            removed_x, changed_x, changed_y = diff_points(x_old, y_old, x_new, y_new)
+            self._delete_points(cursor, dataset_id, removed_x)
+            self._upsert_points(cursor, dataset_id, changed_x, changed_y)
+            if removed_x.size or changed_x.size:
+                # Отрезки линейной модели меняются только рядом с измененными точками; остальные
+                # модели (изменение точки меняет весь сплайн) рассчитываются после транзакции
+                if self.evaluation_mode == 'database':
+                    self._update_linear_coefficients(cursor, dataset_id, version, x_new, y_new,
+                                                     removed_x, changed_x)
+                version = self._bump_version(cursor, dataset_id, version)
+
+            connection.commit()
+            cursor.close()
+            logger.info(f"Набор '{dataset_id}' версии {version}: удалено {removed_x.size}, "
+                        f"записано {changed_x.size} точек")
+            return version
+
+        try:
+            version = self._run(operation)
+
+            # Подобранные модели и результаты для этого набора больше не актуальны
+            self._forget_dataset(dataset_id)
+            self._saved.put(dataset_id, (version, x_new, y_new))
+            self.engine.set_points(dataset_id, x_new, y_new)
+            if self.dataset_cache is not None:
+                self.dataset_cache.put(dataset_id, version, x_new, y_new)
+        except Exception as e:
+            logger.error(f"Ошибка при добавлении точек: {e}")
+            self._forget_dataset(dataset_id)
+            return False
+
+        try:
+            self.refresh_coefficients(dataset_id, version, x_new, y_new)
+        except Exception as e:
+            # Точки сохранены; без коэффициентов процедура считает по исходным точкам
+            logger.warning(f"Не удалось рассчитать коэффициенты набора '{dataset_id}': {e}")
+        return True
+
+    def append_data_points(self, x_values, y_values, dataset_id='default', replace=False):
+        """Дозапись массивов точек в набор данных (с заменой старых точек при replace).
+
+        Точки с уже существующими X заменяют прежние значения Y.
+        """
+
+        def operation(connection):
+            cursor = connection.cursor()
+            version = self._lock_dataset(cursor, dataset_id)
+            if replace:
+                cursor.execute("DELETE FROM points_table WHERE dataset_id = %s;", (dataset_id,))
+                # Коэффициенты после дозаписи устарели бы; расчет идет по исходным точкам
+                self._delete_coefficients(cursor, dataset_id)
+
+            self._upsert_points(cursor, dataset_id, x_values, y_values)
+            self._bump_version(cursor, dataset_id, version)
+
+            connection.commit()
+            cursor.close()
+            return True
+
+        try:
+            return self._run(operation)
+        except Exception as e:
+            logger.error(f"Ошибка при добавлении точек: {e}")
+            return False
+        finally:
+            self._forget_dataset(dataset_id)
+
+    def swap_dataset(self, staging_id, dataset_id='default'):
+        """Замена точек набора точками временного набора staging_id одной транзакцией.
+
+        До commit читатели видят прежний набор, после - новый целиком.
+        Временный набор при этом исчезает. Возвращает новую версию набора или
+        None при ошибке (тогда прежний набор не изменен).
+        """
+
+        def operation(connection):
+            cursor = connection.cursor()
+            version = self._lock_dataset(cursor, dataset_id)
+            cursor.execute("DELETE FROM points_table WHERE dataset_id = %s;", (dataset_id,))
+            cursor.execute("UPDATE points_table SET dataset_id = %s WHERE dataset_id = %s;", (dataset_id, staging_id))
+            self._delete_coefficients(cursor, dataset_id)
+            cursor.execute("DELETE FROM datasets WHERE dataset_id = %s;", (staging_id,))
+            version = self._bump_version(cursor, dataset_id, version)
+            connection.commit()
+            cursor.close()
+            return version
+
+        try:
+            return self._run(operation)
+        except Exception as e:
+            logger.error(f"Ошибка при замене набора '{dataset_id}': {e}")
+            return None
+        finally:
+            self._forget_dataset(dataset_id)
+            self._forget_dataset(staging_id)
+            if self.dataset_cache is not None:
+                self.dataset_cache.discard(dataset_id)
+
+    def drop_dataset(self, dataset_id):
+        """Удаление набора данных вместе с его версией (временные наборы загрузки)"""
+
+        def operation(connection):
+            cursor = connection.cursor()
+            self._lock_dataset(cursor, dataset_id)
+            cursor.execute("DELETE FROM points_table WHERE dataset_id = %s;", (dataset_id,))
+            self._delete_coefficients(cursor, dataset_id)
+            cursor.execute("DELETE FROM datasets WHERE dataset_id = %s;", (dataset_id,))
+            connection.commit()
+            cursor.close()
+            return True
+
+        try:
+            return self._run(operation)
+        except Exception as e:
+            logger.error(f"Ошибка при удалении набора '{dataset_id}': {e}")
+            return False
+        finally:
+            self._forget_dataset(dataset_id)
+
+    def delete_data_points(self, dataset_id='default'):
+        """Удаление всех точек набора данных (версия набора сохраняется и растет)"""
+
+        def operation(connection):
+            cursor = connection.cursor()
+            version = self._lock_dataset(cursor, dataset_id)
+            cursor.execute("DELETE FROM points_table WHERE dataset_id = %s;", (dataset_id,))
+            self._delete_coefficients(cursor, dataset_id)
+            self._bump_version(cursor, dataset_id, version)
+            connection.commit()
+            cursor.close()
+            return True
+
+        try:
+            return self._run(operation)
+        except Exception as e:
+            logger.error(f"Ошибка при удалении точек: {e}")
+            return False
+        finally:
+            self._forget_dataset(dataset_id)
+            if self.dataset_cache is not None:
+                self.dataset_cache.discard(dataset_id)
+
+    @staticmethod
+    def _select_version(cursor, dataset_id):
+        cursor.execute("SELECT version FROM datasets WHERE dataset_id = %s;", (dataset_id,))
+        row = cursor.fetchone()
+        return row[0] if row else 0
+
+    def dataset_version(self, dataset_id='default'):
+        """Текущая версия набора данных (0, если набор еще не сохранялся)"""
+
+        def operation(connection):
+            cursor = connection.cursor()
+            version = self._select_version(cursor, dataset_id)
+            cursor.close()
+            return version
+
+        return self._run(operation)
+
+    def _read_dataset(self, cursor, dataset_id, version):
+        """Точки набора заданной версии: из кеша на диске, иначе из БД с записью в кеш"""
+        if self.dataset_cache is not None:
+            cached = self.dataset_cache.get(dataset_id, version)
+            if cached is not None:
+                return cached.x, cached.y
+
+        x_values, y_values = self._select_points(cursor, dataset_id)
+        if self.dataset_cache is not None and x_values.size:
+            self.dataset_cache.put(dataset_id, version, x_values, y_values)
+        return x_values, y_values
+
+    def _load_dataset(self, dataset_id):
+        """Загрузка набора для локального движка вместе с его версией"""
+
+        def operation(connection):
+            cursor = connection.cursor()
+            # Версия и точки читаются в одной транзакции, то есть из одного снимка
+            version = self._select_version(cursor, dataset_id)
+            x_values, y_values = self._read_dataset(cursor, dataset_id, version)
+            cursor.close()
+            return version, x_values, y_values
+
+        version, x_values, y_values = self._run(operation)
+        self._saved.put(dataset_id, (version, x_values, y_values))
+        return x_values, y_values
+
+    def load_data_points(self, dataset_id='default', x_min=None, x_max=None):
+        """Чтение точек набора данных (при заданных границах - только диапазона X) в виде Dataset"""
+
+        def operation(connection):
+            cursor = connection.cursor()
+            version = self._select_version(cursor, dataset_id)
+            cached = self.dataset_cache.get(dataset_id, version) if self.dataset_cache is not None else None
+            if cached is not None:
+                # Диапазон вырезается из отображенного в память файла без чтения из БД
+                start = 0 if x_min is None else np.searchsorted(cached.x, x_min, side='left')
+                stop = len(cached) if x_max is None else np.searchsorted(cached.x, x_max, side='right')
+                x_values, y_values = cached.x[start:stop], cached.y[start:stop]
+            elif x_min is None and x_max is None:
+                x_values, y_values = self._read_dataset(cursor, dataset_id, version)
+            else:
+                x_values, y_values = self._select_points(cursor, dataset_id, x_min, x_max)
+            cursor.close()
+            # Ключ (dataset_id, x) уникален, а точки упорядочены по X
+            return Dataset(x_values, y_values, dataset_id, source='db', is_sorted=True)
+
+        return self._run(operation)
+
+    @staticmethod
+    def _result_key(dataset_id, interpolation_type, polynomial_degree, x_target, version):
+        # Степень влияет только на полиномиальную интерполяцию. Версия набора входит в ключ:
+        # после сохранения набора другим клиентом старые результаты больше не находятся
+        degree = int(polynomial_degree) if interpolation_type == 'polynomial' else 0
+        return dataset_id, interpolation_type, degree, float(x_target), version
+
+    def _cached_results(self, keys, values, error_codes, error_messages):
+        """Заполнение результатов из кеша в памяти; возвращает индексы промахов"""
+        missing = []
+        for index, key in enumerate(keys):
+            cached = self.results.get(key)
+            if cached is not None:
+                values[index], error_codes[index], error_messages[index] = cached
+            else:
+                missing.append(index)
+        return np.array(missing, dtype=np.intp)
+
+    def _lookup_results(self, cursor, dataset_id, interpolation_type, degree, version, x_values):
+        """Поиск сохраненных результатов текущей версии набора по уникальному ключу"""
+        found = {}
+        for start in range(0, len(x_values), self.INSERT_BATCH_SIZE):
+            chunk = x_values[start:start + self.INSERT_BATCH_SIZE]
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(f"""
+                SELECT x_target, y_result, error_code, error_message FROM interpolation_results
+                WHERE dataset_id = %s AND interpolation_type = %s AND polynomial_degree = %s
+                  AND dataset_version = %s AND x_target IN ({placeholders});
+            """, [dataset_id, interpolation_type, degree, version] + chunk)
+            for x_target, y_result, error_code, error_message in cursor.fetchall():
+                found[x_target] = (y_result, error_code or 0, error_message or '')
+        return found
+
+    def _local_version(self, dataset_id):
+        saved = self._saved.get(dataset_id)
+        return saved[0] if saved is not None else self.dataset_version(dataset_id)
+
+    def calculate_interpolation(self, interpolation_type, x_target, polynomial_degree=3, dataset_id='default'):
+        """Расчет интерполяции в точке (хранимой процедурой или локальным движком)"""
+        values, error_codes, error_messages = self.calculate_interpolation_batch(
+            interpolation_type, [x_target], polynomial_degree, dataset_id, save_results=True
+        )
+        result_value = None if np.isnan(values[0]) else float(values[0])
+        return result_value, int(error_codes[0]), error_messages[0]
+
+    def calculate_interpolation_batch(self, interpolation_type, x_targets, polynomial_degree=3, dataset_id='default',
+                                      save_results=None):
+        """Пакетный расчет интерполяции: один вызов процедуры на весь вектор X.
+
+        Возвращает три массива NumPy той же длины, что и x_targets: значения
+        (NaN там, где результата нет), коды ошибок и сообщения. Уже известные
+        результаты берутся из кеша в памяти, затем из interpolation_results;
+        считаются только оставшиеся точки. Новые результаты (кроме неудачных
+        расчетов с кодом -1) попадают в буфер отложенной записи; в локальном
+        режиме по умолчанию сетка считается без обращения к БД.
+        """
+        x_targets = np.asarray(x_targets, dtype=np.float64).ravel()
+        values = np.full(x_targets.shape, np.nan)
+        error_codes = np.zeros(x_targets.shape, dtype=np.int32)
+        error_messages = np.full(x_targets.shape, '', dtype=object)
+
+        if save_results is None:
+            save_results = self.evaluation_mode == 'database'
+
+        if not x_targets.size:
+            return values, error_codes, error_messages
+
+        # Сетки больше кеша не кешируются поэлементно: они бы только вытеснили его
+        use_cache = x_targets.size <= self.results.max_size
+
+        def result_keys(version):
+            return [self._result_key(dataset_id, interpolation_type, polynomial_degree, x, version)
+                    for x in x_targets.tolist()]
+
+        if self.evaluation_mode == 'local':
+            # Версия копии набора, по которой считает движок (известна после ее загрузки)
+            version = self._local_version(dataset_id)
+            keys = result_keys(version)
+            missing = np.arange(x_targets.size)
+            if use_cache:
+                missing = self._cached_results(keys, values, error_codes, error_messages)
+                if not missing.size:
+                    return values, error_codes, error_messages
+
+            (values[missing], error_codes[missing], error_messages[missing]) = self.engine.evaluate(
+                interpolation_type, x_targets[missing], polynomial_degree, dataset_id
+            )
+            computed = missing
+        else:
+            def operation(connection):
+                cursor = connection.cursor()
+                # Кешу в памяти можно верить только для текущей версии набора в БД
+                version = self._select_version(cursor, dataset_id)
+                keys = result_keys(version)
+
+                missing = np.arange(x_targets.size)
+                if use_cache:
+                    missing = self._cached_results(keys, values, error_codes, error_messages)
+
+                computed = missing
+                if use_cache and missing.size:
+                    # Второй уровень кеша: результаты, сохраненные для этой версии набора
+                    found = self._lookup_results(cursor, dataset_id, interpolation_type, keys[0][2],
+                                                 version, sorted(set(x_targets[missing].tolist())))
+                    stored = np.array([x in found for x in x_targets[missing].tolist()], dtype=bool)
+                    for index in missing[stored].tolist():
+                        y_result, error_codes[index], error_messages[index] = found[float(x_targets[index])]
+                        if y_result is not None:
+                            values[index] = y_result
+                    computed = missing[~stored]
+                cursor.close()
+
+                cursor = connection.cursor(dictionary=True)
+                if computed.size:
+                    # Оставшаяся сетка X передается одним JSON-массивом; при наличии коэффициентов
+                    # процедура считает по ним, иначе по исходным точкам
+                    cursor.callproc('CalculateInterpolationPrecomputed',
+                                    [interpolation_type, dataset_id,
+                                     json.dumps(x_targets[computed].tolist()), polynomial_degree])
+
+                    # Итоговый набор процедуры всегда последний
+                    rows = []
+                    for result in cursor.stored_results():
+                        rows = result.fetchall()
+
+                    for row in rows:
+                        index = computed[row['position']]
+                        if row['result_value'] is not None:
+                            values[index] = row['result_value']
+                        error_codes[index] = row['error_code'] or 0
+                        error_messages[index] = row['error_message'] or ''
+
+                connection.commit()
+                cursor.close()
+                return keys, missing, computed
+
+            try:
+                keys, missing, computed = self._run(operation)
+            except Exception as e:
+                logger.error(f"Ошибка при пакетном вызове процедуры интерполяции: {e}")
+                error_codes[:] = -1
+                error_messages[:] = str(e)
+                return values, error_codes, error_messages
+
+        # Неудачный расчет (код -1) может быть временным, поэтому не кешируется и не записывается
+        missing = missing[error_codes[missing] >= 0]
+        computed = computed[error_codes[computed] >= 0]
+
+        if use_cache:
+            for index in missing.tolist():
+                self.results.put(keys[index], (values[index], error_codes[index], error_messages[index]))
+
+        # Найденные в interpolation_results строки повторно не записываются
+        if save_results:
+            self._enqueue_results([
+                keys[index] + (None if np.isnan(values[index]) else float(values[index]),
+                               int(error_codes[index]), error_messages[index])
+                for index in computed.tolist()
+            ])
+        return values, error_codes, error_messages
+
+    def _enqueue_results(self, rows):
+        """Постановка строк результатов в буфер отложенной записи"""
+        with self._pending_lock:
+            for row in rows:
+                # Повторный расчет той же точки заменяет строку в буфере
+                self._pending_results[row[:4]] = row
+            pending = len(self._pending_results)
+            if pending and pending < self.result_flush_size and self._flush_timer is None:
+                self._flush_timer = threading.Timer(self.result_flush_interval, self.flush_results)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+
+        if pending >= self.result_flush_size:
+            self.flush_results()
+
+    def flush_results(self):
+        """Запись накопленных результатов в interpolation_results пакетной вставкой"""
+        with self._pending_lock:
+            rows = list(self._pending_results.values())
+            self._pending_results.clear()
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+        if not rows:
+            return True
+
+        def operation(connection):
+            cursor = connection.cursor()
+            for start in range(0, len(rows), self.INSERT_BATCH_SIZE):
+                cursor.executemany(self.UPSERT_RESULT_SQL, rows[start:start + self.INSERT_BATCH_SIZE])
+            connection.commit()
+            cursor.close()
+            return True
+
+        try:
+            return self._run(operation)
+        except Exception as e:
+            logger.error(f"Ошибка при сохранении {len(rows)} результатов интерполяции: {e}")
+            return False
@@ -13,13 +13,22 @@ INSERT INTO measure_settings (parameter_name, min_value, max_value, unit) VALUES
     ('wind_direction', 0, 59, 'degrees')
 ON CONFLICT (parameter_name) DO NOTHING;
 
--- 3. Создание пользовательского типа данных
+-- 3. Создание пользовательских типов данных
 CREATE TYPE measure_type AS (
     temperature NUMERIC,
     pressure NUMERIC,
     wind_direction INTEGER
 );
 
+-- Измерение для пакетной загрузки (время NULL - текущее)
+CREATE TYPE measurement_input AS (
+    employee_id INT,
+    temperature NUMERIC,
+    pressure NUMERIC,
+    wind_direction INTEGER,
+    measurement_time TIMESTAMP
+);
+
 -- 4. Функция проверки входных параметров с динамическими границами
 CREATE OR REPLACE FUNCTION validate_measurements(
     temp NUMERIC,
@@ -29,15 +38,16 @@ CREATE OR REPLACE FUNCTION validate_measurements(
 DECLARE
     limits RECORD;
 BEGIN
-    -- Получаем границы всех параметров одним запросом
+    -- Получаем границы всех параметров за один проход по таблице настроек
     SELECT
-        (SELECT min_value FROM measure_settings WHERE parameter_name = 'temperature') AS min_temp,
-        (SELECT max_value FROM measure_settings WHERE parameter_name = 'temperature') AS max_temp,
-        (SELECT min_value FROM measure_settings WHERE parameter_name = 'pressure') AS min_pres,
-        (SELECT max_value FROM measure_settings WHERE parameter_name = 'pressure') AS max_pres,
-        (SELECT min_value FROM measure_settings WHERE parameter_name = 'wind_direction') AS min_wind,
-        (SELECT max_value FROM measure_settings WHERE parameter_name = 'wind_direction') AS max_wind
-    INTO limits;
+        MIN(min_value) FILTER (WHERE parameter_name = 'temperature') AS min_temp,
+        MAX(max_value) FILTER (WHERE parameter_name = 'temperature') AS max_temp,
+        MIN(min_value) FILTER (WHERE parameter_name = 'pressure') AS min_pres,
+        MAX(max_value) FILTER (WHERE parameter_name = 'pressure') AS max_pres,
+        MIN(min_value) FILTER (WHERE parameter_name = 'wind_direction') AS min_wind,
+        MAX(max_value) FILTER (WHERE parameter_name = 'wind_direction') AS max_wind
+    INTO limits
+    FROM measure_settings;
 
     -- Проверка границ
     IF temp < limits.min_temp OR temp > limits.max_temp THEN
@@ -54,18 +64,20 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
--- 5. Функция расчета среднего значения измерений
+-- 5. Функция расчета среднего значения измерений.
+-- Суммы и количество измерений сотрудника ведутся триггерами в
+-- measurement_aggregates, поэтому среднее - чтение одной строки по ключу.
 CREATE OR REPLACE FUNCTION calculate_meteo_average(user_id INT)
 RETURNS measure_type AS $$
 DECLARE
     avg_values measure_type;
 BEGIN
     SELECT
-        AVG(temperature),
-        AVG(pressure),
-        ROUND(AVG(wind_direction))
+        temperature_sum / NULLIF(measurement_count, 0),
+        pressure_sum / NULLIF(measurement_count, 0),
+        ROUND(wind_direction_sum::NUMERIC / NULLIF(measurement_count, 0))
     INTO avg_values
-    FROM measurements
+    FROM measurement_aggregates
     WHERE employee_id = user_id;
 
     RETURN avg_values;
@@ -82,36 +94,176 @@ CREATE TABLE IF NOT EXISTS measurements (
     measurement_time TIMESTAMP DEFAULT NOW()
 );
 
+CREATE INDEX IF NOT EXISTS ix_measurements_employee_id ON measurements (employee_id);
+
 -- 7. Таблица сотрудников
 CREATE TABLE IF NOT EXISTS employees (
     id SERIAL PRIMARY KEY,
     name TEXT NOT NULL
 );
 
--- 8. Генерация тестовых данных
-DO $$
+-- 8. Накопительные показатели измерений по сотрудникам
+CREATE TABLE IF NOT EXISTS measurement_aggregates (
+    employee_id INT PRIMARY KEY,
+    temperature_sum NUMERIC NOT NULL DEFAULT 0,
+    pressure_sum NUMERIC NOT NULL DEFAULT 0,
+    wind_direction_sum BIGINT NOT NULL DEFAULT 0,
+    measurement_count BIGINT NOT NULL DEFAULT 0,
+    last_updated TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+-- Триггеры уровня оператора: изменения всего оператора (например, пакетной
+-- загрузки) сворачиваются в одно обновление строки на сотрудника.
+CREATE OR REPLACE FUNCTION refresh_measurement_aggregates()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO measurement_aggregates AS a
+            (employee_id, temperature_sum, pressure_sum, wind_direction_sum, measurement_count, last_updated)
+        SELECT employee_id, SUM(temperature), SUM(pressure), SUM(wind_direction), COUNT(*), NOW()
+        FROM new_rows
+        GROUP BY employee_id
+        ON CONFLICT (employee_id) DO UPDATE SET
+            temperature_sum = a.temperature_sum + EXCLUDED.temperature_sum,
+            pressure_sum = a.pressure_sum + EXCLUDED.pressure_sum,
+            wind_direction_sum = a.wind_direction_sum + EXCLUDED.wind_direction_sum,
+            measurement_count = a.measurement_count + EXCLUDED.measurement_count,
+            last_updated = EXCLUDED.last_updated;
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE measurement_aggregates a SET
+            temperature_sum = a.temperature_sum - d.temperature_sum,
+            pressure_sum = a.pressure_sum - d.pressure_sum,
+            wind_direction_sum = a.wind_direction_sum - d.wind_direction_sum,
+            measurement_count = a.measurement_count - d.measurement_count,
+            last_updated = NOW()
+        FROM (
+            SELECT employee_id, SUM(temperature) AS temperature_sum, SUM(pressure) AS pressure_sum,
+                   SUM(wind_direction) AS wind_direction_sum, COUNT(*) AS measurement_count
+            FROM old_rows
+            GROUP BY employee_id
+        ) d
+        WHERE a.employee_id = d.employee_id;
+    ELSE
+        -- UPDATE: старые значения вычитаются, новые прибавляются (сотрудник мог смениться)
+        INSERT INTO measurement_aggregates AS a
+            (employee_id, temperature_sum, pressure_sum, wind_direction_sum, measurement_count, last_updated)
+        SELECT employee_id, SUM(temperature), SUM(pressure), SUM(wind_direction), SUM(delta), NOW()
+        FROM (
+            SELECT employee_id, temperature, pressure, wind_direction, 1 AS delta FROM new_rows
+            UNION ALL
+            SELECT employee_id, -temperature, -pressure, -wind_direction, -1 FROM old_rows
+        ) changes
+        GROUP BY employee_id
+        ON CONFLICT (employee_id) DO UPDATE SET
+            temperature_sum = a.temperature_sum + EXCLUDED.temperature_sum,
+            pressure_sum = a.pressure_sum + EXCLUDED.pressure_sum,
+            wind_direction_sum = a.wind_direction_sum + EXCLUDED.wind_direction_sum,
+            measurement_count = a.measurement_count + EXCLUDED.measurement_count,
+            last_updated = EXCLUDED.last_updated;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_measurement_aggregates_insert ON measurements;
+CREATE TRIGGER trg_measurement_aggregates_insert
+    AFTER INSERT ON measurements
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION refresh_measurement_aggregates();
+
+DROP TRIGGER IF EXISTS trg_measurement_aggregates_delete ON measurements;
+CREATE TRIGGER trg_measurement_aggregates_delete
+    AFTER DELETE ON measurements
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION refresh_measurement_aggregates();
+
+DROP TRIGGER IF EXISTS trg_measurement_aggregates_update ON measurements;
+CREATE TRIGGER trg_measurement_aggregates_update
+    AFTER UPDATE ON measurements
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION refresh_measurement_aggregates();
+
+-- Пересчет показателей по уже имеющимся измерениям (при повторном запуске скрипта)
+INSERT INTO measurement_aggregates
+    (employee_id, temperature_sum, pressure_sum, wind_direction_sum, measurement_count, last_updated)
+SELECT employee_id, SUM(temperature), SUM(pressure), SUM(wind_direction), COUNT(*), NOW()
+FROM measurements
+GROUP BY employee_id
+ON CONFLICT (employee_id) DO UPDATE SET
+    temperature_sum = EXCLUDED.temperature_sum,
+    pressure_sum = EXCLUDED.pressure_sum,
+    wind_direction_sum = EXCLUDED.wind_direction_sum,
+    measurement_count = EXCLUDED.measurement_count,
+    last_updated = EXCLUDED.last_updated;
+
+-- 9. Пакетная загрузка измерений.
+-- Границы читаются один раз на вызов, проверка и вставка выполняются одним
+-- оператором по всему массиву. Корректные измерения вставляются, для
+-- отклоненных возвращаются номер в массиве (с 1) и причина.
+CREATE OR REPLACE FUNCTION ingest_measurements(par_measurements measurement_input[])
+RETURNS TABLE (item_position INT, error_message TEXT) AS $$
 DECLARE
-    emp_id INT;
-    temp NUMERIC;
-    pres NUMERIC;
-    wind_dir INTEGER;
+    limits RECORD;
 BEGIN
-    -- Добавляем 5 сотрудников и генерируем данные
-    FOR emp_id IN 1..5 LOOP
-        INSERT INTO employees (name) VALUES ('Employee ' || emp_id) RETURNING id INTO emp_id;
-
-        FOR _ IN 1..100 LOOP
-            temp := -58 + RANDOM() * 116;  -- (-58 до 58)
-            pres := 500 + RANDOM() * 400;  -- (500 до 900)
-            wind_dir := FLOOR(RANDOM() * 60);  -- от 0 до 59
-
-            BEGIN
-                INSERT INTO measurements (employee_id, temperature, pressure, wind_direction)
-                VALUES (emp_id, temp, pres, wind_dir);
-            EXCEPTION
-                WHEN OTHERS THEN
-                    RAISE NOTICE 'Ошибка при вставке измерения: %, %, %', temp, pres, wind_dir;
-            END;
-        END LOOP;
-    END LOOP;
-END $$;
+    SELECT
+        MIN(min_value) FILTER (WHERE parameter_name = 'temperature') AS min_temp,
+        MAX(max_value) FILTER (WHERE parameter_name = 'temperature') AS max_temp,
+        MIN(min_value) FILTER (WHERE parameter_name = 'pressure') AS min_pres,
+        MAX(max_value) FILTER (WHERE parameter_name = 'pressure') AS max_pres,
+        MIN(min_value) FILTER (WHERE parameter_name = 'wind_direction') AS min_wind,
+        MAX(max_value) FILTER (WHERE parameter_name = 'wind_direction') AS max_wind
+    INTO limits
+    FROM measure_settings;
+
+    RETURN QUERY
+    WITH items AS (
+        SELECT i.ord::INT AS ord, i.emp_id, i.temp, i.pres, i.wind_dir, i.measured_at
+        FROM unnest(par_measurements) WITH ORDINALITY
+             AS i(emp_id, temp, pres, wind_dir, measured_at, ord)
+    ),
+    checked AS (
+        SELECT items.*,
+               CASE
+                   WHEN emp_id IS NULL OR temp IS NULL OR pres IS NULL OR wind_dir IS NULL
+                       THEN 'Не заданы все параметры измерения'
+                   WHEN temp < limits.min_temp OR temp > limits.max_temp
+                       THEN format('Температура выходит за границы (допустимый диапазон: %s - %s)',
+                                   limits.min_temp, limits.max_temp)
+                   WHEN pres < limits.min_pres OR pres > limits.max_pres
+                       THEN format('Давление выходит за границы (допустимый диапазон: %s - %s)',
+                                   limits.min_pres, limits.max_pres)
+                   WHEN wind_dir < limits.min_wind OR wind_dir > limits.max_wind
+                       THEN format('Направление ветра выходит за границы (допустимый диапазон: %s - %s)',
+                                   limits.min_wind, limits.max_wind)
+               END AS reason
+        FROM items
+    ),
+    inserted AS (
+        INSERT INTO measurements (employee_id, temperature, pressure, wind_direction, measurement_time)
+        SELECT emp_id, temp, pres, wind_dir, COALESCE(measured_at, NOW())
+        FROM checked
+        WHERE reason IS NULL
+        ORDER BY ord
+    )
+    SELECT checked.ord, checked.reason
+    FROM checked
+    WHERE checked.reason IS NOT NULL
+    ORDER BY checked.ord;
+END;
+$$ LANGUAGE plpgsql;
+
+-- 10. Генерация тестовых данных: 5 сотрудников по 100 измерений, одним оператором
+WITH new_employees AS (
+    INSERT INTO employees (name)
+    SELECT 'Employee ' || n
+    FROM generate_series(1, 5) AS n
+    RETURNING id
+)
+INSERT INTO measurements (employee_id, temperature, pressure, wind_direction)
+SELECT e.id,
+       -58 + RANDOM() * 116,  -- (-58 до 58)
+       500 + RANDOM() * 400,  -- (500 до 900)
+       FLOOR(RANDOM() * 60)   -- от 0 до 59
+FROM new_employees e
+CROSS JOIN generate_series(1, 100);
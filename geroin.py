@@ -1,64 +1,375 @@
+import io
+import os
+import sys
 import time
+import uuid
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import util
 import numpy as np
 import psycopg2
 from scipy.interpolate import interp1d
 
-# Подключение к базе данных PostgreSQL
-conn = psycopg2.connect(
-    dbname="mydb",
-    user="user",
-    password="5309",
-    host="localhost",
-    port="5432"
-)
-cursor = conn.cursor()
-
-# Создание таблицы для хранения результатов
-cursor.execute("""
-    CREATE TABLE IF NOT EXISTS interpolation_results (
-        id SERIAL PRIMARY KEY,
-        x_value FLOAT NOT NULL,
-        y_value FLOAT NOT NULL
-    )
-""")
-conn.commit()
-
-# Исходные данные для интерполяции (пример)
-x_data = np.array([0, 10, 20, 30, 40])
-y_data = np.array([0, 100, 400, 900, 1600])
-
-# Создание интерполяционной функции
-interp_func = interp1d(x_data, y_data, kind='linear')
-
-# Запуск замера времени
-start_time = time.time()
-
-# Буфер для хранения данных перед вставкой
-batch_size = 1000
-batch_data = []
-
-# Выполнение расчетов и запись в базу данных
-for x in np.arange(0, 40.01, 0.01):
-    y = interp_func(x).item()  # Преобразование numpy.ndarray в float
-    batch_data.append((float(x), float(y)))
-
-    # Периодическая вставка данных в базу (каждые batch_size записей)
-    if len(batch_data) >= batch_size:
-        cursor.executemany("INSERT INTO interpolation_results (x_value, y_value) VALUES (%s, %s)", batch_data)
-        conn.commit()  # Выполняем commit после каждой партии данных
-        batch_data = []  # Очистка буфера
-
-# Записываем оставшиеся данные, если есть
-if batch_data:
-    cursor.executemany("INSERT INTO interpolation_results (x_value, y_value) VALUES (%s, %s)", batch_data)
+# Параметры подключения к базе данных PostgreSQL
+DB_PARAMS = {
+    'dbname': "mydb",
+    'user': "user",
+    'password': "5309",
+    'host': "localhost",
+    'port': "5432"
+}
+
+# Режим записи: 'copy' (COPY ... FROM STDIN) или 'executemany' (построчные INSERT)
+WRITE_MODE = 'copy'
+# Формат COPY: 'text' или 'binary'
+COPY_FORMAT = 'text'
+# Количество строк в одной порции данных
+BATCH_SIZE = 1000
+# Commit после каждых N порций; None - вся сетка записывается одной транзакцией
+COMMIT_EVERY = None
+
+# Сетка X по умолчанию (правая граница не включается, как в np.arange)
+X_START = 0.0
+X_STOP = 40.01
+X_STEP = 0.01
+# Количество точек сетки в одной задаче параллельного режима
+CHUNK_SIZE = 1000000
+
+RESULTS_TABLE = 'interpolation_results'
+# Промежуточная таблица рабочего процесса (режим --staging): run - метка запуска, pid - процесс
+STAGING_TABLE = 'interpolation_results_stage_{run}_{pid}'
+
+INSERT_SQL = "INSERT INTO {table} (x_value, y_value) VALUES (%s, %s)"
+COPY_SQL = "COPY {table} (x_value, y_value) FROM STDIN WITH (FORMAT {format})"
+
+# Заголовок и завершение двоичного формата COPY
+PGCOPY_HEADER = b'PGCOPY\n\xff\r\n\x00' + (0).to_bytes(4, 'big') + (0).to_bytes(4, 'big')
+PGCOPY_TRAILER = (-1).to_bytes(2, 'big', signed=True)
+
+# Строка двоичного COPY: число полей, затем длина и значение каждого поля
+PGCOPY_ROW = np.dtype([
+    ('fields', '>i2'),
+    ('x_length', '>i4'), ('x', '>f8'),
+    ('y_length', '>i4'), ('y', '>f8'),
+])
+
+
+class GeneratorStream(io.RawIOBase):
+    """Файлоподобная обертка над генератором байтов для copy_expert"""
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.buffer = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, target):
+        while not self.buffer:
+            try:
+                self.buffer = next(self.chunks)
+            except StopIteration:
+                return 0
+        size = min(len(target), len(self.buffer))
+        target[:size] = self.buffer[:size]
+        self.buffer = self.buffer[size:]
+        return size
+
+
+def iter_batches(x_values, y_values, batch_size):
+    """Разбиение массивов на порции по batch_size строк"""
+    for start in range(0, len(x_values), batch_size):
+        yield x_values[start:start + batch_size], y_values[start:start + batch_size]
+
+
+def iter_copy_text(batches):
+    """Порции в текстовом формате COPY (repr сохраняет точность float)"""
+    for x_batch, y_batch in batches:
+        yield ''.join(f"{x!r}\t{y!r}\n" for x, y in zip(x_batch.tolist(), y_batch.tolist())).encode()
+
+
+def iter_copy_binary(batches):
+    """Порции в двоичном формате COPY"""
+    yield PGCOPY_HEADER
+    for x_batch, y_batch in batches:
+        rows = np.empty(len(x_batch), dtype=PGCOPY_ROW)
+        rows['fields'] = 2
+        rows['x_length'] = 8
+        rows['y_length'] = 8
+        rows['x'] = x_batch
+        rows['y'] = y_batch
+        yield rows.tobytes()
+    yield PGCOPY_TRAILER
+
+
+def write_executemany(conn, cursor, x_values, y_values, batch_size=BATCH_SIZE, commit_every=COMMIT_EVERY,
+                      table=RESULTS_TABLE):
+    """Запись через executemany порциями по batch_size строк"""
+    sql = INSERT_SQL.format(table=table)
+    for index, (x_batch, y_batch) in enumerate(iter_batches(x_values, y_values, batch_size), start=1):
+        cursor.executemany(sql, list(zip(x_batch.tolist(), y_batch.tolist())))
+        if commit_every and index % commit_every == 0:
+            conn.commit()
+    conn.commit()
+
+
+def write_copy(conn, cursor, x_values, y_values, batch_size=BATCH_SIZE, commit_every=COMMIT_EVERY,
+               copy_format=COPY_FORMAT, table=RESULTS_TABLE):
+    """Потоковая запись через COPY ... FROM STDIN из генератора порций"""
+    encode = iter_copy_binary if copy_format == 'binary' else iter_copy_text
+    sql = COPY_SQL.format(table=table, format='binary' if copy_format == 'binary' else 'text')
+
+    # Одна транзакция - один COPY; иначе отдельный COPY на каждые commit_every порций
+    rows_per_copy = batch_size * commit_every if commit_every else max(len(x_values), 1)
+    for start in range(0, len(x_values), rows_per_copy):
+        stop = start + rows_per_copy
+        batches = iter_batches(x_values[start:stop], y_values[start:stop], batch_size)
+        cursor.copy_expert(sql, GeneratorStream(encode(batches)), size=1 << 16)
+        if commit_every:
+            conn.commit()
+    conn.commit()
+
+
+def write_grid(conn, cursor, x_values, y_values, options, table=RESULTS_TABLE):
+    """Запись сетки выбранным способом (options - параметры командной строки)"""
+    if options['write_mode'] == 'copy':
+        write_copy(conn, cursor, x_values, y_values, options['batch_size'], options['commit_every'],
+                   options['copy_format'], table=table)
+    else:
+        write_executemany(conn, cursor, x_values, y_values, options['batch_size'], options['commit_every'],
+                          table=table)
+
+
+def grid_size(x_start, x_stop, x_step):
+    """Количество точек сетки np.arange(x_start, x_stop, x_step)"""
+    return max(int(np.ceil((x_stop - x_start) / x_step)), 0)
+
+
+def grid_chunk(x_start, x_step, first, last):
+    """Точки сетки с номерами [first, last) - те же значения, что дает np.arange"""
+    # np.arange заполняет массив как start + i * delta, где delta = (start + step) - start
+    delta = (x_start + x_step) - x_start
+    return x_start + np.arange(first, last, dtype=np.float64) * delta
+
+
+# Соединение и промежуточная таблица рабочего процесса (свои в каждом процессе)
+_worker_conn = None
+_worker_run = None
+_worker_table = None
+
+
+def init_worker(db_params, staging_run):
+    """Инициализация рабочего процесса: отдельное соединение с БД.
+
+    staging_run - метка запуска для имен промежуточных таблиц (None - запись
+    сразу в таблицу результатов).
+    """
+    global _worker_conn, _worker_run
+    _worker_conn = psycopg2.connect(**db_params)
+    _worker_run = staging_run
+    # Рабочие процессы пула завершаются без вызова обработчиков atexit,
+    # а финализаторы multiprocessing выполняются
+    util.Finalize(None, close_worker, exitpriority=10)
+
+
+def close_worker():
+    """Закрытие соединения рабочего процесса при остановке пула"""
+    global _worker_conn
+    if _worker_conn is not None:
+        _worker_conn.close()
+        _worker_conn = None
+
+
+def worker_table():
+    """Таблица для записи рабочим процессом; промежуточная создается при первой задаче"""
+    global _worker_table
+    if _worker_table is None:
+        if _worker_run is None:
+            _worker_table = RESULTS_TABLE
+        else:
+            table = STAGING_TABLE.format(run=_worker_run, pid=os.getpid())
+            cursor = _worker_conn.cursor()
+            # UNLOGGED: промежуточные данные не пишутся в WAL
+            cursor.execute(f"""
+                CREATE UNLOGGED TABLE IF NOT EXISTS {table} (
+                    x_value FLOAT NOT NULL,
+                    y_value FLOAT NOT NULL
+                )
+            """)
+            cursor.execute(f"TRUNCATE {table}")
+            _worker_conn.commit()
+            cursor.close()
+            _worker_table = table
+    return _worker_table
+
+
+def evaluate_chunk(x_data, y_data, x_start, x_step, first, last, options):
+    """Расчет и запись части сетки в рабочем процессе; (таблица, число строк)"""
+    interp_func = interp1d(x_data, y_data, kind='linear')
+    x_grid = grid_chunk(x_start, x_step, first, last)
+    y_grid = np.asarray(interp_func(x_grid), dtype=np.float64)
+
+    table = worker_table()
+    cursor = _worker_conn.cursor()
+    try:
+        write_grid(_worker_conn, cursor, x_grid, y_grid, options, table=table)
+    except Exception:
+        _worker_conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    return table, len(x_grid)
+
+
+def merge_staging(conn, cursor, tables):
+    """Перенос строк из промежуточных таблиц одной транзакцией (в порядке X)"""
+    tables = sorted(tables)
+    union = " UNION ALL ".join(f"SELECT x_value, y_value FROM {table}" for table in tables)
+    cursor.execute(f"INSERT INTO {RESULTS_TABLE} (x_value, y_value) {union} ORDER BY x_value")
+    for table in tables:
+        cursor.execute(f"DROP TABLE {table}")
+    conn.commit()
+
+
+def drop_staging(conn, cursor, staging_run):
+    """Удаление всех промежуточных таблиц запуска, включая таблицы процессов, чьи задачи не завершились"""
+    # Транзакция могла прерваться ошибкой переноса
+    conn.rollback()
+    cursor.execute("SELECT tablename FROM pg_tables WHERE schemaname = current_schema() AND tablename LIKE %s",
+                   (STAGING_TABLE.format(run=staging_run, pid='%'),))
+    for (table,) in cursor.fetchall():
+        cursor.execute(f"DROP TABLE IF EXISTS {table}")
     conn.commit()
 
-# Замер времени выполнения
-end_time = time.time()
-execution_time = end_time - start_time
 
-print(f"Время выполнения: {execution_time:.4f} секунд")
+def run_parallel(conn, cursor, x_data, y_data, args, options):
+    """Параллельный расчет: сетка делится на задачи по chunk_size точек.
+
+    С --staging результат появляется в таблице одной транзакцией, а
+    промежуточные таблицы удаляются и при ошибке. Без --staging каждая задача
+    фиксирует свою часть сетки сама, поэтому запись не атомарна: при ошибке
+    части, записанные завершенными задачами, остаются в таблице.
+    """
+    total = grid_size(args.x_start, args.x_stop, args.x_step)
+    tasks = [(first, min(first + args.chunk_size, total)) for first in range(0, total, args.chunk_size)]
+    staging_run = uuid.uuid4().hex[:8] if args.staging else None
+
+    rows = 0
+    tables = set()
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker,
+                                 initargs=(DB_PARAMS, staging_run)) as pool:
+            futures = [
+                pool.submit(evaluate_chunk, x_data, y_data, args.x_start, args.x_step, first, last, options)
+                for first, last in tasks
+            ]
+            try:
+                for future in as_completed(futures):
+                    table, count = future.result()
+                    tables.add(table)
+                    rows += count
+            except BaseException:
+                # Незапущенные задачи после ошибки не выполняются
+                pool.shutdown(cancel_futures=True)
+                if staging_run is None:
+                    print(f"Ошибка расчета: в {RESULTS_TABLE} уже записано строк: {rows}", file=sys.stderr)
+                raise
+
+        if tables and staging_run is not None:
+            merge_staging(conn, cursor, tables)
+    finally:
+        if staging_run is not None:
+            drop_staging(conn, cursor, staging_run)
+    return rows
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Расчет сетки интерполяции и запись в PostgreSQL")
+    parser.add_argument('--x-start', type=float, default=X_START)
+    parser.add_argument('--x-stop', type=float, default=X_STOP, help="Правая граница (не включается)")
+    parser.add_argument('--x-step', type=float, default=X_STEP)
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Количество рабочих процессов; 1 - расчет в текущем процессе, 0 - по числу ядер")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="Точек сетки в одной задаче")
+    parser.add_argument('--staging', action='store_true',
+                        help="Писать в промежуточные таблицы процессов и переносить их в конце одной транзакцией "
+                             "(без него при ошибке в таблице остаются части сетки, записанные до нее)")
+    parser.add_argument('--write-mode', choices=('copy', 'executemany'), default=WRITE_MODE)
+    parser.add_argument('--copy-format', choices=('text', 'binary'), default=COPY_FORMAT)
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--commit-every', type=int, default=COMMIT_EVERY,
+                        help="Commit после каждых N порций (по умолчанию одна транзакция на задачу)")
+    args = parser.parse_args(argv)
+    if args.x_step <= 0 or args.chunk_size <= 0:
+        parser.error("Шаг сетки и размер задачи должны быть положительными")
+    if args.workers == 0:
+        args.workers = os.cpu_count() or 1
+    return args
+
+
+def check_grid(x_data, args):
+    """Проверка, что сетка X не выходит за диапазон исходных данных (interp1d не экстраполирует)"""
+    total = grid_size(args.x_start, args.x_stop, args.x_step)
+    if not total:
+        return
+    x_last = grid_chunk(args.x_start, args.x_step, total - 1, total)[0]
+    if args.x_start < x_data.min() or x_last > x_data.max():
+        raise SystemExit(f"Сетка X [{args.x_start}, {x_last}] выходит за диапазон исходных данных "
+                         f"[{x_data.min()}, {x_data.max()}]")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    options = {
+        'write_mode': args.write_mode, 'copy_format': args.copy_format,
+        'batch_size': args.batch_size, 'commit_every': args.commit_every,
+    }
+
+    # Исходные данные для интерполяции (пример)
+    x_data = np.array([0, 10, 20, 30, 40])
+    y_data = np.array([0, 100, 400, 900, 1600])
+    check_grid(x_data, args)
+
+    # Подключение к базе данных PostgreSQL
+    conn = psycopg2.connect(**DB_PARAMS)
+    cursor = conn.cursor()
+
+    # Создание таблицы для хранения результатов
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS interpolation_results (
+            id SERIAL PRIMARY KEY,
+            x_value FLOAT NOT NULL,
+            y_value FLOAT NOT NULL
+        )
+    """)
+    conn.commit()
+
+    # Запуск замера времени
+    start_time = time.time()
+
+    if args.workers > 1:
+        rows = run_parallel(conn, cursor, x_data, y_data, args, options)
+    else:
+        # Расчет всей сетки одним векторизованным вызовом
+        interp_func = interp1d(x_data, y_data, kind='linear')
+        x_grid = grid_chunk(args.x_start, args.x_step, 0, grid_size(args.x_start, args.x_stop, args.x_step))
+        y_grid = np.asarray(interp_func(x_grid), dtype=np.float64)
+        write_grid(conn, cursor, x_grid, y_grid, options)
+        rows = len(x_grid)
+
+    # Замер времени выполнения
+    end_time = time.time()
+    execution_time = end_time - start_time
+
+    print(f"Записано строк: {rows}")
+    print(f"Время выполнения: {execution_time:.4f} секунд")
+    if execution_time > 0:
+        print(f"Скорость: {rows / execution_time:.0f} строк/с")
+
+    # Закрытие соединения с БД
+    cursor.close()
+    conn.close()
+
 
-# Закрытие соединения с БД
-cursor.close()
-conn.close()
+if __name__ == "__main__":
+    main()
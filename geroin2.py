@@ -4,16 +4,19 @@
 """
 
 import os
-import csv
 import time
 import logging
 import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-import mysql.connector
+
+# matplotlib, mysql.connector и pandas (через csv_ingest) импортируются при первом
+# использовании, чтобы окно появлялось до их загрузки
+from adaptive_sampling import iter_adaptive_samples
+from background import BackgroundRunner
+from dataset import DEFAULT_CACHE_DIR, Dataset, DatasetCache
+from db_manager import DatabaseManager
+from plot_renderer import PlotRenderer
 
 # Настройка логирования
 logging.basicConfig(
@@ -24,147 +27,48 @@ logging.basicConfig(
 logger = logging.getLogger('interpolation_app')
 
 
-class DatabaseManager:
-    """Класс для работы с базой данных и вызова хранимых процедур"""
-
-    def __init__(self, host='localhost', port=3306, database='interpolation_db', user='user', password='password'):
-        self.connection_params = {
-            'host': host, 'port': port, 'database': database, 'user': user, 'password': password
-        }
-        self.connection = None
-        self.cursor = None
-
-    def connect(self):
-        """Установка соединения с базой данных"""
-        try:
-            self.connection = mysql.connector.connect(**self.connection_params)
-            if self.connection.is_connected():
-                self.cursor = self.connection.cursor(dictionary=True)
-                return True
-        except Exception as e:
-            logger.error(f"Ошибка при подключении к MySQL: {e}")
-            return False
-
-    def disconnect(self):
-        """Закрытие соединения с базой данных"""
-        if self.connection and self.connection.is_connected():
-            if self.cursor: self.cursor.close()
-            self.connection.close()
-
-    def create_tables_if_not_exist(self):
-        """Создание необходимых таблиц, если они не существуют"""
-        try:
-            if not self.connection or not self.connection.is_connected():
-                if not self.connect(): return False
-
-            # Таблица для точек данных
-            self.cursor.execute("""
-                CREATE TABLE IF NOT EXISTS points_table (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    x DOUBLE NOT NULL,
-                    y DOUBLE NOT NULL,
-                    dataset_id VARCHAR(50) DEFAULT 'default'
-                );
-            """)
-
-            # Таблица для результатов
-            self.cursor.execute("""
-                CREATE TABLE IF NOT EXISTS interpolation_results (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    dataset_id VARCHAR(50) NOT NULL,
-                    interpolation_type VARCHAR(50) NOT NULL,
-                    x_target DOUBLE NOT NULL,
-                    y_result DOUBLE,
-                    error_code INT,
-                    error_message VARCHAR(255)
-                );
-            """)
-
-            self.connection.commit()
-            return True
-        except Exception as e:
-            logger.error(f"Ошибка при создании таблиц: {e}")
-            return False
-
-    def insert_data_points(self, points, dataset_id='default'):
-        """Добавление точек данных в таблицу"""
-        try:
-            if not self.connection or not self.connection.is_connected():
-                if not self.connect(): return False
-
-            # Удаляем существующие точки с таким же dataset_id
-            self.cursor.execute("DELETE FROM points_table WHERE dataset_id = %s;", (dataset_id,))
-
-            # Добавляем новые точки
-            self.cursor.executemany(
-                "INSERT INTO points_table (x, y, dataset_id) VALUES (%s, %s, %s);",
-                [(point[0], point[1], dataset_id) for point in points]
-            )
-
-            self.connection.commit()
-            return True
-        except Exception as e:
-            logger.error(f"Ошибка при добавлении точек: {e}")
-            return False
-
-    def calculate_interpolation(self, interpolation_type, x_target, polynomial_degree=3, dataset_id='default'):
-        """Вызов хранимой процедуры для расчета интерполяции"""
-        try:
-            if not self.connection or not self.connection.is_connected():
-                if not self.connect(): return None, None, None
-
-            # Вызываем хранимую процедуру
-            self.cursor.callproc('CalculateInterpolation',
-                                 [interpolation_type, 'points_table', 'x', 'y', x_target, polynomial_degree, 0, 0, ''])
-
-            # Получаем результаты
-            result_value = error_code = error_message = None
-            for result in self.cursor.stored_results():
-                row = result.fetchone()
-                if row:
-                    result_value = row['result_value']
-                    error_code = row['error_code']
-                    error_message = row['error_message']
-
-            # Сохраняем результат
-            self.cursor.execute(
-                """INSERT INTO interpolation_results 
-                   (dataset_id, interpolation_type, x_target, y_result, error_code, error_message)
-                   VALUES (%s, %s, %s, %s, %s, %s);""",
-                (dataset_id, interpolation_type, x_target, result_value, error_code, error_message)
-            )
-
-            self.connection.commit()
-            return result_value, error_code, error_message
-        except Exception as e:
-            logger.error(f"Ошибка при вызове процедуры интерполяции: {e}")
-            return None, -1, str(e)
-
-
 class InterpolationApp:
     """Основной класс приложения для интерполяции данных"""
 
     def __init__(self):
-        self.db_manager = DatabaseManager()
-
-        # Создаем таблицы при запуске
-        if not self.db_manager.create_tables_if_not_exist():
-            messagebox.showerror("Ошибка БД", "Не удалось создать таблицы. Проверьте настройки подключения.")
+        # Соединение с БД создается при первом запросе, уже после появления окна
+        cache_dir = os.environ.get('INTERPOLATION_CACHE_DIR', DEFAULT_CACHE_DIR)
+        self.db_manager = DatabaseManager(dataset_cache=DatasetCache(cache_dir))
 
         # Текущий набор данных
-        self.current_dataset_id = 'default'
-        self.current_points = []
+        self.dataset = Dataset.empty()
 
         # Создание GUI
         self.root = tk.Tk()
         self.root.title("Интерполяция данных")
         self.root.geometry("1000x600")
 
+        # Операции с БД выполняются в фоне, чтобы окно не зависало
+        self.runner = BackgroundRunner(self.root, profile=self.db_manager.metrics.profile)
+        self.renderer = None
+
         self.create_widgets()
 
+        # График, проверка схемы БД и начальные данные - после первой отрисовки окна
+        self.root.after_idle(self._start)
+
+    def _start(self):
+        self.create_plot()
+
+        # Задачи выполняются по очереди, поэтому таблицы будут готовы до сохранения данных
+        self.runner.submit('schema', self._prepare_database_job, on_error=self._on_database_error)
+
         # Генерация начальных данных
         self.generate_data()
 
+    def _prepare_database_job(self, job):
+        if not self.db_manager.create_tables_if_not_exist():
+            raise RuntimeError("Не удалось создать таблицы. Проверьте настройки подключения.")
+
+    def _on_database_error(self, error):
+        self.status_var.set(f"Ошибка: {error}")
+        messagebox.showerror("Ошибка БД", str(error))
+
     def create_widgets(self):
         """Создание виджетов интерфейса"""
         # Основной фрейм
@@ -175,8 +79,12 @@ class InterpolationApp:
         top_frame = ttk.Frame(main_frame)
         top_frame.pack(fill=tk.X, pady=5)
 
-        ttk.Button(top_frame, text="Генерировать данные", command=self.generate_data).pack(side=tk.LEFT, padx=5)
-        ttk.Button(top_frame, text="Загрузить из CSV", command=self.load_from_csv).pack(side=tk.LEFT, padx=5)
+        ttk.Button(top_frame, text="Генерировать данные",
+                   command=self._action('generate_data', self.generate_data)).pack(side=tk.LEFT, padx=5)
+        ttk.Button(top_frame, text="Загрузить из CSV",
+                   command=self._action('load_from_csv', self.load_from_csv)).pack(side=tk.LEFT, padx=5)
+        ttk.Button(top_frame, text="Отменить",
+                   command=self._action('cancel_jobs', self.cancel_jobs)).pack(side=tk.LEFT, padx=5)
 
         # Фрейм для настроек и графика
         content_frame = ttk.Frame(main_frame)
@@ -201,8 +109,9 @@ class InterpolationApp:
         self.num_points_var = tk.StringVar(value="10")
         ttk.Entry(data_frame, textvariable=self.num_points_var, width=10).grid(row=1, column=1, sticky=tk.W, pady=2)
 
-        ttk.Button(data_frame, text="Сгенерировать", command=self.generate_data).grid(row=2, column=0, columnspan=2,
-                                                                                      pady=5)
+        ttk.Button(data_frame, text="Сгенерировать",
+                   command=self._action('generate_data', self.generate_data)).grid(
+            row=2, column=0, columnspan=2, pady=5)
 
         # Настройки интерполяции
         interp_frame = ttk.LabelFrame(left_frame, text="Интерполяция", padding=10)
@@ -222,8 +131,9 @@ class InterpolationApp:
         self.x_target_var = tk.StringVar(value="5.0")
         ttk.Entry(interp_frame, textvariable=self.x_target_var, width=10).grid(row=2, column=1, sticky=tk.W, pady=2)
 
-        ttk.Button(interp_frame, text="Рассчитать", command=self.calculate_interpolation).grid(row=3, column=0,
-                                                                                               columnspan=2, pady=5)
+        ttk.Button(interp_frame, text="Рассчитать",
+                   command=self._action('calculate_interpolation', self.calculate_interpolation)).grid(
+            row=3, column=0, columnspan=2, pady=5)
 
         # Результаты
         result_frame = ttk.LabelFrame(left_frame, text="Результаты", padding=10)
@@ -241,12 +151,17 @@ class InterpolationApp:
         right_frame = ttk.Frame(content_frame)
         right_frame.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True, padx=5, pady=5)
 
-        # Фрейм для графика
-        plot_frame = ttk.LabelFrame(right_frame, text="График", padding=10)
-        plot_frame.pack(fill=tk.BOTH, expand=True)
+        # Фрейм для графика; сам график создается в create_plot
+        self.plot_frame = ttk.LabelFrame(right_frame, text="График", padding=10)
+        self.plot_frame.pack(fill=tk.BOTH, expand=True)
+
+    def create_plot(self):
+        """Создание графика (matplotlib загружается только здесь)"""
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
 
-        # Создаем холст для графика
-        self.fig = plt.figure(figsize=(8, 5))
+        plot_frame = self.plot_frame
+        self.fig = Figure(figsize=(8, 5))
         self.ax = self.fig.add_subplot(111)
         self.ax.grid(True)
         self.ax.set_xlabel('X')
@@ -254,8 +169,44 @@ class InterpolationApp:
         self.ax.set_title('Интерполяция данных')
 
         self.canvas = FigureCanvasTkAgg(self.fig, master=plot_frame)
-        self.canvas.draw()
+        # Масштабирование и сдвиг графика; прореживание пересчитывается под новый вид
+        toolbar = NavigationToolbar2Tk(self.canvas, plot_frame, pack_toolbar=False)
+        toolbar.update()
+        toolbar.pack(side=tk.BOTTOM, fill=tk.X)
         self.canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+        self.renderer = PlotRenderer(self.fig, self.ax, self.canvas)
+        self.canvas.draw()
+
+    def _action(self, name, handler):
+        """Обработчик кнопки с замером длительности в метриках"""
+        def command():
+            with self.db_manager.metrics.profile(f"action:{name}"):
+                handler()
+        return command
+
+    def save_dataset(self, dataset):
+        """Сохранение набора данных в БД в фоновом потоке"""
+        self.status_var.set(f"Сохранение {len(dataset)} точек в БД...")
+        self.runner.submit('dataset', self._save_dataset_job, dataset,
+                           on_done=self._on_dataset_saved, on_error=self._on_job_error,
+                           on_progress=self.status_var.set)
+
+    def _save_dataset_job(self, job, dataset):
+        if not self.db_manager.insert_data_points(dataset, dataset.dataset_id):
+            raise RuntimeError("Не удалось сохранить точки в базе данных")
+        return len(dataset)
+
+    def _on_dataset_saved(self, count):
+        self.status_var.set(f"Данные готовы: {count} точек")
+
+    def _on_job_error(self, error):
+        self.status_var.set(f"Ошибка: {error}")
+        messagebox.showerror("Ошибка", str(error))
+
+    def cancel_jobs(self):
+        """Отмена всех фоновых операций"""
+        self.runner.cancel()
+        self.status_var.set("Операция отменена")
 
     def generate_data(self):
         """Генерация тестовых данных"""
@@ -271,8 +222,6 @@ class InterpolationApp:
                 x_values = np.linspace(0, 10, num_points)
                 y_values = a * x_values + b + np.random.normal(0, 0.1, num_points)
 
-                self.current_points = list(zip(x_values, y_values))
-
             elif data_type == 'polynomial':
                 coefficients = [np.random.uniform(-2, 2) for _ in range(4)]  # Степень 3
 
@@ -283,18 +232,16 @@ class InterpolationApp:
                     y_values += coef * np.power(x_values, i)
 
                 y_values += np.random.normal(0, 0.1, num_points)
-                self.current_points = list(zip(x_values, y_values))
 
-            # Генерируем новый ID для набора данных
-            self.current_dataset_id = f"{data_type}_{time.strftime('%Y%m%d%H%M%S')}"
-
-            # Сохраняем данные в БД
-            self.db_manager.insert_data_points(self.current_points, self.current_dataset_id)
+            # Генерируем новый ID для набора данных; сетка linspace уже отсортирована
+            dataset_id = f"{data_type}_{time.strftime('%Y%m%d%H%M%S')}"
+            self.dataset = Dataset(x_values, y_values, dataset_id, source='generated', is_sorted=num_points > 0)
 
             # Обновляем график
             self.update_plot()
 
-            self.status_var.set(f"Данные готовы: {len(self.current_points)} точек")
+            # Сохраняем данные в БД
+            self.save_dataset(self.dataset)
 
         except Exception as e:
             logger.error(f"Ошибка при генерации данных: {e}")
@@ -311,70 +258,61 @@ class InterpolationApp:
             if not file_path:
                 return
 
-            # Загружаем данные из файла
-            data = []
-            with open(file_path, 'r', newline='', encoding='utf-8') as csvfile:
-                reader = csv.reader(csvfile)
-                header = next(reader)  # Пропускаем заголовок
-
-                # Используем первые два столбца
-                for row in reader:
-                    try:
-                        x = float(row[0])
-                        y = float(row[1])
-                        data.append((x, y))
-                    except (ValueError, IndexError):
-                        pass
-
-            if not data:
-                messagebox.showerror("Ошибка", "Не удалось загрузить данные из файла или файл пуст")
-                return
-
-            self.current_points = data
-
             # Генерируем новый ID для набора данных
             file_name = os.path.basename(file_path)
-            self.current_dataset_id = f"csv_{file_name.split('.')[0]}_{time.strftime('%Y%m%d%H%M%S')}"
-
-            # Сохраняем данные в БД
-            self.db_manager.insert_data_points(self.current_points, self.current_dataset_id)
-
-            # Обновляем график
-            self.update_plot()
+            dataset_id = f"csv_{file_name.split('.')[0]}_{time.strftime('%Y%m%d%H%M%S')}"
 
-            self.status_var.set(f"Данные готовы: {len(self.current_points)} точек")
+            self.status_var.set(f"Загрузка {file_name}...")
+            self.runner.submit('dataset', self._load_csv_job, file_path, dataset_id,
+                               on_done=self._on_csv_loaded, on_error=self._on_job_error,
+                               on_progress=self.status_var.set)
 
         except Exception as e:
             logger.error(f"Ошибка при загрузке данных из CSV: {e}")
             messagebox.showerror("Ошибка", f"Не удалось загрузить данные: {str(e)}")
 
+    def _load_csv_job(self, job, file_path, dataset_id):
+        from csv_ingest import ingest_csv
+
+        # Файл читается порциями: следующая разбирается, пока текущая пишется в БД
+        result = ingest_csv(file_path, self.db_manager, dataset_id,
+                            progress=lambda rows: job.progress(f"Загружено строк: {rows}"),
+                            check=job.check)
+        if not result.total_rows:
+            raise ValueError("Не удалось загрузить данные из файла или файл пуст")
+        # В памяти остается только прореженная выборка для графика
+        return result, Dataset(result.preview_x, result.preview_y, dataset_id, source=file_path)
+
+    def _on_csv_loaded(self, result):
+        result, self.dataset = result
+        self.update_plot()
+
+        status = f"Данные готовы: {result.total_rows} точек"
+        if result.invalid_rows:
+            status += f" (пропущено строк: {result.invalid_rows})"
+        self.status_var.set(status)
+
     def update_plot(self):
         """Обновление графика с текущими данными"""
         try:
-            # Очищаем график
-            self.ax.clear()
-            self.ax.grid(True)
-            self.ax.set_xlabel('X')
-            self.ax.set_ylabel('Y')
-            self.ax.set_title('Интерполяция данных')
+            # Прежняя кривая относится к другому набору данных
+            self.renderer.clear('curve', 'target')
+            self.renderer.set_title('Интерполяция данных')
 
             # Отображаем точки данных
-            if self.current_points:
-                x_values, y_values = zip(*self.current_points)
-                self.ax.scatter(x_values, y_values, color='blue', label='Исходные точки', s=30)
-                self.ax.legend()
-
-            # Обновляем холст
-            self.canvas.draw()
+            if len(self.dataset):
+                self.renderer.set_points(self.dataset.x, self.dataset.y)
+            else:
+                self.renderer.clear('points')
 
         except Exception as e:
             logger.error(f"Ошибка при обновлении графика: {e}")
             messagebox.showerror("Ошибка", f"Не удалось обновить график: {str(e)}")
 
     def calculate_interpolation(self):
-        """Расчет интерполяции с использованием хранимой процедуры"""
+        """Расчет интерполяции с использованием хранимой процедуры (в фоновом потоке)"""
         try:
-            if not self.current_points:
+            if not len(self.dataset):
                 messagebox.showerror("Ошибка", "Сначала необходимо сгенерировать или загрузить данные")
                 return
 
@@ -382,69 +320,98 @@ class InterpolationApp:
             poly_degree = int(self.poly_degree_var.get())
             x_target = float(self.x_target_var.get())
 
-            # Получаем результат для целевой точки
-            y_result, error_code, error_message = self.db_manager.calculate_interpolation(
-                interp_type, x_target, poly_degree, self.current_dataset_id
-            )
-
-            if y_result is not None:
-                self.y_result_var.set(f"{y_result:.6f}")
+            # Диапазон кривой интерполяции; точки на нем выбираются адаптивно под размер графика
+            x_min, x_max = self.dataset.bounds()
+            range_x = x_max - x_min
+            width, height = self.renderer.pixel_size()
+            curve = {
+                'x_min': x_min - range_x * 0.1,
+                'x_max': x_max + range_x * 0.1,
+                'width': width,
+                'height': height,
+                # Излом кривой возможен в исходных точках, если их не больше, чем пикселей
+                'breakpoints': self.dataset.x if len(self.dataset) <= width else None,
+                'y_span': float(np.ptp(self.dataset.y)),
+            }
+
+            # Повторные нажатия схлопываются: считается только последний запрос
+            self.status_var.set("Расчет интерполяции...")
+            self.runner.submit('calculate', self._calculate_interpolation_job,
+                               interp_type, poly_degree, x_target, self.dataset.dataset_id, curve,
+                               on_partial=self._on_interpolation_partial,
+                               on_done=self._on_interpolation_done,
+                               on_error=self._on_job_error,
+                               on_progress=self.status_var.set)
 
-                if error_code > 0:
-                    self.status_var.set(f"Предупреждение: {error_message}")
-                else:
-                    self.status_var.set(f"Интерполяция успешно выполнена")
+        except Exception as e:
+            logger.error(f"Ошибка при расчете интерполяции: {e}")
+            messagebox.showerror("Ошибка", f"Не удалось выполнить интерполяцию: {str(e)}")
 
-                # Обновляем график
-                self.ax.clear()
-                self.ax.grid(True)
-                self.ax.set_xlabel('X')
-                self.ax.set_ylabel('Y')
-                self.ax.set_title(f'Интерполяция данных ({interp_type})')
+    def _calculate_interpolation_job(self, job, interp_type, poly_degree, x_target, dataset_id, curve):
+        # Получаем результат для целевой точки
+        y_result, error_code, error_message = self.db_manager.calculate_interpolation(
+            interp_type, x_target, poly_degree, dataset_id
+        )
+        if y_result is None:
+            return None, error_code, error_message
 
-                # Отображаем исходные точки
-                x_values, y_values = zip(*self.current_points)
-                self.ax.scatter(x_values, y_values, color='blue', label='Исходные точки', s=30)
+        job.partial(('target', interp_type, x_target, y_result))
 
-                # Вычисляем и отображаем интерполяцию
-                x_min, x_max = min(x_values), max(x_values)
-                range_x = x_max - x_min
-                x_min -= range_x * 0.1
-                x_max += range_x * 0.1
+        def evaluate(x_values):
+            job.check()
+            return self.db_manager.calculate_interpolation_batch(interp_type, x_values, poly_degree, dataset_id)[0]
 
-                x_interp = np.linspace(x_min, x_max, 100)
-                y_interp = []
+        # Каждый уровень уточнения - один пакетный расчет; график обновляется после каждого
+        for level, (x_curve, y_curve) in enumerate(iter_adaptive_samples(evaluate, **curve)):
+            job.partial(('curve', x_curve, y_curve))
+            job.progress(f"Расчет кривой: уровень {level + 1}, точек {len(x_curve)}")
 
-                for x in x_interp:
-                    y, _, _ = self.db_manager.calculate_interpolation(
-                        interp_type, x, poly_degree, self.current_dataset_id
-                    )
-                    y_interp.append(y if y is not None else np.nan)
+        return y_result, error_code, error_message
 
-                self.ax.plot(x_interp, y_interp, '-', label=f'Интерполяция ({interp_type})', linewidth=2)
+    def _on_interpolation_partial(self, data):
+        if data[0] == 'target':
+            _, interp_type, x_target, y_result = data
+            self.y_result_var.set(f"{y_result:.6f}")
 
-                # Отмечаем целевую точку
-                if not np.isnan(y_result):
-                    self.ax.plot([x_target], [y_result], 'ro', markersize=8,
-                                 label=f'Точка: ({x_target:.2f}, {y_result:.2f})')
+            # Исходные точки уже на графике; меняются только кривая и целевая точка
+            self.renderer.set_title(f'Интерполяция данных ({interp_type})')
 
-                self.ax.legend()
-                self.canvas.draw()
+            # Кривая уточняется по мере расчета уровней
+            self.renderer.set_curve([], [], f'Интерполяция ({interp_type})')
 
+            # Отмечаем целевую точку
+            if not np.isnan(y_result):
+                self.renderer.set_target(x_target, y_result, f'Точка: ({x_target:.2f}, {y_result:.2f})')
             else:
-                self.y_result_var.set("Ошибка")
-                self.status_var.set(f"Ошибка: {error_message}")
-                messagebox.showerror("Ошибка", f"Не удалось выполнить интерполяцию: {error_message}")
-
-        except Exception as e:
-            logger.error(f"Ошибка при расчете интерполяции: {e}")
-            messagebox.showerror("Ошибка", f"Не удалось выполнить интерполяцию: {str(e)}")
+                self.renderer.clear('target')
+
+        elif data[0] == 'curve':
+            _, x_curve, y_curve = data
+            self.renderer.update_curve(y_curve, x_curve)
+
+    def _on_interpolation_done(self, result):
+        y_result, error_code, error_message = result
+        if y_result is None:
+            self.y_result_var.set("Ошибка")
+            self.status_var.set(f"Ошибка: {error_message}")
+            messagebox.showerror("Ошибка", f"Не удалось выполнить интерполяцию: {error_message}")
+        elif error_code and error_code > 0:
+            self.status_var.set(f"Предупреждение: {error_message}")
+        else:
+            self.status_var.set(f"Интерполяция успешно выполнена")
 
     def run(self):
         """Запуск приложения"""
         self.root.mainloop()
+        self.runner.shutdown()
         self.db_manager.disconnect()
 
+        # Путь для выгрузки метрик при выходе (.prom - формат Prometheus, иначе JSON)
+        metrics_path = os.environ.get('INTERPOLATION_METRICS')
+        if metrics_path:
+            self.db_manager.metrics.dump(metrics_path)
+            logger.info(f"Метрики сохранены в {metrics_path}")
+
 
 if __name__ == "__main__":
     app = InterpolationApp()
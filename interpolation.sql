@@ -0,0 +1,195 @@
+-- Процедуры MySQL для приложения интерполяции (geroin2.py)
+
+DELIMITER //
+
+-- 1. Пакетный расчет интерполяции.
+-- Принимает JSON-массив целевых точек X и вызывает CalculateInterpolation
+-- для каждой из них на стороне сервера. Клиенту возвращается один итоговый
+-- набор (position, x_target, result_value, error_code, error_message),
+-- поэтому вся кривая считается за один вызов вместо N.
+DROP PROCEDURE IF EXISTS CalculateInterpolationBatch //
+CREATE PROCEDURE CalculateInterpolationBatch(
+    IN p_interpolation_type VARCHAR(50),
+    IN p_table_name VARCHAR(64),
+    IN p_x_column VARCHAR(64),
+    IN p_y_column VARCHAR(64),
+    IN p_x_targets JSON,
+    IN p_polynomial_degree INT
+)
+BEGIN
+    DECLARE v_index INT DEFAULT 0;
+    DECLARE v_count INT DEFAULT COALESCE(JSON_LENGTH(p_x_targets), 0);
+    DECLARE v_x DOUBLE;
+    DECLARE v_result DOUBLE;
+    DECLARE v_error_code INT;
+    DECLARE v_error_message VARCHAR(255);
+
+    DROP TEMPORARY TABLE IF EXISTS tmp_interpolation_batch;
+    CREATE TEMPORARY TABLE tmp_interpolation_batch (
+        position INT PRIMARY KEY,
+        x_target DOUBLE NOT NULL,
+        result_value DOUBLE,
+        error_code INT,
+        error_message VARCHAR(255)
+    );
+
+    WHILE v_index < v_count DO
+        SET v_x = JSON_EXTRACT(p_x_targets, CONCAT('$[', v_index, ']'));
+        SET v_result = NULL, v_error_code = 0, v_error_message = '';
+
+        CALL CalculateInterpolation(p_interpolation_type, p_table_name, p_x_column, p_y_column,
+                                    v_x, p_polynomial_degree, v_result, v_error_code, v_error_message);
+
+        INSERT INTO tmp_interpolation_batch (position, x_target, result_value, error_code, error_message)
+        VALUES (v_index, v_x, v_result, v_error_code, v_error_message);
+
+        SET v_index = v_index + 1;
+    END WHILE;
+
+    -- Итоговый набор всегда последний среди результатов вызова
+    SELECT position, x_target, result_value, error_code, error_message
+    FROM tmp_interpolation_batch
+    ORDER BY position;
+
+    DROP TEMPORARY TABLE tmp_interpolation_batch;
+END //
+
+-- 2. Расчет по одному набору данных с чтением по диапазону ключа.
+-- Точки набора читаются по индексу ux_points_dataset_x (dataset_id, x):
+-- при заданных границах только из диапазона [p_x_min, p_x_max], остальные
+-- наборы points_table не просматриваются. Выборка кладется во временную
+-- таблицу, по которой считает CalculateInterpolationBatch.
+DROP PROCEDURE IF EXISTS CalculateInterpolationDataset //
+CREATE PROCEDURE CalculateInterpolationDataset(
+    IN p_interpolation_type VARCHAR(50),
+    IN p_dataset_id VARCHAR(50),
+    IN p_x_min DOUBLE,
+    IN p_x_max DOUBLE,
+    IN p_x_targets JSON,
+    IN p_polynomial_degree INT
+)
+BEGIN
+    DROP TEMPORARY TABLE IF EXISTS tmp_dataset_points;
+    CREATE TEMPORARY TABLE tmp_dataset_points (
+        x DOUBLE NOT NULL PRIMARY KEY,
+        y DOUBLE NOT NULL
+    );
+
+    -- Без границ читается весь набор; условие остается диапазоном по индексу
+    INSERT INTO tmp_dataset_points (x, y)
+    SELECT x, y
+    FROM points_table
+    WHERE dataset_id = p_dataset_id
+      AND x BETWEEN COALESCE(p_x_min, -1.7976931348623157e308) AND COALESCE(p_x_max, 1.7976931348623157e308)
+    ORDER BY x;
+
+    CALL CalculateInterpolationBatch(p_interpolation_type, 'tmp_dataset_points', 'x', 'y',
+                                     p_x_targets, p_polynomial_degree);
+
+    DROP TEMPORARY TABLE tmp_dataset_points;
+END //
+
+-- 3. Расчет по заранее вычисленным коэффициентам.
+-- Коэффициенты моделей записываются приложением при сохранении набора
+-- (таблицы interpolation_models и interpolation_coefficients): отрезки
+-- линейной модели правятся в транзакции сохранения, остальные модели
+-- рассчитываются после нее. Для линейной интерполяции и сплайна отрезок
+-- находится по первичному ключу (dataset_id, вид, степень, x_start), и
+-- значение считается по схеме Горнера; для полинома
+-- суммируется degree + 1 членов, для Лагранжа - барицентрическая формула по
+-- n узлам. Если коэффициентов нет или они относятся к старой версии набора,
+-- расчет выполняется по исходным точкам через CalculateInterpolationDataset.
+DROP PROCEDURE IF EXISTS CalculateInterpolationPrecomputed //
+CREATE PROCEDURE CalculateInterpolationPrecomputed(
+    IN p_interpolation_type VARCHAR(50),
+    IN p_dataset_id VARCHAR(50),
+    IN p_x_targets JSON,
+    IN p_polynomial_degree INT
+)
+BEGIN
+    -- Степень входит в ключ только для полиномиальной модели
+    DECLARE v_degree INT DEFAULT IF(p_interpolation_type = 'polynomial', p_polynomial_degree, 0);
+    DECLARE v_version INT;
+    DECLARE v_model_version INT;
+    DECLARE v_x_min DOUBLE;
+    DECLARE v_x_max DOUBLE;
+
+    SET v_version = (SELECT version FROM datasets WHERE dataset_id = p_dataset_id);
+    SELECT dataset_version, x_min, x_max INTO v_model_version, v_x_min, v_x_max
+    FROM interpolation_models
+    WHERE dataset_id = p_dataset_id AND interpolation_type = p_interpolation_type
+      AND polynomial_degree = v_degree;
+
+    IF v_model_version IS NULL OR v_version IS NULL OR v_model_version <> v_version THEN
+        CALL CalculateInterpolationDataset(p_interpolation_type, p_dataset_id, NULL, NULL,
+                                           p_x_targets, p_polynomial_degree);
+
+    ELSEIF p_interpolation_type IN ('linear', 'spline') THEN
+        -- Отрезок с наибольшим x_start <= x; левее данных - первый, правее - последний
+        SELECT t.position - 1 AS position,
+               t.x_target,
+               s.c0 + (t.x_target - s.x_start) * (s.c1 + (t.x_target - s.x_start)
+                    * (s.c2 + (t.x_target - s.x_start) * s.c3)) AS result_value,
+               IF(t.x_target < v_x_min OR t.x_target > v_x_max, 1, 0) AS error_code,
+               IF(t.x_target < v_x_min OR t.x_target > v_x_max,
+                  'Точка за пределами диапазона данных (экстраполяция)', '') AS error_message
+        FROM JSON_TABLE(p_x_targets, '$[*]' COLUMNS (
+                 position FOR ORDINALITY,
+                 x_target DOUBLE PATH '$'
+             )) t
+        JOIN LATERAL (
+            SELECT c.x_start, c.c0, c.c1, c.c2, c.c3
+            FROM interpolation_coefficients c
+            WHERE c.dataset_id = p_dataset_id
+              AND c.interpolation_type = p_interpolation_type
+              AND c.polynomial_degree = v_degree
+              AND c.x_start <= GREATEST(t.x_target, v_x_min)
+            ORDER BY c.x_start DESC
+            LIMIT 1
+        ) s ON TRUE
+        ORDER BY t.position;
+
+    ELSEIF p_interpolation_type = 'polynomial' THEN
+        -- Член степени segment: c0 * (c1 + c2 * x)^segment
+        SELECT t.position - 1 AS position,
+               t.x_target,
+               SUM(c.c0 * POW(c.c1 + c.c2 * t.x_target, c.segment)) AS result_value,
+               IF(t.x_target < v_x_min OR t.x_target > v_x_max, 1, 0) AS error_code,
+               IF(t.x_target < v_x_min OR t.x_target > v_x_max,
+                  'Точка за пределами диапазона данных (экстраполяция)', '') AS error_message
+        FROM JSON_TABLE(p_x_targets, '$[*]' COLUMNS (
+                 position FOR ORDINALITY,
+                 x_target DOUBLE PATH '$'
+             )) t
+        JOIN interpolation_coefficients c
+          ON c.dataset_id = p_dataset_id
+         AND c.interpolation_type = p_interpolation_type
+         AND c.polynomial_degree = v_degree
+        GROUP BY t.position, t.x_target
+        ORDER BY t.position;
+
+    ELSE
+        -- lagrange. Барицентрическая формула: sum(w / (x - x_i) * y_i) / sum(w / (x - x_i)); в узле - его Y
+        SELECT t.position - 1 AS position,
+               t.x_target,
+               COALESCE(MAX(CASE WHEN c.x_start = t.x_target THEN c.c0 END),
+                        SUM(CASE WHEN c.x_start <> t.x_target THEN c.c1 / (t.x_target - c.x_start) * c.c0 END)
+                        / SUM(CASE WHEN c.x_start <> t.x_target THEN c.c1 / (t.x_target - c.x_start) END))
+                   AS result_value,
+               IF(t.x_target < v_x_min OR t.x_target > v_x_max, 1, 0) AS error_code,
+               IF(t.x_target < v_x_min OR t.x_target > v_x_max,
+                  'Точка за пределами диапазона данных (экстраполяция)', '') AS error_message
+        FROM JSON_TABLE(p_x_targets, '$[*]' COLUMNS (
+                 position FOR ORDINALITY,
+                 x_target DOUBLE PATH '$'
+             )) t
+        JOIN interpolation_coefficients c
+          ON c.dataset_id = p_dataset_id
+         AND c.interpolation_type = p_interpolation_type
+         AND c.polynomial_degree = v_degree
+        GROUP BY t.position, t.x_target
+        ORDER BY t.position;
+    END IF;
+END //
+
+DELIMITER ;
@@ -0,0 +1,302 @@
+"""
+Локальный движок интерполяции на NumPy с кешем подобранных моделей.
+"""
+
+import abc
+import logging
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+logger = logging.getLogger('interpolation_app')
+
+INTERPOLATION_TYPES = ('linear', 'polynomial', 'spline', 'lagrange')
+
+# Коды ошибок совпадают с кодами хранимой процедуры CalculateInterpolation
+ERROR_OK = 0
+ERROR_EXTRAPOLATION = 1
+ERROR_FAILED = -1
+
+EXTRAPOLATION_MESSAGE = "Точка за пределами диапазона данных (экстраполяция)"
+
+
+class LRUCache:
+    """Потокобезопасный LRU-кеш ограниченного размера"""
+
+    def __init__(self, max_size=32):
+        self.max_size = max_size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._items:
+                return default
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def discard(self, predicate):
+        """Удаление всех записей, ключ которых удовлетворяет условию"""
+        with self._lock:
+            for key in [key for key in self._items if predicate(key)]:
+                del self._items[key]
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
+
+
+def prepare_points(x, y):
+    """Сортировка точек по X и усреднение Y для повторяющихся X"""
+    x = np.asarray(x, dtype=np.float64).ravel()
+    y = np.asarray(y, dtype=np.float64).ravel()
+    if x.shape != y.shape:
+        raise ValueError("Массивы X и Y должны иметь одинаковую длину")
+
+    finite = np.isfinite(x) & np.isfinite(y)
+    if finite.all() and np.all(x[1:] > x[:-1]):
+        # Уже подготовленные точки (например, из БД или Dataset) не сортируются повторно
+        return x, y
+    x, y = x[finite], y[finite]
+
+    x_unique, inverse, counts = np.unique(x, return_inverse=True, return_counts=True)
+    if x_unique.size == x.size:
+        return x_unique, y[np.argsort(x, kind='stable')]
+    return x_unique, np.bincount(inverse, weights=y) / counts
+
+
+class InterpolationModel(abc.ABC):
+    """Базовый класс подобранной модели интерполяции"""
+
+    min_points = 2
+
+    def __init__(self, x, y):
+        if x.size < self.min_points:
+            raise ValueError(f"Недостаточно точек для интерполяции: нужно не менее {self.min_points}")
+        self.x_min = float(x[0])
+        self.x_max = float(x[-1])
+
+    @abc.abstractmethod
+    def _evaluate(self, x_targets):
+        """Значения модели в точках x_targets (без проверки экстраполяции)"""
+
+    @abc.abstractmethod
+    def coefficients(self):
+        """Коэффициенты модели для таблицы interpolation_coefficients.
+
+        Возвращает массивы (x_start, c0, c1, c2, c3), по строке на отрезок,
+        член полинома или узел; их смысл зависит от вида модели.
+        """
+
+    def evaluate(self, x_targets):
+        """Векторизованный расчет: значения, коды ошибок и сообщения"""
+        x_targets = np.asarray(x_targets, dtype=np.float64).ravel()
+        values = self._evaluate(x_targets)
+
+        outside = (x_targets < self.x_min) | (x_targets > self.x_max)
+        error_codes = np.where(outside, ERROR_EXTRAPOLATION, ERROR_OK).astype(np.int32)
+        error_messages = np.where(outside, EXTRAPOLATION_MESSAGE, '').astype(object)
+        return values, error_codes, error_messages
+
+
+class LinearModel(InterpolationModel):
+    """Кусочно-линейная интерполяция (крайние отрезки продолжаются за границы)"""
+
+    def __init__(self, x, y):
+        super().__init__(x, y)
+        self.x = x
+        self.y = y
+        self.slopes = np.diff(y) / np.diff(x)
+
+    def _evaluate(self, x_targets):
+        index = np.clip(np.searchsorted(self.x, x_targets, side='right') - 1, 0, self.x.size - 2)
+        return self.y[index] + self.slopes[index] * (x_targets - self.x[index])
+
+    def coefficients(self):
+        # Отрезок как кубический многочлен с нулевыми старшими членами (формат сплайна)
+        zeros = np.zeros(self.slopes.size)
+        return self.x[:-1], self.y[:-1], self.slopes, zeros, zeros
+
+
+class PolynomialModel(InterpolationModel):
+    """Полиномиальная аппроксимация методом наименьших квадратов"""
+
+    min_points = 1
+
+    def __init__(self, x, y, degree=3):
+        super().__init__(x, y)
+        degree = max(0, min(int(degree), x.size - 1))
+        # Polynomial.fit масштабирует X на [-1, 1], что устойчивее np.polyfit
+        self.polynomial = np.polynomial.Polynomial.fit(x, y, degree)
+
+    def _evaluate(self, x_targets):
+        return self.polynomial(x_targets)
+
+    def coefficients(self):
+        # Член степени k: c0 * (c1 + c2 * x)^k, где c1 + c2 * x - X, приведенный к окну [-1, 1]
+        offset, scale = self.polynomial.mapparms()
+        coef = self.polynomial.coef
+        zeros = np.zeros(coef.size)
+        return zeros, coef, np.full(coef.size, offset), np.full(coef.size, scale), zeros
+
+
+class SplineModel(InterpolationModel):
+    """Естественный кубический сплайн с заранее вычисленными коэффициентами"""
+
+    def __init__(self, x, y):
+        super().__init__(x, y)
+        self.x = x
+        h = np.diff(x)
+        n = x.size
+
+        # Вторые производные во внутренних узлах: трехдиагональная система, метод прогонки
+        second = np.zeros(n)
+        if n > 2:
+            rhs = 6.0 * (np.diff(y[1:]) / h[1:] - np.diff(y[:-1]) / h[:-1])
+            diag = 2.0 * (h[:-1] + h[1:])
+            off = h[1:-1]
+            m = n - 2
+            c_prime = np.zeros(m)
+            d_prime = np.zeros(m)
+            d_prime[0] = rhs[0] / diag[0]
+            if m > 1:
+                c_prime[0] = off[0] / diag[0]
+            for i in range(1, m):
+                denominator = diag[i] - off[i - 1] * c_prime[i - 1]
+                if i < m - 1:
+                    c_prime[i] = off[i] / denominator
+                d_prime[i] = (rhs[i] - off[i - 1] * d_prime[i - 1]) / denominator
+            inner = np.empty(m)
+            inner[-1] = d_prime[-1]
+            for i in range(m - 2, -1, -1):
+                inner[i] = d_prime[i] - c_prime[i] * inner[i + 1]
+            second[1:-1] = inner
+
+        # Коэффициенты отрезков: y = a + b*dx + c*dx^2 + d*dx^3
+        self.a = y[:-1]
+        self.b = np.diff(y) / h - h * (2.0 * second[:-1] + second[1:]) / 6.0
+        self.c = second[:-1] / 2.0
+        self.d = np.diff(second) / (6.0 * h)
+
+    def _evaluate(self, x_targets):
+        index = np.clip(np.searchsorted(self.x, x_targets, side='right') - 1, 0, self.x.size - 2)
+        dx = x_targets - self.x[index]
+        return self.a[index] + dx * (self.b[index] + dx * (self.c[index] + dx * self.d[index]))
+
+    def coefficients(self):
+        return self.x[:-1], self.a, self.b, self.c, self.d
+
+
+class LagrangeModel(InterpolationModel):
+    """Интерполяционный многочлен Лагранжа в барицентрической форме"""
+
+    # Ограничение на размер промежуточной матрицы при расчете (элементов)
+    block_elements = 1 << 20
+
+    min_points = 1
+
+    def __init__(self, x, y):
+        super().__init__(x, y)
+        self.x = x
+        self.y = y
+
+        # Общий множитель сокращается в формуле, но защищает от переполнения
+        scale = 4.0 / (self.x_max - self.x_min) if self.x_max > self.x_min else 1.0
+        self.weights = np.empty(x.size)
+        block = max(1, self.block_elements // x.size)
+        for start in range(0, x.size, block):
+            diff = (x[start:start + block, None] - x[None, :]) * scale
+            diff[np.arange(diff.shape[0]), np.arange(start, start + diff.shape[0])] = 1.0
+            self.weights[start:start + block] = 1.0 / np.prod(diff, axis=1)
+
+    def _evaluate(self, x_targets):
+        values = np.empty(x_targets.size)
+        block = max(1, self.block_elements // self.x.size)
+        for start in range(0, x_targets.size, block):
+            targets = x_targets[start:start + block]
+            diff = targets[:, None] - self.x[None, :]
+            exact_row, exact_col = np.nonzero(diff == 0)
+            diff[exact_row, :] = 1.0
+
+            terms = self.weights / diff
+            with np.errstate(divide='ignore', invalid='ignore'):
+                chunk = (terms @ self.y) / terms.sum(axis=1)
+            chunk[exact_row] = self.y[exact_col]
+            values[start:start + block] = chunk
+        return values
+
+    def coefficients(self):
+        # Узел: X, Y и барицентрический вес
+        zeros = np.zeros(self.x.size)
+        return self.x, self.y, self.weights, zeros, zeros
+
+
+def fit_model(interpolation_type, x, y, polynomial_degree=3):
+    """Подбор модели указанного типа по отсортированным точкам"""
+    if interpolation_type == 'linear':
+        return LinearModel(x, y)
+    if interpolation_type == 'polynomial':
+        return PolynomialModel(x, y, polynomial_degree)
+    if interpolation_type == 'spline':
+        return SplineModel(x, y) if x.size > 2 else LinearModel(x, y)
+    if interpolation_type == 'lagrange':
+        return LagrangeModel(x, y)
+    raise ValueError(f"Неизвестный тип интерполяции: {interpolation_type}")
+
+
+class InterpolationEngine:
+    """Расчет интерполяции на стороне клиента с кешем моделей по dataset_id"""
+
+    def __init__(self, points_loader, cache_size=32):
+        # points_loader(dataset_id) -> (x, y); вызывается при промахе кеша
+        self.points_loader = points_loader
+        self.points = LRUCache(cache_size)
+        self.models = LRUCache(cache_size)
+
+    def set_points(self, dataset_id, x, y):
+        """Регистрация новых точек набора данных с инвалидацией моделей"""
+        self.invalidate(dataset_id)
+        self.points.put(dataset_id, prepare_points(x, y))
+
+    def invalidate(self, dataset_id):
+        """Сброс закешированных точек и моделей набора данных"""
+        self.points.discard(lambda key: key == dataset_id)
+        self.models.discard(lambda key: key[0] == dataset_id)
+
+    def get_model(self, interpolation_type, polynomial_degree=3, dataset_id='default'):
+        # Степень влияет только на полиномиальную модель
+        degree = int(polynomial_degree) if interpolation_type == 'polynomial' else None
+        key = (dataset_id, interpolation_type, degree)
+
+        model = self.models.get(key)
+        if model is None:
+            points = self.points.get(dataset_id)
+            if points is None:
+                points = prepare_points(*self.points_loader(dataset_id))
+                self.points.put(dataset_id, points)
+            model = fit_model(interpolation_type, *points, polynomial_degree=polynomial_degree)
+            self.models.put(key, model)
+        return model
+
+    def evaluate(self, interpolation_type, x_targets, polynomial_degree=3, dataset_id='default'):
+        """Расчет значений по сетке X; формат результата как у calculate_interpolation_batch"""
+        x_targets = np.asarray(x_targets, dtype=np.float64).ravel()
+        try:
+            model = self.get_model(interpolation_type, polynomial_degree, dataset_id)
+            return model.evaluate(x_targets)
+        except Exception as e:
+            logger.error(f"Ошибка локального расчета интерполяции: {e}")
+            return (np.full(x_targets.shape, np.nan),
+                    np.full(x_targets.shape, ERROR_FAILED, dtype=np.int32),
+                    np.full(x_targets.shape, str(e), dtype=object))
@@ -0,0 +1,154 @@
+"""
+Генератор нагрузки для service.py: устойчивая пропускная способность и хвосты задержки.
+
+Открывает заданное число соединений keep-alive и в течение заданного времени
+отправляет по ним запросы интерполяции. Точки X выбираются из ограниченного
+множества, поэтому часть одновременных запросов совпадает и схлопывается.
+
+    python service.py --mode local &
+    python loadgen.py --connections 200 --duration 30 --output load.json
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import random
+import time
+
+import numpy as np
+
+
+async def request(reader, writer, method, path, payload=None):
+    """Отправка одного запроса по соединению keep-alive; (статус, тело ответа)"""
+    body = json.dumps(payload).encode('utf-8') if payload is not None else b''
+    writer.write((f"{method} {path} HTTP/1.1\r\nHost: localhost\r\n"
+                  f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n").encode('latin-1') + body)
+    await writer.drain()
+
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value)
+    return status, await reader.readexactly(length)
+
+
+async def upload_dataset(args):
+    rng = np.random.default_rng(args.seed)
+    x_values = np.sort(rng.uniform(0, 100, args.dataset_points))
+    y_values = np.sin(x_values / 10) + rng.normal(0, 0.01, x_values.size)
+
+    reader, writer = await asyncio.open_connection(args.host, args.port)
+    try:
+        status, body = await request(reader, writer, 'POST', f'/datasets/{args.dataset_id}',
+                                     {'x': x_values.tolist(), 'y': y_values.tolist()})
+    finally:
+        writer.close()
+    if status != 200:
+        raise SystemExit(f"Не удалось загрузить набор данных: {status} {body.decode('utf-8')}")
+
+
+async def worker(args, deadline, latencies, statuses, seed):
+    rng = random.Random(seed)
+    reader, writer = await asyncio.open_connection(args.host, args.port)
+    try:
+        while time.perf_counter() < deadline:
+            if rng.random() < args.batch_share:
+                path = '/interpolate/batch'
+                start = rng.randrange(args.distinct_x)
+                payload = {'x': [(start + i) * args.x_step for i in range(args.batch_points)]}
+            else:
+                path = '/interpolate'
+                payload = {'x': rng.randrange(args.distinct_x) * args.x_step}
+            payload.update(dataset_id=args.dataset_id, type=args.type, degree=3)
+
+            started = time.perf_counter()
+            status, _ = await request(reader, writer, 'POST', path, payload)
+            latencies.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+            if status == 503:
+                # Сервис просит подождать - без паузы тест мерил бы только отказы
+                await asyncio.sleep(args.retry_delay)
+    finally:
+        writer.close()
+
+
+async def run(args):
+    if args.upload:
+        await upload_dataset(args)
+
+    latencies, statuses = [], {}
+    started = time.perf_counter()
+    deadline = started + args.duration
+    results = await asyncio.gather(
+        *(worker(args, deadline, latencies, statuses, args.seed + index) for index in range(args.connections)),
+        return_exceptions=True
+    )
+    elapsed = time.perf_counter() - started
+
+    failures = [str(result) for result in results if isinstance(result, Exception)]
+    latencies = np.asarray(latencies) if latencies else np.zeros(1)
+    ok = statuses.get(200, 0)
+    return {
+        'requests': int(sum(statuses.values())),
+        'statuses': {str(status): count for status, count in sorted(statuses.items())},
+        'connection_failures': len(failures),
+        'duration_s': elapsed,
+        'throughput_rps': sum(statuses.values()) / elapsed,
+        'ok_rps': ok / elapsed,
+        'latency_p50_s': float(np.percentile(latencies, 50)),
+        'latency_p90_s': float(np.percentile(latencies, 90)),
+        'latency_p99_s': float(np.percentile(latencies, 99)),
+        'latency_p999_s': float(np.percentile(latencies, 99.9)),
+        'latency_max_s': float(latencies.max()),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Генератор нагрузки для сервиса интерполяции")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--connections', type=int, default=100, help="Одновременные соединения (пользователи)")
+    parser.add_argument('--duration', type=float, default=10.0, help="Длительность теста, с")
+    parser.add_argument('--dataset-id', default='loadgen')
+    parser.add_argument('--dataset-points', type=int, default=1000)
+    parser.add_argument('--no-upload', dest='upload', action='store_false',
+                        help="Не загружать набор данных перед тестом")
+    parser.add_argument('--type', default='linear')
+    parser.add_argument('--distinct-x', type=int, default=1000, help="Количество различных точек X")
+    parser.add_argument('--x-step', type=float, default=0.1)
+    parser.add_argument('--batch-share', type=float, default=0.1, help="Доля пакетных запросов")
+    parser.add_argument('--batch-points', type=int, default=100)
+    parser.add_argument('--retry-delay', type=float, default=0.1)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help="Файл для результатов JSON (по умолчанию stdout)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'args': vars(args),
+        },
+        'results': asyncio.run(run(args)),
+    }
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
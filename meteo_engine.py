@@ -0,0 +1,558 @@
+"""
+Расчет метеобюллетеня (ДМК и ВР) в памяти по справочникам из Homework.sql.
+
+Справочники загружаются из PostgreSQL один раз в массивы NumPy, после чего
+все функции считают сразу тысячи наборов input_params. Арифметика ведется в
+целых сотых долях с округлением половины от нуля, как NUMERIC(8,2) в plpgsql,
+поэтому результаты совпадают с функциями fn_calc_header_temperature,
+fn_calc_header_pressure, calculate_temperature_deviation,
+fn_get_wind_correction и fn_calc_wind_rifle_corrections.
+"""
+
+import logging
+import math
+import threading
+from datetime import datetime
+from decimal import Decimal, ROUND_HALF_UP
+
+import numpy as np
+
+logger = logging.getLogger('interpolation_app')
+
+# Поля составного типа public.input_params
+INPUT_PARAMS_FIELDS = ('height', 'temperature', 'pressure', 'wind_direction', 'wind_speed', 'bullet_demolition_range')
+INPUT_PARAMS_DTYPE = np.dtype([(name, np.float64) for name in INPUT_PARAMS_FIELDS])
+
+# Столбцы таблицы temperature_deviations (значение отклонения -> dev_N)
+DEVIATION_COLUMNS = (1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 20, 30, 40, 50)
+
+# Типы измерительных устройств (measurment_types.short_name)
+MEASUREMENT_DMK = 'ДМК'
+MEASUREMENT_VR = 'ВР'
+
+# Пороги обнуления ветра в бюллетене (_Docs/AlgoritmDmk.md, _Docs/AlgoritmBp.md)
+DMK_MIN_WIND_SPEED = 3
+VR_MIN_BULLET_DEMOLITION_RANGE = 40
+
+# Множитель перевода делений угломера в радианы, как в fn_calc_wind_rifle_corrections
+WIND_DIRECTION_RADIANS = (314159265358979, 30 * 10 ** 14)
+# Полный круг направлений ветра в делениях угломера (60-00)
+WIND_DIRECTION_CIRCLE = 60
+
+# Таблица 3 алгоритма ВР (_Docs/AlgoritmBp.md), в справочниках БД ее нет: скорость среднего ветра
+# (м/с) по стандартной высоте Y и дальности сноса ветровых пуль Дг (м) и приращение направления
+# среднего ветра Δα_WY (деления угломера, 1-00) по высоте
+VR_WIND_HEIGHTS = np.array([200, 400, 800, 1200, 1600, 2000, 2400, 3000, 4000], dtype=np.int64)
+VR_BULLET_DEMOLITION_RANGES = np.array([40, 50, 60, 70, 80, 90, 100, 110, 120, 130, 140, 150], dtype=np.int64)
+VR_WIND_SPEEDS = np.array([
+    [3, 4, 5, 6, 7, 7, 8, 9, 10, 11, 12, 12],
+    [4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15],
+    [4, 5, 6, 7, 8, 9, 10, 11, 13, 14, 15, 16],
+    [4, 5, 7, 8, 8, 9, 11, 12, 13, 15, 15, 16],
+    [4, 6, 7, 8, 9, 10, 11, 13, 14, 15, 17, 17],
+    [4, 6, 7, 8, 9, 10, 11, 13, 14, 16, 17, 18],
+    [4, 6, 8, 9, 9, 10, 12, 14, 15, 16, 18, 19],
+    [5, 6, 8, 9, 10, 11, 12, 14, 15, 17, 18, 19],
+    [5, 6, 8, 9, 10, 11, 12, 14, 16, 18, 19, 20],
+], dtype=np.int64)
+VR_WIND_DIRECTION_INCREMENTS = np.array([0, 1, 2, 2, 3, 3, 3, 4, 4], dtype=np.int64)
+
+# Запрос для проверки изменения справочников
+FINGERPRINT_SQL = """
+    SELECT md5(concat_ws('|',
+        (SELECT string_agg(t::TEXT, ',' ORDER BY temperature) FROM public.calc_temperatures_correction t),
+        (SELECT string_agg(s::TEXT, ',' ORDER BY key) FROM public.measurment_settings s),
+        (SELECT string_agg(d::TEXT, ',' ORDER BY height) FROM public.temperature_deviations d),
+        (SELECT string_agg(r::TEXT, ',' ORDER BY id) FROM public.wind_speed_ranges r),
+        (SELECT string_agg(c::TEXT, ',' ORDER BY height, wind_range_id) FROM public.wind_corrections c)
+    ))
+"""
+
+
+def to_cents(values):
+    """Приведение к NUMERIC(8,2): целые сотые с округлением половины от нуля"""
+    values = np.asarray(values)
+    if values.dtype == object:
+        # Decimal из psycopg2 переводится точно
+        return np.array([
+            int((Decimal(value) * 100).to_integral_value(ROUND_HALF_UP)) if value is not None else 0
+            for value in values.ravel()
+        ], dtype=np.int64).reshape(values.shape)
+    values = values.astype(np.float64)
+    scaled = np.where(np.isnan(values), 0.0, values) * 100
+    return np.trunc(scaled + np.copysign(0.5, scaled)).astype(np.int64)
+
+
+def div_round(numerator, denominator):
+    """Целочисленное деление с округлением половины от нуля (denominator > 0)"""
+    numerator = np.asarray(numerator, dtype=np.int64)
+    quotient = (2 * np.abs(numerator) + denominator) // (2 * denominator)
+    return np.sign(numerator) * quotient
+
+
+def float_to_cents(value):
+    """Преобразование double precision -> NUMERIC(8,2) по правилам PostgreSQL (15 значащих цифр)"""
+    return int((Decimal(f"{value:.15g}") * 100).to_integral_value(ROUND_HALF_UP))
+
+
+class MeteoError:
+    """Накопитель ошибок по строкам: первая ошибка строки сохраняется, как RAISE EXCEPTION"""
+
+    def __init__(self, size):
+        self.messages = np.full(size, None, dtype=object)
+
+    def add(self, mask, message):
+        mask = np.asarray(mask) & np.equal(self.messages, None)
+        if np.any(mask):
+            if callable(message):
+                for index in np.flatnonzero(mask):
+                    self.messages[index] = message(index)
+            else:
+                self.messages[mask] = message
+
+    @property
+    def failed(self):
+        return ~np.equal(self.messages, None)
+
+
+class MeteoTables:
+    """Справочники расчета в виде упорядоченных массивов"""
+
+    def __init__(self, corrections, settings, deviations, wind_ranges, wind_corrections):
+        # calc_temperatures_correction: температура -> поправка (в сотых)
+        rows = sorted(corrections, key=lambda row: row[0])
+        self.correction_temperatures = to_cents(np.array([row[0] for row in rows], dtype=object))
+        self.correction_values = to_cents(np.array([row[1] for row in rows], dtype=object))
+
+        # measurment_settings: ключ -> значение в сотых (нечисловые значения пропускаются)
+        self.settings = {}
+        for key, value in settings:
+            try:
+                self.settings[key] = int(to_cents(np.array([Decimal(value)], dtype=object))[0])
+            except (ArithmeticError, TypeError, ValueError):
+                pass
+
+        # temperature_deviations: высоты по возрастанию, матрица высота x столбец dev_N
+        rows = sorted(deviations, key=lambda row: row[0])
+        self.deviation_heights = np.array([row[0] for row in rows], dtype=np.int64)
+        self.deviation_values = to_cents(np.array([row[1:] for row in rows], dtype=object).reshape(
+            len(rows), len(DEVIATION_COLUMNS)))
+        self.deviation_column_index = np.full(max(DEVIATION_COLUMNS) + 1, -1, dtype=np.int64)
+        self.deviation_column_index[list(DEVIATION_COLUMNS)] = np.arange(len(DEVIATION_COLUMNS))
+
+        # wind_speed_ranges: диапазоны скоростей по id
+        rows = sorted(wind_ranges, key=lambda row: row[0])
+        self.wind_range_ids = np.array([row[0] for row in rows], dtype=np.int64)
+        self.wind_range_min = to_cents(np.array([row[1] for row in rows], dtype=object))
+        self.wind_range_max = to_cents(np.array([row[2] for row in rows], dtype=object))
+
+        # wind_corrections: матрица высота x диапазон, -1 - нет поправки
+        self.wind_heights = np.array(sorted({row[0] for row in wind_corrections}), dtype=np.int64)
+        self.wind_corrections = np.full((self.wind_heights.size, self.wind_range_ids.size), -1, dtype=np.int64)
+        self.wind_correction_found = np.zeros(self.wind_corrections.shape, dtype=bool)
+        for height, range_id, value in wind_corrections:
+            row = np.searchsorted(self.wind_heights, height)
+            column = np.flatnonzero(self.wind_range_ids == range_id)
+            if column.size:
+                self.wind_corrections[row, column[0]] = to_cents(np.array([value], dtype=object))[0]
+                self.wind_correction_found[row, column[0]] = True
+
+    def setting(self, key, default):
+        return self.settings.get(key, default)
+
+
+def nearest_index(grid, values):
+    """Индекс ближайшего значения сетки; при равенстве расстояний берется меньшее"""
+    right = np.clip(np.searchsorted(grid, values), 0, grid.size - 1)
+    left = np.clip(right - 1, 0, grid.size - 1)
+    return np.where(np.abs(values - grid[left]) <= np.abs(grid[right] - values), left, right)
+
+
+class MeteoEngine:
+    """Векторизованный расчет метеобюллетеня по закешированным справочникам"""
+
+    def __init__(self, connection_factory):
+        # connection_factory() -> соединение psycopg2 с базой из Homework.sql
+        self.connection_factory = connection_factory
+        self.tables = None
+        self.fingerprint = None
+        self.reload_listeners = []
+        self._lock = threading.Lock()
+        self.reload()
+
+    def _query(self, connection, sql):
+        cursor = connection.cursor()
+        cursor.execute(sql)
+        rows = cursor.fetchall()
+        cursor.close()
+        return rows
+
+    def reload(self):
+        """Загрузка всех справочников одной транзакцией"""
+        connection = self.connection_factory()
+        try:
+            fingerprint = self._query(connection, FINGERPRINT_SQL)[0][0]
+            tables = MeteoTables(
+                self._query(connection, "SELECT temperature, correction FROM public.calc_temperatures_correction"),
+                self._query(connection, "SELECT key, value FROM public.measurment_settings"),
+                self._query(connection, "SELECT height, " + ", ".join(f"dev_{column}" for column in DEVIATION_COLUMNS)
+                            + " FROM public.temperature_deviations"),
+                self._query(connection, "SELECT id, min_speed, max_speed FROM public.wind_speed_ranges"),
+                self._query(connection, "SELECT height, wind_range_id, correction_value FROM public.wind_corrections"),
+            )
+            connection.commit()
+        finally:
+            connection.close()
+
+        with self._lock:
+            self.tables = tables
+            self.fingerprint = fingerprint
+        logger.info("Справочники метеобюллетеня загружены")
+
+        for listener in self.reload_listeners:
+            listener(self)
+
+    def reload_if_changed(self):
+        """Перезагрузка справочников, если они изменились в БД; True - если перезагружены"""
+        connection = self.connection_factory()
+        try:
+            fingerprint = self._query(connection, FINGERPRINT_SQL)[0][0]
+            connection.commit()
+        finally:
+            connection.close()
+
+        if fingerprint == self.fingerprint:
+            return False
+        self.reload()
+        return True
+
+    def add_reload_listener(self, listener):
+        """Подписка на перезагрузку справочников: listener(engine)"""
+        self.reload_listeners.append(listener)
+
+    # --- Заголовок бюллетеня ---
+
+    def _temperature_interpolation_cents(self, temperature_cents, errors):
+        tables = self.tables
+        grid, corrections = tables.correction_temperatures, tables.correction_values
+
+        outside = (temperature_cents < grid[0]) | (temperature_cents > grid[-1])
+        errors.add(outside, lambda i: (f"Температура {temperature_cents[i] / 100:.2f} выходит за пределы "
+                                       f"диапазона поправок [{grid[0] / 100:.2f}, {grid[-1] / 100:.2f}]"))
+
+        upper = np.clip(np.searchsorted(grid, temperature_cents, side='left'), 0, grid.size - 1)
+        exact = grid[upper] == temperature_cents
+        lower = np.clip(np.where(exact, upper, upper - 1), 0, grid.size - 1)
+
+        x0, x1 = grid[lower], grid[upper]
+        y0, y1 = corrections[lower], corrections[upper]
+        # Вне диапазона x0 == x1; такие строки уже помечены ошибкой
+        denominator = np.where(exact | (x1 == x0), 1, x1 - x0)
+        numerator = y0 * denominator + (temperature_cents - x0) * (y1 - y0)
+        return np.where(exact, corrections[upper], div_round(numerator, denominator))
+
+    def temperature_interpolation(self, temperatures):
+        """fn_calc_temperature_interpolation: виртуальная поправка (NaN при ошибке)"""
+        temperature_cents = to_cents(temperatures)
+        errors = MeteoError(temperature_cents.size)
+        result = self._temperature_interpolation_cents(temperature_cents, errors) / 100
+        return np.where(errors.failed, np.nan, result)
+
+    def _header_temperature_tenths(self, temperature_cents, errors):
+        virtual_cents = self.tables.setting('calc_table_temperature', 1590)
+        delta_cents = temperature_cents + self._temperature_interpolation_cents(temperature_cents, errors)
+        return div_round(delta_cents - virtual_cents, 10)
+
+    def header_temperature(self, temperatures):
+        """fn_calc_header_temperature: отклонение приземной виртуальной температуры"""
+        temperature_cents = to_cents(temperatures)
+        errors = MeteoError(temperature_cents.size)
+        result = self._header_temperature_tenths(temperature_cents, errors) / 10
+        return np.where(errors.failed | np.isnan(np.asarray(temperatures, dtype=np.float64)), np.nan, result)
+
+    def _header_pressure_tenths(self, pressure_cents, errors):
+        errors.add((pressure_cents < 50000) | (pressure_cents > 90000),
+                   lambda i: f"Давление {pressure_cents[i] / 100:.2f} вне допустимого диапазона (500..900 мм рт.ст.)")
+        table_cents = self.tables.setting('calc_table_pressure', 75000)
+        return div_round(pressure_cents - table_cents, 10)
+
+    def header_pressure(self, pressures):
+        """fn_calc_header_pressure: отклонение наземного давления"""
+        pressure_cents = to_cents(pressures)
+        errors = MeteoError(pressure_cents.size)
+        result = self._header_pressure_tenths(pressure_cents, errors) / 10
+        return np.where(errors.failed | np.isnan(np.asarray(pressures, dtype=np.float64)), np.nan, result)
+
+    @staticmethod
+    def format_header_period(period=None):
+        """fn_calc_header_period: день, час и первая цифра минут"""
+        period = period or datetime.now()
+        minute = '0' if period.minute < 10 else str(period.minute)
+        return f"{period.day:02d}{period.hour:02d}{minute[0]}"
+
+    def _check_input_params(self, params, errors):
+        """Проверка диапазонов по measurment_settings (как задумано в fn_check_input_params)"""
+        for name in INPUT_PARAMS_FIELDS:
+            minimum = self.tables.settings.get(f"min_{name}")
+            maximum = self.tables.settings.get(f"max_{name}")
+            if minimum is None or maximum is None:
+                continue
+            values = params[name]
+            cents = to_cents(values)
+            # NULL не сравнивается с границами и ошибкой не считается
+            outside = ~np.isnan(values) & ((cents < minimum) | (cents > maximum))
+            errors.add(outside, lambda i, name=name, cents=cents, minimum=minimum, maximum=maximum: (
+                f"{name.capitalize()} {cents[i] / 100:.2f} не укладывается в диапазон "
+                f"[{minimum / 100:g}, {maximum / 100:g}]"))
+
+    def format_headers(self, params, period=None):
+        """fn_calc_header_meteo_avg: строки заголовка метеосводки и ошибки по строкам"""
+        params = as_input_params(params)
+        errors = MeteoError(params.size)
+        self._check_input_params(params, errors)
+
+        heights = div_round(to_cents(params['height']), 100)
+        errors.add((heights < -10000) | (heights > 10000),
+                   lambda i: f"Высота {heights[i]} вне допустимого диапазона (-10000..10000 м)")
+
+        pressure_delta = div_round(self._header_pressure_tenths(to_cents(params['pressure']), errors), 10)
+        temperature_delta = div_round(self._header_temperature_tenths(to_cents(params['temperature']), errors), 10)
+
+        period_text = self.format_header_period(period)
+        headers = np.full(params.size, None, dtype=object)
+        for i in np.flatnonzero(~errors.failed):
+            # LPAD в PostgreSQL обрезает строку до заданной длины
+            height_text = str(abs(int(heights[i]))).rjust(4, '0')[:4]
+            pressure = int(pressure_delta[i])
+            pressure_text = ('5' + str(abs(pressure)).rjust(2, '0')[:2]) if pressure < 0 else str(pressure).rjust(3, '0')[:3]
+            temperature = int(temperature_delta[i])
+            temperature_text = ('5' + str(abs(temperature))) if temperature < 0 else str(temperature).rjust(2, '0')[:2]
+            headers[i] = period_text + height_text + pressure_text + temperature_text
+        return headers, errors.messages
+
+    # --- Отклонения температуры по высотам ---
+
+    def _deviation_cents(self, heights, values, errors):
+        tables = self.tables
+        valid_value = (values >= 0) & (values < tables.deviation_column_index.size)
+        columns = tables.deviation_column_index[np.where(valid_value, values, 0)]
+        errors.add(~valid_value | (columns < 0), lambda i: (
+            f"Значение {values[i]} должно быть в диапазоне 1-10 или одним из: 20, 30, 40, 50"))
+
+        rows = nearest_index(tables.deviation_heights, heights)
+        return tables.deviation_values[rows, np.clip(columns, 0, None)]
+
+    def temperature_deviation(self, heights, temperatures):
+        """calculate_temperature_deviation: массивы tens, ones, dev_tens, dev_ones, result и ошибки"""
+        heights = div_round(to_cents(heights), 100)
+        temperature_cents = to_cents(temperatures)
+        errors = MeteoError(temperature_cents.size)
+
+        absolute = np.abs(temperature_cents)
+        tens = (absolute // 1000) * 10
+        ones = div_round(absolute - tens * 100, 100)
+
+        dev_tens = self._deviation_cents(heights, np.where(tens == 0, 1, tens), errors)
+        dev_ones = np.where(ones > 0, self._deviation_cents(heights, np.where(ones > 0, ones, 1), errors), 0)
+
+        result = dev_tens + dev_ones
+        result = np.where(temperature_cents < 0, np.abs(result) + 5000, result)
+
+        failed = errors.failed
+        return {
+            'tens': tens, 'ones': ones,
+            'dev_tens': np.where(failed, np.nan, dev_tens / 100),
+            'dev_ones': np.where(failed, np.nan, dev_ones / 100),
+            'result': np.where(failed, np.nan, result / 100),
+            'errors': errors.messages,
+        }
+
+    # --- Ветер ---
+
+    def _wind_range_index(self, speed_cents, errors):
+        tables = self.tables
+        inside = (speed_cents[:, None] >= tables.wind_range_min) & (speed_cents[:, None] <= tables.wind_range_max)
+        found = inside.any(axis=1)
+        errors.add(~found, lambda i: (f"Скорость ветра {speed_cents[i] / 100:.2f} м/с не попадает ни в один "
+                                      f"из настроенных диапазонов"))
+        return np.argmax(inside, axis=1)
+
+    def wind_range_id(self, speeds):
+        """fn_get_wind_range_id: id диапазона скорости ветра (-1 при ошибке)"""
+        speed_cents = to_cents(speeds)
+        errors = MeteoError(speed_cents.size)
+        index = self._wind_range_index(speed_cents, errors)
+        return np.where(errors.failed, -1, self.tables.wind_range_ids[index])
+
+    def _wind_correction_cents(self, heights, speed_cents, errors):
+        tables = self.tables
+        rows = nearest_index(tables.wind_heights, heights)
+        columns = self._wind_range_index(speed_cents, errors)
+        errors.add(~tables.wind_correction_found[rows, columns], lambda i: (
+            f"Не найдена поправка для высоты {tables.wind_heights[rows[i]]} "
+            f"и диапазона скорости ветра {tables.wind_range_ids[columns[i]]}"))
+        return tables.wind_corrections[rows, columns]
+
+    def wind_correction(self, heights, speeds):
+        """fn_get_wind_correction: поправка для ближайшей высоты и диапазона скорости"""
+        heights = div_round(to_cents(heights), 100)
+        speed_cents = to_cents(speeds)
+        errors = MeteoError(speed_cents.size)
+        result = self._wind_correction_cents(heights, speed_cents, errors) / 100
+        return np.where(errors.failed, np.nan, result)
+
+    @staticmethod
+    def vr_mean_wind(heights, bullet_demolition_ranges):
+        """Скорость среднего ветра и приращение направления Δα_WY по таблице 3 ВР.
+
+        Берутся ближайшие высота и дальность сноса таблицы (при равенстве
+        расстояний - меньшие); высоты ниже 200 м и выше 4000 м получают
+        значения для 200 и 4000 м.
+        """
+        rows = nearest_index(VR_WIND_HEIGHTS, np.asarray(heights, dtype=np.int64))
+        columns = nearest_index(VR_BULLET_DEMOLITION_RANGES * 100, to_cents(bullet_demolition_ranges))
+        return VR_WIND_SPEEDS[rows, columns], VR_WIND_DIRECTION_INCREMENTS[rows]
+
+    def wind_rifle_corrections(self, params):
+        """fn_calc_wind_rifle_corrections для массива input_params"""
+        params = as_input_params(params)
+        errors = MeteoError(params.size)
+        self._check_input_params(params, errors)
+
+        temperature_deviation = self._header_temperature_tenths(to_cents(params['temperature']), errors) / 10
+        pressure_deviation = self._header_pressure_tenths(to_cents(params['pressure']), errors) / 10
+        heights = div_round(to_cents(params['height']), 100)
+        wind_correction_cents = self._wind_correction_cents(heights, to_cents(params['wind_speed']), errors)
+
+        # wind_direction_rad NUMERIC(8,2) := wind_direction * (3.14159265358979 / 30.0)
+        numerator, denominator = WIND_DIRECTION_RADIANS
+        radians_cents = div_round(to_cents(params['wind_direction']) * numerator, denominator)
+        # SIN считается в double precision, результат приводится к NUMERIC(8,2)
+        bullet_cents = np.array([
+            float_to_cents((correction / 100) * math.sin(radians / 100))
+            for correction, radians in zip(wind_correction_cents.tolist(), radians_cents.tolist())
+        ], dtype=np.int64)
+
+        failed = errors.failed
+        return {
+            'height': params['height'],
+            'temperature': params['temperature'],
+            'temperature_deviation': np.where(failed, np.nan, temperature_deviation),
+            'pressure': params['pressure'],
+            'pressure_deviation': np.where(failed, np.nan, pressure_deviation),
+            'wind_direction': params['wind_direction'],
+            'wind_speed': params['wind_speed'],
+            'wind_correction': np.where(failed, np.nan, wind_correction_cents / 100),
+            'bullet_demolition_range': params['bullet_demolition_range'],
+            'bullet_deviation': np.where(failed, np.nan, bullet_cents / 100),
+            'errors': errors.messages,
+        }
+
+    # --- Бюллетень ---
+
+    def bulletin(self, params, measurement_type=MEASUREMENT_DMK, period=None):
+        """Приближенный метеобюллетень для массива input_params.
+
+        Для каждой записи и каждой стандартной высоты temperature_deviations
+        возвращаются среднее отклонение температуры (calculate_temperature_deviation
+        от округленного отклонения виртуальной температуры), направление и
+        скорость среднего ветра. Для ДМК скорость - fn_get_wind_correction с
+        округлением до 1 м/с, а приращения направления в справочниках нет, и
+        направление равно приземному. Для ВР скорость и приращение Δα_WY берутся
+        из таблицы 3 по дальности сноса ветровых пуль Дг (vr_mean_wind), а
+        направление равно α_V0 + Δα_WY. Ветер обнуляется при скорости
+        приземного ветра ниже 3 м/с (ДМК) или дальности сноса пуль меньше 40 м
+        либо не заданной (ВР).
+        """
+        params = as_input_params(params)
+        headers, header_errors = self.format_headers(params, period)
+        errors = MeteoError(params.size)
+        errors.add(~np.equal(header_errors, None), lambda i: header_errors[i])
+
+        heights = self.tables.deviation_heights
+        count = params.size
+
+        # Отклонение виртуальной температуры, округленное до целого
+        delta = div_round(self._header_temperature_tenths(to_cents(params['temperature']), errors), 10)
+
+        # Все пары (запись, стандартная высота) считаются одним вызовом
+        grid_heights = np.tile(heights, count)
+        grid_delta = np.repeat(delta, heights.size)
+        deviation = self.temperature_deviation(grid_heights, grid_delta)
+        deviation_errors = deviation['errors'].reshape(count, heights.size)
+        errors.add(~np.equal(deviation_errors, None).all(axis=1),
+                   lambda i: next(message for message in deviation_errors[i] if message))
+
+        surface_direction = np.repeat(div_round(to_cents(params['wind_direction']), 100), heights.size)
+        if measurement_type == MEASUREMENT_VR:
+            # NaN не проходит сравнение, поэтому не заданная дальность сноса тоже означает штиль
+            calm = ~(params['bullet_demolition_range'] >= VR_MIN_BULLET_DEMOLITION_RANGE)
+            wind_speed, direction_increment = self.vr_mean_wind(
+                grid_heights, np.repeat(params['bullet_demolition_range'], heights.size))
+            wind_direction = (surface_direction + direction_increment) % WIND_DIRECTION_CIRCLE
+        else:
+            calm = params['wind_speed'] < DMK_MIN_WIND_SPEED
+
+            speed_errors = MeteoError(count * heights.size)
+            wind_cents = self._wind_correction_cents(
+                grid_heights, np.repeat(to_cents(params['wind_speed']), heights.size), speed_errors)
+            # При штиле ветер обнуляется, и ошибки поиска поправки не важны
+            wind_errors = speed_errors.messages.reshape(count, heights.size)
+            errors.add(~np.equal(wind_errors, None).all(axis=1) & ~calm,
+                       lambda i: next(message for message in wind_errors[i] if message))
+            wind_speed = div_round(wind_cents, 100)
+            wind_direction = surface_direction
+
+        wind_speed = wind_speed.reshape(count, heights.size)
+        wind_direction = wind_direction.reshape(count, heights.size)
+        wind_speed = np.where(calm[:, None], 0, wind_speed)
+        wind_direction = np.where(calm[:, None], 0, wind_direction)
+
+        failed = errors.failed
+        return {
+            'header': np.where(failed, None, headers),
+            'heights': heights,
+            'temperature_deviation': np.where(failed[:, None], np.nan,
+                                              deviation['result'].reshape(count, heights.size)),
+            'wind_direction': np.where(failed[:, None], -1, wind_direction),
+            'wind_speed': np.where(failed[:, None], -1, wind_speed),
+            'errors': errors.messages,
+        }
+
+
+def as_input_params(params):
+    """Приведение записей input_params (структурный массив, словарь массивов или кортежи) к INPUT_PARAMS_DTYPE"""
+    if isinstance(params, np.ndarray) and params.dtype.names:
+        result = np.empty(params.shape[0], dtype=INPUT_PARAMS_DTYPE)
+        for name in INPUT_PARAMS_FIELDS:
+            result[name] = params[name] if name in params.dtype.names else np.nan
+        return result
+    if isinstance(params, dict):
+        size = len(next(iter(params.values())))
+        result = np.empty(size, dtype=INPUT_PARAMS_DTYPE)
+        for name in INPUT_PARAMS_FIELDS:
+            values = params.get(name)
+            result[name] = np.nan if values is None else np.array(
+                [np.nan if value is None else float(value) for value in values])
+        return result
+    rows = [tuple(np.nan if value is None else float(value) for value in row) for row in params]
+    return np.array(rows, dtype=INPUT_PARAMS_DTYPE)
+
+
+def load_measurement_params(connection, measurement_ids=None):
+    """Чтение measurment_input_params: (ids, тип устройства, input_params)"""
+    cursor = connection.cursor()
+    sql = """SELECT p.id, t.short_name, p.height, p.temperature, p.pressure,
+                    p.wind_direction, p.wind_speed, p.bullet_demolition_range
+             FROM public.measurment_input_params p
+             JOIN public.measurment_types t ON t.id = p.measurment_type_id"""
+    if measurement_ids is not None:
+        cursor.execute(sql + " WHERE p.id = ANY(%s) ORDER BY p.id", (list(measurement_ids),))
+    else:
+        cursor.execute(sql + " ORDER BY p.id")
+    rows = cursor.fetchall()
+    cursor.close()
+
+    ids = np.array([row[0] for row in rows], dtype=np.int64)
+    types = np.array([row[1] for row in rows], dtype=object)
+    return ids, types, as_input_params([row[2:] for row in rows])
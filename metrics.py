@@ -0,0 +1,307 @@
+"""
+Метрики обращений к БД и действий приложения: счетчики и гистограммы задержек.
+
+Курсоры и соединения оборачиваются прокси, которые засекают время каждого
+execute/executemany/callproc/commit/rollback. Запись одного замера - два
+вызова perf_counter, поиск корзины bisect и короткая блокировка, поэтому
+инструментирование можно не выключать в рабочем режиме.
+"""
+
+import bisect
+import json
+import logging
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger('interpolation_app')
+
+# Верхние границы корзин гистограмм задержки (с)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Длина текста запроса в журнале медленных запросов
+SLOW_QUERY_TEXT_LIMIT = 500
+# Количество различных текстов SQL, для которых запоминается вид запроса
+STATEMENT_KIND_CACHE_SIZE = 1024
+
+STATEMENT_TABLE = re.compile(r'\b(?:FROM|INTO|UPDATE|TABLE(?:\s+IF\s+(?:NOT\s+)?EXISTS)?)\s+`?(\w+)', re.IGNORECASE)
+
+
+def statement_kind(sql):
+    """Вид запроса: команда и основная таблица, например 'INSERT points_table'"""
+    if isinstance(sql, (bytes, bytearray)):
+        sql = sql.decode('utf-8', errors='replace')
+    words = sql.split(None, 1)
+    if not words:
+        return 'EMPTY'
+    command = words[0].upper()
+    match = STATEMENT_TABLE.search(sql)
+    return f"{command} {match.group(1)}" if match else command
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами (накопительная при выводе, как в Prometheus)"""
+
+    __slots__ = ('buckets', 'counts', 'count', 'total', 'maximum')
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.maximum:
+            self.maximum = value
+
+    def quantile(self, q):
+        """Оценка квантиля по верхней границе корзины"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.maximum)
+        return self.maximum
+
+    def cumulative(self):
+        result, seen = [], 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            seen += count
+            result.append((bound, seen))
+        return result
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'sum_s': self.total,
+            'max_s': self.maximum,
+            'p50_s': self.quantile(0.5),
+            'p99_s': self.quantile(0.99),
+            'buckets': {('+Inf' if bound == float('inf') else repr(bound)): seen for bound, seen in self.cumulative()},
+        }
+
+
+class StatementStats:
+    """Статистика одного вида запросов"""
+
+    __slots__ = ('latency', 'rows', 'bytes', 'errors')
+
+    def __init__(self):
+        self.latency = Histogram()
+        self.rows = 0
+        self.bytes = 0
+        self.errors = 0
+
+
+class Metrics:
+    """Реестр метрик: запросы по видам, события соединений и действия приложения"""
+
+    def __init__(self, slow_query_threshold=None, prefix='interpolation'):
+        # Запросы дольше порога (с) пишутся в журнал; None - журнал выключен
+        self.slow_query_threshold = slow_query_threshold
+        self.prefix = prefix
+        self.statements = {}
+        self.events = {}
+        self.actions = {}
+        self._kinds = {}
+        self._lock = threading.Lock()
+
+    # --- Запись замеров ---
+
+    def kind(self, sql):
+        kind = self._kinds.get(sql)
+        if kind is None:
+            kind = statement_kind(sql)
+            if len(self._kinds) >= STATEMENT_KIND_CACHE_SIZE:
+                # Тексты с переменным числом параметров не должны раздувать кеш
+                self._kinds.clear()
+            self._kinds[sql] = kind
+        return kind
+
+    def observe_statement(self, kind, seconds, rows=0, size=0, failed=False, statement=None):
+        with self._lock:
+            stats = self.statements.get(kind)
+            if stats is None:
+                stats = self.statements[kind] = StatementStats()
+            stats.latency.observe(seconds)
+            stats.rows += rows
+            stats.bytes += size
+            if failed:
+                stats.errors += 1
+
+        if self.slow_query_threshold is not None and seconds >= self.slow_query_threshold:
+            text = statement if isinstance(statement, str) else kind
+            logger.warning(f"Медленный запрос ({seconds * 1000:.1f} мс, {kind}): {text[:SLOW_QUERY_TEXT_LIMIT]}")
+
+    def observe_event(self, name, seconds=0.0):
+        """Событие соединения (подключение, ожидание пула, переподключение, повтор)"""
+        with self._lock:
+            histogram = self.events.get(name)
+            if histogram is None:
+                histogram = self.events[name] = Histogram()
+            histogram.observe(seconds)
+
+    def observe_action(self, name, seconds):
+        with self._lock:
+            histogram = self.actions.get(name)
+            if histogram is None:
+                histogram = self.actions[name] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def profile(self, name):
+        """Замер длительности действия приложения (кнопки, фоновой задачи)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_action(name, time.perf_counter() - start)
+
+    # --- Выгрузка ---
+
+    def snapshot(self):
+        """Текущие значения всех метрик в виде словаря"""
+        with self._lock:
+            return {
+                'statements': {
+                    kind: {'rows': stats.rows, 'bytes': stats.bytes, 'errors': stats.errors,
+                           **stats.latency.as_dict()}
+                    for kind, stats in sorted(self.statements.items())
+                },
+                'events': {name: histogram.as_dict() for name, histogram in sorted(self.events.items())},
+                'actions': {name: histogram.as_dict() for name, histogram in sorted(self.actions.items())},
+            }
+
+    def to_json(self, indent=2):
+        return json.dumps(self.snapshot(), ensure_ascii=False, indent=indent)
+
+    def to_prometheus(self):
+        """Метрики в текстовом формате Prometheus"""
+        lines = []
+
+        def histogram(name, help_text, label, items):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for value, hist in items:
+                label_text = f'{label}="{escape_label(value)}"'
+                for bound, seen in hist.cumulative():
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'{name}_bucket{{{label_text},le="{le}"}} {seen}')
+                lines.append(f"{name}_sum{{{label_text}}} {hist.total!r}")
+                lines.append(f"{name}_count{{{label_text}}} {hist.count}")
+
+        def counter(name, help_text, label, items):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for value, number in items:
+                lines.append(f'{name}{{{label}="{escape_label(value)}"}} {number}')
+
+        with self._lock:
+            statements = sorted(self.statements.items())
+            prefix = self.prefix
+            histogram(f"{prefix}_db_statement_seconds", "Длительность запросов к БД по видам", 'kind',
+                      [(kind, stats.latency) for kind, stats in statements])
+            counter(f"{prefix}_db_statement_rows_total", "Строк затронуто запросами", 'kind',
+                    [(kind, stats.rows) for kind, stats in statements])
+            counter(f"{prefix}_db_statement_bytes_total", "Байт текста отправленных запросов", 'kind',
+                    [(kind, stats.bytes) for kind, stats in statements])
+            counter(f"{prefix}_db_statement_errors_total", "Запросов, завершившихся ошибкой", 'kind',
+                    [(kind, stats.errors) for kind, stats in statements])
+            histogram(f"{prefix}_db_connection_event_seconds", "События соединений с БД", 'event',
+                      sorted(self.events.items()))
+            histogram(f"{prefix}_app_action_seconds", "Длительность действий приложения", 'action',
+                      sorted(self.actions.items()))
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, path):
+        """Запись метрик в файл: .prom - формат Prometheus, иначе JSON"""
+        text = self.to_prometheus() if path.endswith('.prom') else self.to_json()
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+    def reset(self):
+        with self._lock:
+            self.statements.clear()
+            self.events.clear()
+            self.actions.clear()
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class InstrumentedCursor:
+    """Курсор с замером execute/executemany/callproc; остальное передается как есть"""
+
+    def __init__(self, cursor, metrics):
+        self._cursor = cursor
+        self._metrics = metrics
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def _measure(self, kind, sql, method, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            result = method(*args, **kwargs)
+        except Exception:
+            self._metrics.observe_statement(kind, time.perf_counter() - start, failed=True, statement=sql)
+            raise
+        seconds = time.perf_counter() - start
+        rowcount = getattr(self._cursor, 'rowcount', -1)
+        statement = getattr(self._cursor, 'statement', None) or sql
+        size = len(statement) if isinstance(statement, (str, bytes, bytearray)) else 0
+        self._metrics.observe_statement(kind, seconds, rows=max(rowcount or 0, 0), size=size, failed=False,
+                                        statement=statement)
+        return result
+
+    def execute(self, operation, *args, **kwargs):
+        return self._measure(self._metrics.kind(operation), operation, self._cursor.execute, operation, *args,
+                             **kwargs)
+
+    def executemany(self, operation, *args, **kwargs):
+        return self._measure(self._metrics.kind(operation), operation, self._cursor.executemany, operation, *args,
+                             **kwargs)
+
+    def callproc(self, procname, *args, **kwargs):
+        return self._measure(f"CALL {procname}", f"CALL {procname}", self._cursor.callproc, procname, *args,
+                             **kwargs)
+
+
+class InstrumentedConnection:
+    """Соединение, выдающее инструментированные курсоры и замеряющее commit/rollback"""
+
+    def __init__(self, connection, metrics):
+        self._connection = connection
+        self._metrics = metrics
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self._connection.cursor(*args, **kwargs), self._metrics)
+
+    def _measure(self, kind, method):
+        start = time.perf_counter()
+        try:
+            method()
+        except Exception:
+            self._metrics.observe_statement(kind, time.perf_counter() - start, failed=True)
+            raise
+        self._metrics.observe_statement(kind, time.perf_counter() - start)
+
+    def commit(self):
+        self._measure('COMMIT', self._connection.commit)
+
+    def rollback(self):
+        self._measure('ROLLBACK', self._connection.rollback)
@@ -0,0 +1,241 @@
+"""
+Отрисовка графика интерполяции с повторным использованием объектов matplotlib.
+
+Точки, кривая и целевая точка создаются один раз; при обновлении меняются
+только их данные. Если пределы осей не изменились, перерисовываются лишь
+измененные объекты поверх сохраненного фона (blitting). Длинные линии
+прореживаются до разрешения экрана: в каждом столбце пикселей остаются
+минимум и максимум Y, так что форма графика не теряется. Исходные точки
+рисуются все: прореживание по минимуму и максимуму исказило бы их облако.
+"""
+
+import logging
+
+import numpy as np
+
+logger = logging.getLogger('interpolation_app')
+
+# Задержка повторного прореживания после масштабирования или сдвига (мс)
+REDECIMATE_DELAY = 100
+# Поля вокруг данных при автоматическом выборе пределов осей
+AXES_MARGIN = 0.05
+
+
+def decimate_minmax(x_values, y_values, x_min, x_max, columns):
+    """Прореживание ряда до columns столбцов пикселей по диапазону [x_min, x_max].
+
+    Точки вне диапазона отбрасываются (кроме соседних с ним, чтобы линия не
+    обрывалась у края). Если точек не больше 2 * columns, они возвращаются
+    без изменений; иначе в каждом столбце остаются точки с минимальным и
+    максимальным Y в исходном порядке. Значения NaN разрывают линию: от
+    каждой серии подряд идущих NaN остается одна точка-разделитель, а
+    минимум и максимум выбираются отдельно по обе стороны от разрыва.
+    """
+    visible = (x_values >= x_min) & (x_values <= x_max)
+    keep = visible.copy()
+    keep[:-1] |= visible[1:]
+    keep[1:] |= visible[:-1]
+    if np.count_nonzero(keep) <= 2 * columns:
+        return x_values[keep], y_values[keep]
+
+    index = np.flatnonzero(keep)
+    gap = np.isnan(y_values[index])
+    # Первая точка каждой серии NaN остается разделителем; участки между разрывами нумеруются
+    gap_starts = gap & np.r_[True, ~gap[:-1]]
+    separators = index[gap_starts]
+    segments = np.cumsum(gap_starts)[~gap]
+    index = index[~gap]
+
+    x_kept, y_kept = x_values[index], y_values[index]
+    width = (x_max - x_min) or 1.0
+    bins = np.clip(((x_kept - x_min) / width * columns).astype(np.int64), 0, columns - 1)
+
+    # Внутри каждого столбца участка точки упорядочены по Y: первая - минимум, последняя - максимум
+    order = np.lexsort((y_kept, bins, segments))
+    sorted_bins, sorted_segments = bins[order], segments[order]
+    starts = np.flatnonzero(np.r_[True, (sorted_bins[1:] != sorted_bins[:-1])
+                                  | (sorted_segments[1:] != sorted_segments[:-1])])
+    ends = np.r_[starts[1:], sorted_bins.size] - 1
+
+    selected = np.unique(np.concatenate((index[order[starts]], index[order[ends]], separators)))
+    return x_values[selected], y_values[selected]
+
+
+class PlotRenderer:
+    """Постоянные объекты графика и их обновление без полной перерисовки"""
+
+    def __init__(self, fig, ax, canvas):
+        self.fig = fig
+        self.ax = ax
+        self.canvas = canvas
+        self.widget = canvas.get_tk_widget()
+
+        # Полные данные рядов; на графике отображается их прореженная версия
+        self.data = {}
+        self.artists = {
+            'points': ax.scatter([], [], color='blue', s=30, label='Исходные точки', animated=True),
+            'curve': ax.plot([], [], '-', linewidth=2, animated=True)[0],
+            'target': ax.plot([], [], 'ro', markersize=8, animated=True)[0],
+        }
+        for artist in self.artists.values():
+            artist.set_visible(False)
+
+        self._background = None
+        self._auto_view = True
+        self._updating_view = False
+        self._redecimate_id = None
+
+        canvas.mpl_connect('draw_event', self._on_draw)
+        canvas.mpl_connect('resize_event', self._on_view_changed)
+        ax.callbacks.connect('xlim_changed', self._on_view_changed)
+
+    def set_title(self, title):
+        self.ax.set_title(title)
+        self._refresh(full=True)
+
+    def set_points(self, x_values, y_values):
+        """Новый набор исходных точек; пределы осей подбираются заново"""
+        self._set_series('points', x_values, y_values)
+        self._auto_view = True
+        self._refresh(full=True)
+
+    def set_curve(self, x_values, y_values, label):
+        """Новая кривая интерполяции (значения Y могут содержать NaN до расчета)"""
+        self.artists['curve'].set_label(label)
+        self._set_series('curve', x_values, y_values)
+        self._auto_view = True
+        self._refresh(full=True)
+
+    def update_curve(self, y_values, x_values=None):
+        """Обновление кривой; без x_values сохраняется прежняя сетка X"""
+        if x_values is None:
+            x_values = self.data['curve'][0]
+        self._set_series('curve', x_values, y_values, update_legend=False)
+        self._refresh(full=False)
+
+    def set_target(self, x_target, y_target, label):
+        self.artists['target'].set_label(label)
+        self._set_series('target', np.array([x_target], dtype=np.float64),
+                         np.array([y_target], dtype=np.float64))
+        self._refresh(full=True)
+
+    def clear(self, *names):
+        """Скрытие рядов по имени (по умолчанию всех)"""
+        for name in names or tuple(self.artists):
+            self.data.pop(name, None)
+            self.artists[name].set_visible(False)
+        self._update_legend()
+        self._refresh(full=True)
+
+    def _set_series(self, name, x_values, y_values, update_legend=True):
+        x_values = np.asarray(x_values, dtype=np.float64)
+        y_values = np.asarray(y_values, dtype=np.float64)
+        self.data[name] = (x_values, y_values)
+        self._show(name)
+        self.artists[name].set_visible(True)
+        if update_legend:
+            self._update_legend()
+
+    def _show(self, name):
+        """Передача в объект графика данных ряда (линии прореживаются под текущий вид)"""
+        x_values, y_values = self.data[name]
+        artist = self.artists[name]
+        if name == 'points':
+            # Облако точек не прореживается: крайние по Y точки столбца не передают его плотность
+            artist.set_offsets(np.column_stack((x_values, y_values)))
+            return
+
+        x_min, x_max = self.ax.get_xlim()
+        columns = self.pixel_size()[0]
+        artist.set_data(*decimate_minmax(x_values, y_values, x_min, x_max, columns))
+
+    def pixel_size(self):
+        """Ширина и высота области графика в пикселях"""
+        return max(int(self.ax.bbox.width), 1), max(int(self.ax.bbox.height), 1)
+
+    def _update_legend(self):
+        handles = [artist for name, artist in self.artists.items() if name in self.data]
+        legend = self.ax.get_legend()
+        if legend is not None:
+            legend.remove()
+        if handles:
+            self.ax.legend(handles=handles)
+
+    def _data_limits(self):
+        x_parts, y_parts = [], []
+        for x_values, y_values in self.data.values():
+            x_parts.append(x_values)
+            y_parts.append(y_values)
+        x_all = np.concatenate(x_parts)
+        y_all = np.concatenate(y_parts)
+        if not np.isfinite(x_all).any() or not np.isfinite(y_all).any():
+            return None
+
+        limits = []
+        for values in (x_all, y_all):
+            low, high = np.nanmin(values), np.nanmax(values)
+            margin = (high - low) * AXES_MARGIN or 1.0
+            limits.append((low - margin, high + margin))
+        return limits
+
+    def _apply_limits(self):
+        """Подбор пределов осей по полным данным; True, если пределы изменились"""
+        if not self._auto_view or not self.data:
+            return False
+        limits = self._data_limits()
+        if limits is None:
+            return False
+        (x_low, x_high), (y_low, y_high) = limits
+        if (x_low, x_high) == self.ax.get_xlim() and (y_low, y_high) == self.ax.get_ylim():
+            return False
+
+        self._updating_view = True
+        try:
+            self.ax.set_xlim(x_low, x_high)
+            self.ax.set_ylim(y_low, y_high)
+        finally:
+            self._updating_view = False
+        # Прореживание зависит от видимого диапазона X
+        for name in self.data:
+            self._show(name)
+        return True
+
+    def _refresh(self, full):
+        """Полная перерисовка при смене осей или легенды, иначе blitting"""
+        if self._apply_limits() or full or self._background is None:
+            self._background = None
+            self.canvas.draw_idle()
+            return
+        self.canvas.restore_region(self._background)
+        self._draw_artists()
+        self.canvas.blit(self.fig.bbox)
+
+    def _draw_artists(self):
+        for artist in self.artists.values():
+            if artist.get_visible():
+                self.fig.draw_artist(artist)
+
+    def _on_draw(self, event):
+        # Фон без анимируемых объектов сохраняется после каждой полной перерисовки
+        self._background = self.canvas.copy_from_bbox(self.fig.bbox)
+        self._draw_artists()
+
+    def _on_view_changed(self, *args):
+        if self._updating_view:
+            return
+        if args and args[0] is self.ax:
+            # Пользователь изменил масштаб или сдвинул график
+            self._auto_view = False
+        # Прореживание откладывается, пока масштаб меняется непрерывно
+        if self._redecimate_id is None:
+            self._redecimate_id = self.widget.after(REDECIMATE_DELAY, self._redecimate)
+
+    def _redecimate(self):
+        self._redecimate_id = None
+        try:
+            for name in self.data:
+                self._show(name)
+            self._background = None
+            self.canvas.draw_idle()
+        except Exception as e:
+            logger.error(f"Ошибка при обновлении графика: {e}")
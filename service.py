@@ -0,0 +1,479 @@
+"""
+HTTP-сервис интерполяции для режима MULTI-USER.
+
+Операции DatabaseManager доступны по HTTP на localhost без Tk-интерфейса.
+Сервер построен на потоках asyncio; блокирующие вызовы DatabaseManager
+выполняются в пуле потоков размером с пул соединений MySQL. Одинаковые
+одновременные запросы схлопываются в один расчет, а мелкие запросы одной
+точки собираются за короткое окно в один пакетный вызов к БД.
+
+    python service.py --port 8080 --mode local
+
+Запросы и ответы - JSON:
+    GET  /health
+    GET  /stats
+    GET  /metrics                 метрики DatabaseManager в формате Prometheus
+    POST /datasets/<dataset_id>   {"x": [...], "y": [...]}
+    POST /interpolate             {"dataset_id": "default", "type": "linear", "x": 5.0, "degree": 3}
+    POST /interpolate/batch       {"dataset_id": "default", "type": "linear", "x": [...], "degree": 3}
+    POST /bulletin                {"params": [{"height": ..., ...}], "measurement_type": "ДМК", "period": "..."}
+"""
+
+import argparse
+import asyncio
+import functools
+import json
+import logging
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http import HTTPStatus
+
+import numpy as np
+
+from dataset import Dataset
+
+logger = logging.getLogger('interpolation_app')
+
+# Максимальный размер тела запроса (загрузка набора данных)
+MAX_BODY_SIZE = 64 * 1024 * 1024
+# Окно сбора одиночных запросов в пакет (с) и максимальный размер пакета
+BATCH_WINDOW = 0.002
+BATCH_SIZE = 500
+# Количество запросов, ожидающих соединения с БД, после которого сервис отвечает 503
+MAX_WAITING = 10000
+# Минимальный интервал между проверками изменения справочников метеобюллетеня (с)
+METEO_RELOAD_INTERVAL = 5.0
+
+
+class HttpError(Exception):
+    """Ошибка запроса с HTTP-статусом ответа"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def jsonable(value):
+    """Приведение результатов NumPy к JSON (NaN -> null)"""
+    if isinstance(value, dict):
+        return {key: jsonable(item) for key, item in value.items()}
+    if isinstance(value, np.ndarray):
+        value = value.tolist()
+    if isinstance(value, (list, tuple)):
+        return [jsonable(item) for item in value]
+    if isinstance(value, (float, np.floating)):
+        return None if math.isnan(value) else float(value)
+    if isinstance(value, np.integer):
+        return int(value)
+    return value
+
+
+class DatabaseGate:
+    """Ограничение одновременных обращений к БД с обратным давлением.
+
+    Одновременно выполняется не больше pool_size блокирующих вызовов; если
+    очередь ожидающих длиннее max_waiting, запрос сразу отклоняется с 503,
+    чтобы задержка не росла без границ.
+    """
+
+    def __init__(self, pool_size, max_waiting=MAX_WAITING):
+        self.max_waiting = max_waiting
+        self.waiting = 0
+        self.rejected = 0
+        self.semaphore = asyncio.Semaphore(pool_size)
+        self.executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix='service_db')
+
+    async def run(self, func, *args):
+        if self.waiting >= self.max_waiting:
+            self.rejected += 1
+            raise HttpError(503, "Сервис перегружен, повторите запрос позже")
+
+        self.waiting += 1
+        try:
+            await self.semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, functools.partial(func, *args))
+        finally:
+            self.semaphore.release()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+
+class Coalescer:
+    """Схлопывание одинаковых одновременных запросов в один расчет"""
+
+    def __init__(self):
+        self.in_flight = {}
+        self.started = 0
+        self.coalesced = 0
+
+    async def run(self, key, factory):
+        future = self.in_flight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(factory())
+            self.in_flight[key] = future
+            future.add_done_callback(lambda _: self.in_flight.pop(key, None))
+            self.started += 1
+        else:
+            self.coalesced += 1
+        # Отмена одного клиента не должна отменять расчет для остальных
+        return await asyncio.shield(future)
+
+
+class MicroBatcher:
+    """Сбор одиночных расчетов интерполяции в один пакетный вызов к БД.
+
+    Запросы с одинаковыми (набор, тип, степень) копятся в течение window
+    секунд или до max_size точек и считаются одним calculate_interpolation_batch.
+    """
+
+    def __init__(self, gate, db_manager, window=BATCH_WINDOW, max_size=BATCH_SIZE):
+        self.gate = gate
+        self.db_manager = db_manager
+        self.window = window
+        self.max_size = max_size
+        self.pending = {}
+        self.timers = {}
+        self.batches = 0
+        self.batched_requests = 0
+
+    async def submit(self, dataset_id, interpolation_type, polynomial_degree, x_target):
+        loop = asyncio.get_running_loop()
+        key = (dataset_id, interpolation_type, polynomial_degree)
+        batch = self.pending.get(key)
+        if batch is None:
+            batch = self.pending[key] = []
+            self.timers[key] = loop.call_later(self.window, self._flush, key)
+
+        future = loop.create_future()
+        batch.append((x_target, future))
+        if len(batch) >= self.max_size:
+            self.timers.pop(key).cancel()
+            self._flush(key)
+        return await future
+
+    def _flush(self, key):
+        self.timers.pop(key, None)
+        batch = self.pending.pop(key, None)
+        if batch:
+            asyncio.ensure_future(self._execute(key, batch))
+
+    async def _execute(self, key, batch):
+        dataset_id, interpolation_type, polynomial_degree = key
+        self.batches += 1
+        self.batched_requests += len(batch)
+        try:
+            values, error_codes, error_messages = await self.gate.run(
+                self.db_manager.calculate_interpolation_batch,
+                interpolation_type, [x_target for x_target, _ in batch], polynomial_degree, dataset_id, True
+            )
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for index, (_, future) in enumerate(batch):
+            if not future.done():
+                value = values[index]
+                future.set_result((None if np.isnan(value) else float(value),
+                                   int(error_codes[index]), error_messages[index]))
+
+
+class InterpolationService:
+    """Обработка HTTP-запросов к DatabaseManager и MeteoEngine"""
+
+    def __init__(self, db_manager, meteo_engine=None, pool_size=5, max_waiting=MAX_WAITING,
+                 batch_window=BATCH_WINDOW, batch_size=BATCH_SIZE, meteo_reload_interval=METEO_RELOAD_INTERVAL):
+        self.db_manager = db_manager
+        self.meteo_engine = meteo_engine
+        self.meteo_reload_interval = meteo_reload_interval
+        self.meteo_checked = None
+        self.gate = DatabaseGate(pool_size, max_waiting)
+        self.coalescer = Coalescer()
+        self.batcher = MicroBatcher(self.gate, db_manager, batch_window, batch_size)
+        self.requests = 0
+        self.routes = {
+            ('GET', '/health'): self.health,
+            ('GET', '/stats'): self.stats,
+            ('GET', '/metrics'): self.metrics,
+            ('POST', '/interpolate'): self.interpolate,
+            ('POST', '/interpolate/batch'): self.interpolate_batch,
+            ('POST', '/bulletin'): self.bulletin,
+        }
+
+    # --- Обработчики ---
+
+    async def health(self, body):
+        return {'status': 'ok'}
+
+    async def stats(self, body):
+        return {
+            'requests': self.requests,
+            'db_waiting': self.gate.waiting,
+            'rejected': self.gate.rejected,
+            'coalesced': self.coalescer.coalesced,
+            'computations': self.coalescer.started,
+            'batches': self.batcher.batches,
+            'batched_requests': self.batcher.batched_requests,
+        }
+
+    async def metrics(self, body):
+        return self.db_manager.metrics.to_prometheus()
+
+    async def upload_dataset(self, dataset_id, body):
+        x_values = np.asarray(body.get('x', []), dtype=np.float64)
+        y_values = np.asarray(body.get('y', []), dtype=np.float64)
+        if x_values.shape != y_values.shape or x_values.ndim != 1:
+            raise HttpError(400, "Массивы x и y должны быть одномерными и одинаковой длины")
+
+        dataset = Dataset(x_values, y_values, dataset_id, source='http')
+        if not await self.gate.run(self.db_manager.insert_data_points, dataset, dataset_id):
+            raise HttpError(500, "Не удалось сохранить точки в базе данных")
+        return {'dataset_id': dataset_id, 'points': len(dataset)}
+
+    @staticmethod
+    def _interpolation_args(body):
+        try:
+            interpolation_type = body.get('type', 'linear')
+            polynomial_degree = int(body.get('degree', 3))
+            # Степень не влияет на остальные виды интерполяции
+            if interpolation_type != 'polynomial':
+                polynomial_degree = 3
+            return str(body.get('dataset_id', 'default')), interpolation_type, polynomial_degree
+        except (TypeError, ValueError) as e:
+            raise HttpError(400, f"Некорректные параметры интерполяции: {e}")
+
+    async def interpolate(self, body):
+        dataset_id, interpolation_type, polynomial_degree = self._interpolation_args(body)
+        try:
+            x_target = float(body['x'])
+        except (KeyError, TypeError, ValueError):
+            raise HttpError(400, "Поле x должно быть числом")
+
+        key = ('point', dataset_id, interpolation_type, polynomial_degree, x_target)
+        result_value, error_code, error_message = await self.coalescer.run(key, lambda: self.batcher.submit(
+            dataset_id, interpolation_type, polynomial_degree, x_target))
+        return {'x': x_target, 'y': result_value, 'error_code': error_code, 'error_message': error_message}
+
+    async def interpolate_batch(self, body):
+        dataset_id, interpolation_type, polynomial_degree = self._interpolation_args(body)
+        try:
+            x_targets = np.asarray(body['x'], dtype=np.float64).ravel()
+        except (KeyError, TypeError, ValueError):
+            raise HttpError(400, "Поле x должно быть массивом чисел")
+
+        key = ('batch', dataset_id, interpolation_type, polynomial_degree, x_targets.tobytes())
+        values, error_codes, error_messages = await self.coalescer.run(key, lambda: self.gate.run(
+            self.db_manager.calculate_interpolation_batch,
+            interpolation_type, x_targets, polynomial_degree, dataset_id))
+        return jsonable({'x': x_targets, 'y': values, 'error_code': error_codes, 'error_message': error_messages})
+
+    async def _reload_meteo_if_changed(self):
+        """Перезагрузка измененных справочников перед расчетом, не чаще раза в meteo_reload_interval с"""
+        now = time.monotonic()
+        if self.meteo_checked is not None and now - self.meteo_checked < self.meteo_reload_interval:
+            return
+        # Отметка ставится до ожидания, чтобы одновременные запросы не проверяли справочники повторно
+        self.meteo_checked = now
+        try:
+            await self.gate.run(self.meteo_engine.reload_if_changed)
+        except Exception as e:
+            # Расчет продолжается по прежним справочникам
+            logger.warning(f"Не удалось проверить справочники метеобюллетеня: {e}")
+
+    async def bulletin(self, body):
+        if self.meteo_engine is None:
+            raise HttpError(404, "Расчет метеобюллетеня не включен (запустите сервис с --meteo)")
+
+        from meteo_engine import INPUT_PARAMS_FIELDS, MEASUREMENT_DMK
+        try:
+            params = [
+                tuple(row.get(name) for name in INPUT_PARAMS_FIELDS) if isinstance(row, dict) else tuple(row)
+                for row in body['params']
+            ]
+            period = datetime.fromisoformat(body['period']) if body.get('period') else None
+        except (KeyError, TypeError, ValueError) as e:
+            raise HttpError(400, f"Некорректные параметры бюллетеня: {e}")
+        if not params:
+            raise HttpError(400, "Список params пуст")
+
+        measurement_type = body.get('measurement_type', MEASUREMENT_DMK)
+        await self._reload_meteo_if_changed()
+        result = await self.gate.run(self.meteo_engine.bulletin, params, measurement_type, period)
+        return jsonable(result)
+
+    # --- HTTP ---
+
+    async def dispatch(self, method, path, body):
+        self.requests += 1
+        if method == 'POST' and path.startswith('/datasets/') and len(path) > len('/datasets/'):
+            return await self.upload_dataset(path[len('/datasets/'):], body)
+
+        handler = self.routes.get((method, path))
+        if handler is None:
+            raise HttpError(404, f"Неизвестный запрос: {method} {path}")
+        return await handler(body)
+
+    @staticmethod
+    async def read_request(reader):
+        """Чтение одного HTTP-запроса; None, если клиент закрыл соединение"""
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        try:
+            method, target, version = request_line.decode('latin-1').split()
+        except ValueError:
+            raise HttpError(400, "Некорректная строка запроса")
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        length = int(headers.get('content-length', 0) or 0)
+        if length > MAX_BODY_SIZE:
+            raise HttpError(413, "Слишком большой запрос")
+        body = await reader.readexactly(length) if length else b''
+
+        connection = headers.get('connection', '').lower()
+        keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+        return method, target.split('?', 1)[0], body, keep_alive
+
+    @staticmethod
+    def write_response(writer, status, payload, keep_alive):
+        # Строка отдается как текст (метрики Prometheus), остальное - как JSON
+        if isinstance(payload, str):
+            body = payload.encode('utf-8')
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            content_type = "application/json; charset=utf-8"
+        head = [
+            f"HTTP/1.1 {status} {HTTPStatus(status).phrase}",
+            f"Content-Type: {content_type}",
+            f"Content-Length: {len(body)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        ]
+        if status == 503:
+            head.append("Retry-After: 1")
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + body)
+
+    async def handle_connection(self, reader, writer):
+        """Обработка соединения клиента (запросы keep-alive выполняются по очереди)"""
+        try:
+            while True:
+                keep_alive = False
+                try:
+                    request = await self.read_request(reader)
+                    if request is None:
+                        break
+                    method, path, raw_body, keep_alive = request
+                    body = json.loads(raw_body) if raw_body else {}
+                    if not isinstance(body, dict):
+                        raise HttpError(400, "Тело запроса должно быть объектом JSON")
+                    status, payload = 200, await self.dispatch(method, path, body)
+                except HttpError as e:
+                    status, payload = e.status, {'error': e.message}
+                except json.JSONDecodeError as e:
+                    status, payload = 400, {'error': f"Некорректный JSON: {e}"}
+                except asyncio.IncompleteReadError:
+                    break
+                except Exception as e:
+                    logger.error(f"Ошибка обработки запроса: {e}")
+                    status, payload = 500, {'error': str(e)}
+
+                self.write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host, port, backlog=4096):
+        server = await asyncio.start_server(self.handle_connection, host, port, backlog=backlog)
+        logger.info(f"Сервис интерполяции слушает http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+    def shutdown(self):
+        self.gate.shutdown()
+        self.db_manager.disconnect()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="HTTP-сервис интерполяции (режим MULTI-USER)")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--mode', choices=('database', 'local'), default='database',
+                        help="Расчет хранимой процедурой или локальным движком")
+    parser.add_argument('--pool-size', type=int, default=10, help="Размер пула соединений MySQL")
+    parser.add_argument('--max-waiting', type=int, default=MAX_WAITING,
+                        help="Длина очереди к БД, после которой запросы отклоняются с 503")
+    parser.add_argument('--batch-window', type=float, default=BATCH_WINDOW,
+                        help="Окно сбора одиночных запросов в пакет, с")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    parser.add_argument('--mysql-host', default='localhost')
+    parser.add_argument('--mysql-port', type=int, default=3306)
+    parser.add_argument('--mysql-database', default='interpolation_db')
+    parser.add_argument('--mysql-user', default='user')
+    parser.add_argument('--mysql-password', default='password')
+
+    parser.add_argument('--meteo', action='store_true',
+                        help="Включить расчет метеобюллетеня по справочникам PostgreSQL")
+    parser.add_argument('--pg-host', default='localhost')
+    parser.add_argument('--pg-port', default='5432')
+    parser.add_argument('--pg-dbname', default='mydb')
+    parser.add_argument('--pg-user', default='user')
+    parser.add_argument('--pg-password', default='5309')
+    parser.add_argument('--meteo-reload-interval', type=float, default=METEO_RELOAD_INTERVAL,
+                        help="Минимальный интервал проверки изменения справочников, с")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    from db_manager import DatabaseManager
+
+    db_manager = DatabaseManager(host=args.mysql_host, port=args.mysql_port, database=args.mysql_database,
+                                 user=args.mysql_user, password=args.mysql_password,
+                                 evaluation_mode=args.mode, pool_size=args.pool_size)
+    if not db_manager.create_tables_if_not_exist():
+        raise SystemExit("Не удалось создать таблицы. Проверьте настройки подключения.")
+
+    meteo_engine = None
+    if args.meteo:
+        import psycopg2
+        from meteo_engine import MeteoEngine
+
+        meteo_engine = MeteoEngine(lambda: psycopg2.connect(
+            host=args.pg_host, port=args.pg_port, dbname=args.pg_dbname,
+            user=args.pg_user, password=args.pg_password))
+
+    service = InterpolationService(db_manager, meteo_engine, pool_size=args.pool_size, max_waiting=args.max_waiting,
+                                   batch_window=args.batch_window, batch_size=args.batch_size,
+                                   meteo_reload_interval=args.meteo_reload_interval)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Проверка метеобюллетеня ВР по значениям, посчитанным вручную по таблице 3"""
+from datetime import datetime
+
+import numpy as np
+
+from meteo_engine import DEVIATION_COLUMNS, MEASUREMENT_VR, MeteoEngine
+
+BULLETIN_HEIGHTS = [200, 400, 800, 1200, 1600, 2000, 2400, 3000, 4000]
+
+TABLE_ROWS = {
+    'calc_temperatures_correction': [(-50, 0), (0, 0.5), (50, 4.5)],
+    'measurment_settings': [],
+    'temperature_deviations': [(height,) + (0,) * len(DEVIATION_COLUMNS) for height in BULLETIN_HEIGHTS],
+    'wind_speed_ranges': [],
+    'wind_corrections': [],
+}
+
+
+class FakeCursor:
+    def execute(self, sql):
+        # Отпечаток справочников - md5, остальные запросы читают одну таблицу
+        self.rows = [('fingerprint',)] if 'md5' in sql else TABLE_ROWS[sql.rsplit('public.', 1)[1].strip()]
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def cursor(self):
+        return FakeCursor()
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def vr_bulletin(wind_direction, bullet_demolition_range):
+    engine = MeteoEngine(FakeConnection)
+    params = {
+        'height': [100], 'temperature': [15], 'pressure': [750], 'wind_direction': [wind_direction],
+        'wind_speed': [None], 'bullet_demolition_range': [bullet_demolition_range],
+    }
+    result = engine.bulletin(params, MEASUREMENT_VR, datetime(2024, 1, 1))
+    assert result['errors'][0] is None
+    return result['wind_speed'][0].tolist(), result['wind_direction'][0].tolist()
+
+
+def test_vr_wind_by_bullet_demolition_range():
+    # Столбец Дг = 150, направление α_V0 + Δα_WY
+    speeds, directions = vr_bulletin(10, 150)
+    assert speeds == [12, 15, 16, 16, 17, 18, 19, 19, 20]
+    assert directions == [10, 11, 12, 12, 13, 13, 13, 14, 14]
+
+
+def test_vr_wind_nearest_range_and_direction_wrap():
+    # Дг = 75 посередине между 70 и 80 - берется меньший столбец; 58 + 4 = 62 -> 2-00
+    speeds, directions = vr_bulletin(58, 75)
+    assert speeds == [6, 7, 7, 8, 8, 8, 9, 9, 9]
+    assert directions == [58, 59, 0, 0, 1, 1, 1, 2, 2]
+
+
+def test_vr_calm_below_min_bullet_demolition_range():
+    speeds, directions = vr_bulletin(10, 30)
+    assert speeds == [0] * len(BULLETIN_HEIGHTS)
+    assert directions == [0] * len(BULLETIN_HEIGHTS)
+
+
+def test_vr_mean_wind_outside_table_heights():
+    speeds, increments = MeteoEngine.vr_mean_wind(np.array([0, 5000]), np.array([40.0, 40.0]))
+    assert speeds.tolist() == [3, 5]
+    assert increments.tolist() == [0, 4]